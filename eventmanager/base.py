@@ -254,6 +254,8 @@ REST_FRAMEWORK = {
 
 # SESSION, SHOP
 CART_SESSION_ID = "cart"
+# summary of the cart (count, totals, event names) for the header badge
+CART_SUMMARY_SESSION_ID = "cart_summary"
 
 # django-paypal settings
 PAYPAL_BUY_BUTTON_IMAGE = (
@@ -270,6 +272,39 @@ FAQ_SETTINGS = []
 # action settings
 ONLY_NOT_FULL_EVENTS_CAN_HAVE_ACTION = True
 
+# waiting list: promote waiting members automatically when a seat is released
+# (events.seats); promoted members still need their invoice, so off by default
+WAITING_LIST_AUTO_PROMOTION = False
+
+# invoice PDFs (payment.invoices): rendered PDFs are cached on disk by content
+# hash; bump INVOICE_TEMPLATE_VERSION after changing shop/pdf_invoice.html
+INVOICE_CACHE_DIR = os.path.join(BASE_DIR, "invoice_cache")
+INVOICE_TEMPLATE_VERSION = 1
+# worker processes for rendering several invoices (0 = render in-process);
+# requests, ZIP export and celery render in-process, only the daily invoice
+# cron (payment.cron) uses a process pool
+INVOICE_RENDER_WORKERS = 0
+INVOICE_CRON_RENDER_WORKERS = os.cpu_count() or 1
+
+# outgoing mail queue (events.mail_queue): messages per minute allowed by the
+# provider, retries with exponential backoff; MAIL_QUEUE_EAGER = None sends
+# immediately with local backends (locmem in tests) and queues for SMTP.
+# The send lock and the rate limit live in the cache, so worker and cron need
+# a shared cache backend; the worker starts MAIL_QUEUE_KICK_DELAY seconds
+# after the first queued message
+MAIL_QUEUE_EAGER = None
+MAIL_QUEUE_RATE_LIMIT = 60
+MAIL_QUEUE_BATCH_SIZE = 100
+MAIL_QUEUE_MAX_ATTEMPTS = 6
+MAIL_QUEUE_KICK_DELAY = 5
+
+# moodle web service client (moodle.client): (connect, read) timeout in seconds,
+# retries with backoff, parallel requests for map/gather; MOODLE_URL,
+# MOODLE_ENDPOINT and MOODLE_SECRET are set in local_settings
+MOODLE_TIMEOUT = (3.05, 30)
+MOODLE_RETRIES = 2
+MOODLE_MAX_WORKERS = 8
+
 # copy settings
 COPY_ONLY_ALLOWED_FOR_SINGLE_OBJECT = True
 
@@ -1,4 +1,3 @@
-import csv
 from openpyxl import Workbook
 from django.shortcuts import render
 from django.core.exceptions import PermissionDenied
@@ -12,6 +11,14 @@ from django.contrib import messages
 
 
 from .utils import convert_data_date, convert_boolean_field
+from .csv_export import CsvColumn, streaming_csv_response
+from .xlsx_export import (
+    WriteOnlySheet,
+    XLSX_CHUNK_SIZE,
+    create_workbook,
+    member_row,
+    xlsx_response,
+)
 
 from .models import Event, EventMember
 
@@ -57,35 +64,16 @@ def export_as_xls(self, request, queryset):
     ]
 
     file_name = unidecode(opts.verbose_name)
-    blank_line = []
-    wb = Workbook()
-    ws = wb.active
-    ws.append(ExportExcelAction.generate_header(self, self.model, field_names))
-
-    for obj in queryset:
-        row = []
-        for field in field_names:
-            is_admin_field = hasattr(self, field)
-            if (
-                is_admin_field and not field == "check"
-            ):  # check is also admin_field, but we need model field
-                value = getattr(self, field)(obj)
-            else:
-                value = getattr(obj, field)
-                if isinstance(value, datetime) or isinstance(value, date):
-                    value = convert_data_date(value)
-                elif isinstance(value, bool):
-                    value = convert_boolean_field(value)
-            row.append(str(value))
-        ws.append(row)
-
-    ws = style_output_file(ws)
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    wb = create_workbook()
+    ws = WriteOnlySheet(wb, opts.verbose_name)
+    ws.append(
+        ExportExcelAction.generate_header(self, self.model, field_names), bold=True
     )
-    response["Content-Disposition"] = f"attachment; filename={file_name}.xlsx"
-    wb.save(response)
-    return response
+
+    for obj in queryset.iterator(chunk_size=XLSX_CHUNK_SIZE):
+        ws.append(member_row(obj, field_names, admin=self))
+
+    return xlsx_response(wb, [ws], file_name)
 
 
 export_as_xls.short_description = "Export > Excel"
@@ -156,33 +144,16 @@ def export_members_to_csv(modeladmin, request, queryset):
     today = date.today()
     filename = f"members_{today}.csv"
 
-    # Define the response with CSV headers
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-
-    writer = csv.writer(response)
-
-    # Dynamically get field names from the request, or use default fields
-    fields_to_export = [
-        "email",
-        "firstname",
-        "lastname",
-        "email",
-    ]
-
-    # Write the header row
-    # writer.writerow(fields_to_export)
-    header_list = ["username", "firstname", "lastname", "email", "course1", "role1"]
-    writer.writerow(header_list)
-
     # for course1 take event label = short name, role1 = 'student'
-
-    # Write data rows
-    for member in queryset:
-        row = [getattr(member, field) for field in fields_to_export]
-        writer.writerow(row)
-
-    return response
+    columns = [
+        CsvColumn("username", "email"),
+        CsvColumn("firstname", "firstname"),
+        CsvColumn("lastname", "lastname"),
+        CsvColumn("email", "email"),
+        CsvColumn("course1", "event__label"),
+        CsvColumn("role1", value="student"),
+    ]
+    return streaming_csv_response(queryset, columns, filename)
 
 
 export_members_to_csv.short_description = "Export > CSV (Vorname, Nachname, Email)"
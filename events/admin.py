@@ -9,6 +9,7 @@ from django.template.response import TemplateResponse
 from django.utils.safestring import mark_safe
 from django.utils.http import urlencode
 from django.utils.html import format_html
+from django.utils import timezone
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse, path
 from django import forms
@@ -70,6 +71,8 @@ from .models import (
 from .event_q_and_a import EventQuestion
 
 from events.filter import PeriodFilter, DateRangeFilter
+from events.member_search import member_search_q, members_changed
+from events import cancellation, member_orders
 
 from shop.models import Order, OrderItem
 
@@ -79,7 +82,8 @@ from events.utils import send_email
 
 from .admin_views import hitcount_view
 
-from .email_template import EmailTemplate
+from .email_template import EmailTemplate, EmailTemplateSendStats
+from .outbox import OutboxMessage
 
 from moodle.management.commands.moodle import (
     enrol_user_to_course,
@@ -88,6 +92,8 @@ from moodle.management.commands.moodle import (
     delete_moodle_course,
     assign_roles_to_enroled_user,
 )
+from moodle.client import MOODLE_ERRORS
+from moodle.provisioning import enrol_registered_members
 
 # setting date format in admin page
 from django.conf.locale.de import formats as de_formats
@@ -430,6 +436,18 @@ class EventMemberAdmin(admin.ModelAdmin):
     ]
 
     change_list_template = "admin/event_member_list.html"
+
+    def get_search_results(self, request, queryset, search_term):
+        # Teilnehmersuche über die Indizes (events/member_search.py),
+        # zusätzlich wie bisher über den Veranstaltungsnamen
+        if not search_term.strip():
+            return queryset, False
+        return (
+            queryset.filter(
+                member_search_q(search_term) | Q(event__name__icontains=search_term)
+            ),
+            False,
+        )
     fieldsets = (
         ("Veranstaltung", {"fields": ("event", "name")}),
         ("Name/Email/Tel", {"fields": ("firstname", "lastname", "email", "phone")}),
@@ -469,55 +487,21 @@ class EventMemberAdmin(admin.ModelAdmin):
         copy_member_instances,
     ]
 
+    def get_queryset(self, request):
+        # Bestellungen per Subquery statt drei Queries pro Zeile
+        return member_orders.with_order_annotations(super().get_queryset(request))
+
     @admin.display(description="RechNr")
     def get_order_nr(self, obj):
-        order = (
-            Order.objects.filter(
-                email=obj.email,
-                items__event=obj.event,  # Join through OrderItem to match the event
-            )
-            .distinct()
-            .first()
-        )  # Use distinct() to avoid duplicates
-
-        return order.get_order_number if order else ""
+        return member_orders.get_order_number(obj)
 
     @admin.display(description="Betrag")
     def get_order_price(self, obj):
-        # update order
-        order = (
-            Order.objects.filter(
-                email=obj.email,
-                items__event=obj.event,  # Join through OrderItem to match the event
-            )
-            .distinct()
-            .first()
-        )
-        if check_order_date_in_future(order):
-            update_order(order)
-
-        order_item = OrderItem.objects.filter(
-            event=obj.event, order__email=obj.email
-        ).first()
-
-        return order_item.get_cost_property if order_item else ""
+        return member_orders.get_order_price(obj)
 
     @admin.display(description="Zahlungseingang")
     def get_payment_receipt(self, obj):
-        order = (
-            Order.objects.filter(
-                email=obj.email,
-                items__event=obj.event,  # Join through OrderItem to match the event
-            )
-            .distinct()
-            .first()
-        )  # Use distinct() to avoid duplicates
-
-        return (
-            datetime.strftime(order.payment_date, "%d.%m.%Y")
-            if order.payment_receipt
-            else ""
-        )
+        return member_orders.get_payment_receipt(obj)
 
     def get_memberships_boolean(self, obj):
         if obj.vfll or obj.memberships != "[]":
@@ -579,6 +563,9 @@ class EventMemberAdmin(admin.ModelAdmin):
                 print(row[2])
 
             objs = EventMember.objects.bulk_create(bulk_create_list)
+            # bulk_create löst keine Signale aus: Zähler und Caches abgleichen
+            Event.objects.get(id=event_id).reconcile_member_counts()
+            members_changed(event_id)
             self.message_user(request, "CSV-Datei wurde importiert")
             # EventMember
             return redirect("..")
@@ -1308,7 +1295,7 @@ class EventAdmin(InlineActionsModelAdminMixin, admin.ModelAdmin):
         PrivateDocumentInline,
         EventMemberInline,
     )
-    actions = ("copy_event",)
+    actions = ("copy_event", "enrol_registered_members_to_moodle")
     inline_actions = []
 
     def get_queryset(self, request):
@@ -1423,40 +1410,19 @@ class EventAdmin(InlineActionsModelAdminMixin, admin.ModelAdmin):
         )
 
         if request.method == "POST":
-            obj.status = "cancel"
-            obj.save()
-            for member in obj.members.all():
-                old_status = member.attend_status
-                member.attend_status = "cancelled"
-
-                action = f"Status von {old_status} zu cancelled geändert"
-                EventMemberChangeDate.objects.create(
-                    change_date=datetime.now(), action=action, event_member=member
+            result = cancellation.cancel_event(obj)
+            for member in result.without_order:
+                self.message_user(
+                    request,
+                    f"keine Rechnung für {member} gefunden",
+                    messages.ERROR,
+                )
+            for member in result.with_several_orders:
+                self.message_user(
+                    request,
+                    f"mehrere Rechnungen für {member} gefunden",
+                    messages.ERROR,
                 )
-                member.save()
-                order_items = OrderItem.objects.filter(
-                    event=obj, order__email=member.email
-                ).exclude(status="s")
-                counter = 0
-                for order_item in order_items:
-                    order = order_item.order
-                    if check_order_date_in_future(order):
-                        order_updated = update_order(order)
-                    order.storno = True
-                    order.save()
-                    counter += 1
-                if counter == 0:
-                    self.message_user(
-                        request,
-                        f"keine Rechnung für {member} gefunden",
-                        messages.ERROR,
-                    )
-                elif counter > 1:
-                    self.message_user(
-                        request,
-                        f"mehrere Rechnungen für {member} gefunden",
-                        messages.ERROR,
-                    )
             self.message_user(
                 request,
                 f"Veranstaltung {obj.name} wurde storniert",
@@ -1465,29 +1431,25 @@ class EventAdmin(InlineActionsModelAdminMixin, admin.ModelAdmin):
             return HttpResponseRedirect(event_list_url)
 
         member_list = []
-        for member in obj.members.all():
+        for member, order_items in cancellation.get_cancellation_preview(obj):
             member_dict = {}
             member_dict["name"] = f"{member.lastname}, {member.firstname}"
             member_dict["email"] = member.email
-            order_item = OrderItem.objects.filter(
-                event=obj, order__email=member.email
-            ).exclude(status="s")
 
-            if len(order_item) == 0:
+            if len(order_items) == 0:
                 self.message_user(
                     request,
                     f"Die Veranstaltung {obj.name} taucht auf keiner Rechnung von {member.lastname}, {member.firstname} auf, bitte bereinigen.",
                     messages.ERROR,
                 )
-            elif len(order_item) > 1:
+            elif len(order_items) > 1:
                 self.message_user(
                     request,
                     f"Die Veranstaltung {obj.name} taucht auf mehreren Rechnungen von {member.lastname}, {member.firstname} auf, bitte bereinigen.",
                     messages.ERROR,
                 )
             else:
-                order = order_item[0].order
-                member_dict["order"] = order
+                member_dict["order"] = order_items[0].order
                 member_list.append(member_dict)
 
         context = {"event": obj, "members": member_list, "cancel_url": event_list_url}
@@ -1637,6 +1599,8 @@ class EventAdmin(InlineActionsModelAdminMixin, admin.ModelAdmin):
             event.moodle_course_created = False
             event.moodle_new_user_flag = False
             event.students_number = 0
+            event.registered_count = 0
+            event.waiting_count = 0
 
             event.save()
             # many-to-one relationships are preserved when the parent object is copied,
@@ -1680,6 +1644,37 @@ class EventAdmin(InlineActionsModelAdminMixin, admin.ModelAdmin):
 
     copy_event.short_description = "Copy Event"
 
+    def enrol_registered_members_to_moodle(self, request, queryset):
+        """alle angemeldeten Teilnehmer gesammelt in den Moodle-Kurs einschreiben"""
+        for event in queryset:
+            if event.moodle_id == 0:
+                self.message_user(
+                    request,
+                    f"{event.label}: Kurs ist kein Moodle-Kurs",
+                    messages.WARNING,
+                )
+                continue
+            try:
+                result = enrol_registered_members(event)
+            except MOODLE_ERRORS as e:
+                self.message_user(
+                    request,
+                    f"{event.label}: Teilnehmer*innen konnten nicht eingeschrieben "
+                    f"werden: {e}",
+                    messages.ERROR,
+                )
+                continue
+            self.message_user(
+                request,
+                f"{event.label}: {result.enrolled} Teilnehmer*innen eingeschrieben, "
+                f"davon {len(result.created)} neu in Moodle angelegt",
+                messages.SUCCESS,
+            )
+
+    enrol_registered_members_to_moodle.short_description = (
+        "Alle angemeldeten Teilnehmer*innen in Moodle einschreiben"
+    )
+
     def save_model(self, request, obj, form, change):
         print("save_model called")
         # pass
@@ -1787,6 +1782,41 @@ class EmailTemplateAdmin(admin.ModelAdmin):
 admin.site.register(EmailTemplate, EmailTemplateAdmin)
 
 
+class EmailTemplateSendStatsAdmin(admin.ModelAdmin):
+    list_display = ("template", "date", "count")
+    list_filter = ("template",)
+    date_hierarchy = "date"
+    readonly_fields = ("template", "date", "count")
+
+
+admin.site.register(EmailTemplateSendStats, EmailTemplateSendStatsAdmin)
+
+
+def requeue_messages(modeladmin, request, queryset):
+    queryset.exclude(status=OutboxMessage.SENT).update(
+        status=OutboxMessage.QUEUED, next_attempt=timezone.now(), locked_at=None
+    )
+
+
+requeue_messages.short_description = "Erneut versuchen"
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("subject", "__str__", "status", "attempts", "created", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject",)
+    actions = [requeue_messages]
+    exclude = ("attachments",)
+    readonly_fields = [
+        field.name
+        for field in OutboxMessage._meta.fields
+        if field.name != "attachments"
+    ]
+
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
+
+
 class EventHighlightAdmin(admin.ModelAdmin):
     model = EventHighlight
 
@@ -0,0 +1,163 @@
+"""
+versionierte Cache-Einträge
+
+Statt einzelne Keys zu löschen, hat jeder Bereich (z.B. "categories") eine
+Versionsnummer im Cache. Die Signale in events/signals.py erhöhen sie bei
+Änderungen, danach werden automatisch neue Keys verwendet. Erhöht wird
+erst nach dem Commit (bump_version_on_commit), sonst kann ein paralleler
+Request den alten Stand unter der neuen Version cachen.
+"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "events:version:{}"
+
+
+def get_version(name):
+    version = cache.get(VERSION_KEY.format(name))
+    if version is None:
+        version = 1
+        cache.add(VERSION_KEY.format(name), version, None)
+    return version
+
+
+def bump_version(name):
+    try:
+        return cache.incr(VERSION_KEY.format(name))
+    except ValueError:
+        # key existiert (noch) nicht
+        cache.set(VERSION_KEY.format(name), 2, None)
+        return 2
+
+
+def bump_version_on_commit(name):
+    """wie bump_version, aber erst nach dem Commit der laufenden Transaktion"""
+    transaction.on_commit(lambda: bump_version(name))
+
+
+def versioned_key(name, *parts):
+    return ":".join(
+        ["events", name, f"v{get_version(name)}"] + [str(part) for part in parts]
+    )
+
+
+def get_or_set_versioned(name, parts, default, timeout):
+    """
+    liefert den Wert zur aktuellen Version, default() wird nur bei einem
+    Cache-Miss aufgerufen
+    """
+    key = versioned_key(name, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = default()
+        cache.set(key, value, timeout)
+    return value
+
+
+# Fragment-Cache für den öffentlichen Veranstaltungskalender
+# (FilteredEventListView), invalidiert über die Version "calendar"
+
+CALENDAR_CACHE_TIMEOUT = 60 * 60
+# so lange darf ein Request die Liste neu rendern, bevor ein anderer es versucht
+CALENDAR_LOCK_TIMEOUT = 30
+# so lange wartet ein Request auf das Ergebnis eines anderen
+CALENDAR_WAIT_TIMEOUT = 5
+CALENDAR_STATS = ("hits", "misses", "stale", "waits")
+CALENDAR_STATS_KEY = "events:calendar:stats:{}"
+
+# Parameter, die das Ergebnis beeinflussen (FilteredEventListView.get_queryset
+# und die Felder von EventFilter, die has_filter setzen)
+CALENDAR_PARAMS = (
+    "category",
+    "first_day",
+    "first_day_min",
+    "first_day_max",
+    "search",
+    "cat",
+)
+
+
+def calendar_changed():
+    bump_version_on_commit("calendar")
+
+
+def calendar_cache_key(params, today):
+    """
+    Key aus den vorhandenen Filterparametern und ihren genauen Werten: die
+    View unterscheidet ein leeres ?first_day_min= (auch vergangene Events,
+    has_filter) von einem fehlenden Parameter, nur die Reihenfolge ist egal
+    """
+    present = sorted(
+        (name, params.get(name)) for name in CALENDAR_PARAMS if name in params
+    )
+    return hashlib.md5(
+        urlencode([("today", today.isoformat())] + present).encode()
+    ).hexdigest()
+
+
+def _count(stat):
+    key = CALENDAR_STATS_KEY.format(stat)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_calendar_cache_stats():
+    stats = {
+        stat: cache.get(CALENDAR_STATS_KEY.format(stat), 0) for stat in CALENDAR_STATS
+    }
+    requests = stats["hits"] + stats["misses"] + stats["stale"]
+    stats["hit_rate"] = (
+        round((stats["hits"] + stats["stale"]) / requests, 3) if requests else None
+    )
+    stats["version"] = get_version("calendar")
+    return stats
+
+
+def get_or_render_calendar(digest, render):
+    """
+    liefert das gerenderte Fragment aus dem Cache; bei einem Miss rendert
+    nur ein Request (Lock per cache.add), die anderen bekommen die letzte
+    (veraltete) Fassung oder warten kurz auf das Ergebnis
+    """
+    key = versioned_key("calendar", digest)
+    html = cache.get(key)
+    if html is not None:
+        _count("hits")
+        return html
+
+    stale_key = f"events:calendar:stale:{digest}"
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, CALENDAR_LOCK_TIMEOUT):
+        try:
+            html = render()
+            cache.set(key, html, CALENDAR_CACHE_TIMEOUT)
+            cache.set(stale_key, html, CALENDAR_CACHE_TIMEOUT * 24)
+        finally:
+            cache.delete(lock_key)
+        _count("misses")
+        return html
+
+    stale = cache.get(stale_key)
+    if stale is not None:
+        _count("stale")
+        return stale
+
+    _count("waits")
+    deadline = time.monotonic() + CALENDAR_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        html = cache.get(key)
+        if html is not None:
+            _count("hits")
+            return html
+    # der andere Request braucht zu lange: selbst rendern
+    _count("misses")
+    return render()
@@ -0,0 +1,122 @@
+"""
+Absage eines Events (EventAdmin.confirm_cancel_event)
+
+Alle Teilnehmer werden in einer Transaktion mit wenigen Queries storniert:
+- Status per bulk_update, Änderungsvermerke per bulk_create
+- die Rechnungspositionen aller Teilnehmer in einer Query (über die E-Mail)
+- Storno-Vermerk für alle betroffenen Rechnungen in einem UPDATE
+Die Zähler des Events werden danach einmal abgeglichen, die Storno-PDFs
+nach dem Commit im Hintergrund vorgerendert (payment.invoices).
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from events.member_search import members_changed
+from events.models import EventMember, EventMemberChangeDate
+from shop.models import Order, OrderItem
+
+from payment.utils import check_order_date_in_future, sync_orders
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CancellationResult:
+    members: list = field(default_factory=list)
+    # Teilnehmer ohne bzw. mit mehreren Rechnungen zu diesem Event
+    without_order: list = field(default_factory=list)
+    with_several_orders: list = field(default_factory=list)
+    order_ids: list = field(default_factory=list)
+
+
+def get_member_order_items(event, members):
+    """{email: [OrderItem]} der Teilnehmer für dieses Event, eine Query"""
+    items = defaultdict(list)
+    for item in (
+        OrderItem.objects.filter(
+            event=event, order__email__in={member.email for member in members}
+        )
+        .exclude(status="s")
+        .select_related("order")
+        .order_by("id")
+    ):
+        items[item.order.email].append(item)
+    return items
+
+
+def get_cancellation_preview(event):
+    """[(member, [OrderItem])] für die Bestätigungsseite"""
+    members = list(event.members.all())
+    items = get_member_order_items(event, members)
+    return [(member, items.get(member.email, [])) for member in members]
+
+
+def _prerender_storno_invoices(order_ids):
+    from payment.invoices import prerender_invoices
+
+    try:
+        prerender_invoices.delay(order_ids, "storno")
+    except Exception:
+        # werden dann beim ersten Abruf gerendert
+        logger.warning("Storno-Rechnungen nicht vorgerendert", exc_info=True)
+
+
+def cancel_event(event):
+    """setzt Event und Teilnehmer auf storniert, liefert CancellationResult"""
+    result = CancellationResult()
+    with transaction.atomic():
+        event.status = "cancel"
+        event.save()
+
+        members = list(event.members.select_for_update().order_by("id"))
+        now = datetime.now()
+        change_dates = []
+        for member in members:
+            action = f"Status von {member.attend_status} zu cancelled geändert"
+            change_dates.append(
+                EventMemberChangeDate(
+                    change_date=now, action=action, event_member=member
+                )
+            )
+            member.attend_status = "cancelled"
+            member.date_modified = timezone.now()
+        EventMember.objects.bulk_update(
+            members, ["attend_status", "date_modified"], batch_size=500
+        )
+        EventMemberChangeDate.objects.bulk_create(change_dates, batch_size=500)
+
+        items = get_member_order_items(event, members)
+        orders = {}
+        for member in members:
+            member_items = items.get(member.email, [])
+            if not member_items:
+                result.without_order.append(member)
+            elif len(member_items) > 1:
+                result.with_several_orders.append(member)
+            for item in member_items:
+                orders[item.order_id] = item.order
+
+        sync_orders(
+            [order for order in orders.values() if check_order_date_in_future(order)]
+        )
+        Order.objects.filter(id__in=orders).update(
+            storno=True, date_modified=timezone.now()
+        )
+
+        # bulk_update löst keine Signale aus: Zähler und Caches einmal abgleichen
+        event.reconcile_member_counts()
+        members_changed(event.id)
+
+        result.members = members
+        result.order_ids = sorted(orders)
+        if result.order_ids:
+            transaction.on_commit(
+                lambda: _prerender_storno_invoices(result.order_ids)
+            )
+    return result
@@ -0,0 +1,93 @@
+"""
+CSV-Exporte als StreamingHttpResponse
+
+Die Zeilen werden direkt aus values_list(...).iterator() erzeugt und
+stückweise an den Client geschickt, d.h. der Speicherbedarf hängt nicht von
+der Anzahl der Zeilen ab und der Download beginnt sofort.
+
+Spalten werden deklarativ beschrieben:
+
+    columns = [
+        CsvColumn("Vorname", "firstname"),
+        CsvColumn("Datum", "date_created", format_datetime),
+        CsvColumn("VFLL", "vfll", convert_boolean_field),
+        CsvColumn("role1", value="student"),
+    ]
+    return streaming_csv_response(queryset, columns, "teilnehmer.csv")
+"""
+
+import csv
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from django.http import StreamingHttpResponse
+
+from .utils import convert_boolean_field
+
+CSV_CHUNK_SIZE = 2000
+
+
+def format_datetime(value):
+    return value.strftime("%d.%m.%y %H:%M") if value else ""
+
+
+def format_date(value):
+    return value.strftime("%d.%m.%Y") if value else ""
+
+
+def format_boolean(value):
+    return convert_boolean_field(value)
+
+
+@dataclass(frozen=True)
+class CsvColumn:
+    header: str
+    # Feld für values_list (auch über Relationen, z.B. "event__label")
+    field: Optional[str] = None
+    formatter: Optional[Callable] = None
+    # fester Wert, wenn kein Feld angegeben ist
+    value: Any = None
+
+    def format(self, value):
+        if self.field is None:
+            value = self.value
+        if self.formatter is not None:
+            return self.formatter(value)
+        return value
+
+
+class Echo:
+    """Pseudo-Datei für csv.writer, writerow() liefert die Zeile zurück"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(Echo())
+    if header:
+        yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_values(queryset, columns, chunk_size=CSV_CHUNK_SIZE):
+    """Zeilen (Listen) zu den Spalten, ohne Model-Instanzen zu erzeugen"""
+    fields = list(dict.fromkeys(c.field for c in columns if c.field is not None))
+    for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        row = dict(zip(fields, values))
+        yield [column.format(row.get(column.field)) for column in columns]
+
+
+def csv_response(header, rows, filename):
+    response = StreamingHttpResponse(iter_csv(header, rows), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def streaming_csv_response(queryset, columns, filename, chunk_size=CSV_CHUNK_SIZE):
+    return csv_response(
+        [column.header for column in columns],
+        iter_values(queryset, columns, chunk_size),
+        filename,
+    )
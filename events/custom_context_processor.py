@@ -2,16 +2,35 @@ from datetime import date, datetime
 
 from django.db.models import Count
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .caching import get_or_set_versioned
 from .models import Event, EventCategory
 
+# Kategorien ändern sich selten, Invalidierung über Signale (events/signals.py)
+CATEGORIES_CACHE_TIMEOUT = getattr(settings, "CATEGORIES_CACHE_TIMEOUT", 60 * 60)
+# pro Gruppen-Kombination, kurze Laufzeit
+FRONTEND_EVENTS_CACHE_TIMEOUT = getattr(settings, "FRONTEND_EVENTS_CACHE_TIMEOUT", 60)
 
-def category_renderer(request):
-    return {
-        #'all_categories': EventCategory.objects.all(),
-        "all_categories": EventCategory.objects.annotate(events_count=Count("events"))
+
+def get_shown_categories():
+    return list(
+        EventCategory.objects.annotate(events_count=Count("events"))
         .filter(events_count__gt=0)
         .filter(show=True)
         .order_by("position")
+    )
+
+
+def category_renderer(request):
+    # wird erst ausgewertet, wenn das Template die Kategorien benutzt
+    return {
+        #'all_categories': EventCategory.objects.all(),
+        "all_categories": SimpleLazyObject(
+            lambda: get_or_set_versioned(
+                "categories", [], get_shown_categories, CATEGORIES_CACHE_TIMEOUT
+            )
+        )
     }
 
 
@@ -20,18 +39,33 @@ def event_in_frontend_context(request):
     return {"event_in_frontend": event_in_frontend}
 
 
-def events_in_frontend_context(request):
-    user = request.user
-    user_groups = user.groups.all()
-    if user.is_authenticated:
-        events_in_frontend = (
+def get_events_in_frontend(user):
+    if not user.is_authenticated:
+        return []
+    group_ids = sorted(user.groups.values_list("id", flat=True))
+    if not group_ids:
+        return []
+    today = date.today()
+
+    def events_for_groups():
+        return list(
             Event.objects.filter(
-                edit_in_frontend=True, visible_to_groups__in=user_groups
+                edit_in_frontend=True, visible_to_groups__in=group_ids
             )
-            .filter(first_day__gte=date.today())
+            .filter(first_day__gte=today)
             .distinct()
         )
-    else:
-        events_in_frontend = Event.objects.none()
 
-    return {"events_in_frontend": events_in_frontend}
+    return get_or_set_versioned(
+        "frontend_events",
+        [today.isoformat(), "-".join(str(id) for id in group_ids)],
+        events_for_groups,
+        FRONTEND_EVENTS_CACHE_TIMEOUT,
+    )
+
+
+def events_in_frontend_context(request):
+    user = request.user
+    return {
+        "events_in_frontend": SimpleLazyObject(lambda: get_events_in_frontend(user))
+    }
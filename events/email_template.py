@@ -1,4 +1,7 @@
-from django.db import models
+import datetime
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 
 from events.abstract import BaseModel
 
@@ -18,5 +21,56 @@ class EmailTemplate(BaseModel):
         return self.name
 
     def add_count(self, add=1):
-        self.counter += add
-        self.save()
\ No newline at end of file
+        record_sends({self.id: add})
+
+
+class EmailTemplateSendStats(models.Model):
+    """versendete E-Mails pro Vorlage und Tag"""
+
+    template = models.ForeignKey(
+        EmailTemplate, related_name="send_stats", on_delete=models.CASCADE
+    )
+    date = models.DateField("Datum")
+    count = models.PositiveIntegerField("versendet", default=0)
+
+    class Meta:
+        ordering = ["-date", "template"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["template", "date"], name="events_template_stats_unique"
+            ),
+        ]
+        verbose_name = "Versandstatistik"
+        verbose_name_plural = "Versandstatistik"
+
+    def __str__(self):
+        return f"{self.template} {self.date:%d.%m.%Y}: {self.count}"
+
+
+def record_sends(counts, date=None):
+    """
+    {template_id: Anzahl} auf einmal verbuchen: Zähler der Vorlage atomar per
+    F() (ohne die Vorlage zu laden oder date_modified zu ändern) und die
+    Tagesstatistik; Aufrufer sammeln die Anzahl pro Lauf (events.mail_queue,
+    payment.dispatch) statt pro E-Mail zu schreiben
+    """
+    date = date or datetime.date.today()
+    for template_id, count in counts.items():
+        if not template_id or not count:
+            continue
+        EmailTemplate.objects.filter(id=template_id).update(
+            counter=F("counter") + count
+        )
+        stats = EmailTemplateSendStats.objects.filter(
+            template_id=template_id, date=date
+        )
+        if stats.update(count=F("count") + count):
+            continue
+        try:
+            with transaction.atomic():
+                EmailTemplateSendStats.objects.create(
+                    template_id=template_id, date=date, count=count
+                )
+        except IntegrityError:
+            # parallel angelegt
+            stats.update(count=F("count") + count)
@@ -0,0 +1,57 @@
+"""
+Querysets und Gruppierung für die öffentlichen Veranstaltungslisten
+(EventListView, FilteredEventListView)
+
+Alles, was das Template pro Zeile braucht, wird vorab geladen:
+- category, eventformat, event_collection per select_related
+- event_days (sortiert) per prefetch_related, damit get_first_day() & Co.
+  keine eigenen Queries absetzen
+- ausgebucht / wenige Plätze: Event.is_full() und few_remaining_places()
+  lesen die denormalisierten Zähler, ohne eigene Query
+Gruppiert wird nach der Spalte first_day, d.h. die Anzahl der Queries hängt
+nicht von der Anzahl der Events ab.
+"""
+
+import itertools
+
+from django.db.models import Prefetch
+
+from .models import EventDay
+
+
+def listing_queryset(queryset):
+    return queryset.select_related(
+        "category", "eventformat", "event_collection"
+    ).prefetch_related(
+        Prefetch("event_days", queryset=EventDay.objects.order_by("start_date"))
+    )
+
+
+def get_first_day(item):
+    # first_day ist denormalisiert, Fallback über die (prefetchten) Tage
+    return item.first_day or item.get_first_day_start_date()
+
+
+def sort_by_first_day(*iterables):
+    """Events und Bildungsangebote gemeinsam nach first_day sortieren"""
+    return sorted(
+        (item for item in itertools.chain(*iterables) if get_first_day(item)),
+        key=get_first_day,
+    )
+
+
+def group_by_year_and_month(items):
+    """
+    {Jahr: {Monat: [items]}} aus der (sortierten) Liste,
+    Monatsnamen nach der eingestellten Locale
+    """
+    events_dict = {}
+    for year, group in itertools.groupby(
+        items, lambda e: get_first_day(e).strftime("%Y")
+    ):
+        events_dict[year] = {}
+        for month, inner_group in itertools.groupby(
+            group, lambda e: get_first_day(e).strftime("%B")
+        ):
+            events_dict[year][month] = list(inner_group)
+    return events_dict
@@ -0,0 +1,296 @@
+"""
+Ausgehende E-Mails über eine Warteschlange (OutboxMessage)
+
+send_email rendert die Nachricht und legt sie nur noch in der Tabelle ab,
+der Request wartet nicht mehr auf den SMTP-Server. Verschickt wird von
+process_mail_queue:
+- nach dem Commit angestoßen über den Celery-Task process_mail_queue_task;
+  der Anstoß wird gebündelt (höchstens ein wartender Task, Start nach
+  MAIL_QUEUE_KICK_DELAY Sekunden), zusätzlich regelmäßig per Cron
+  (manage.py process_mail_queue), falls der Broker nicht erreichbar war
+- es verschickt immer nur ein Lauf (Lock im Cache), alle fälligen
+  Nachrichten über eine offene Verbindung
+- höchstens MAIL_QUEUE_RATE_LIMIT Nachrichten pro Minute insgesamt, der
+  Zeitpunkt des letzten Versands liegt im Cache und gilt auch für den
+  nächsten Lauf; Lock und Rate-Limit wirken nur prozessübergreifend, wenn
+  Worker und Cron denselben Cache benutzen (nicht locmem)
+- Fehler: erneuter Versuch mit exponentiellem Backoff, nach
+  MAIL_QUEUE_MAX_ATTEMPTS Versuchen (oder bei abgelehnten Empfängern)
+  fehlgeschlagen
+- Nachrichten, die nach MAIL_QUEUE_LOCK_TIMEOUT noch "in Versand" sind
+  (Worker abgestürzt), werden nicht automatisch neu verschickt, weil sie
+  schon beim Provider angekommen sein können; sie werden als fehlgeschlagen
+  markiert und im Admin geprüft ("Erneut versuchen")
+
+Bei lokalen Backends (locmem, console, file, dummy) wird sofort beim
+Einstellen verschickt, wenn MAIL_QUEUE_EAGER nicht gesetzt ist; damit landen
+die Mails in Tests wie bisher direkt in mail.outbox. Lock und Rate-Limit
+gelten dabei nicht.
+"""
+
+import base64
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from smtplib import SMTPException, SMTPRecipientsRefused
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from events.email_template import record_sends
+from events.outbox import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+MAIL_QUEUE_BATCH_SIZE = 100
+MAIL_QUEUE_RATE_LIMIT = 60
+MAIL_QUEUE_MAX_ATTEMPTS = 6
+MAIL_QUEUE_RETRY_DELAY = 60
+MAIL_QUEUE_MAX_RETRY_DELAY = 60 * 60
+# "in Versand" länger als das: Worker abgestürzt, Nachricht prüfen;
+# gleichzeitig die Höchstdauer des Locks für einen Lauf
+MAIL_QUEUE_LOCK_TIMEOUT = 15 * 60
+MAIL_QUEUE_KICK_DELAY = 5
+
+MAIL_QUEUE_LOCK_KEY = "events:mail-queue:lock"
+MAIL_QUEUE_KICK_KEY = "events:mail-queue:kick"
+MAIL_QUEUE_LAST_SEND_KEY = "events:mail-queue:last-send"
+
+LOCAL_EMAIL_BACKENDS = (
+    "django.core.mail.backends.locmem.EmailBackend",
+    "django.core.mail.backends.console.EmailBackend",
+    "django.core.mail.backends.filebased.EmailBackend",
+    "django.core.mail.backends.dummy.EmailBackend",
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_eager():
+    eager = _setting("MAIL_QUEUE_EAGER", None)
+    if eager is None:
+        return settings.EMAIL_BACKEND in LOCAL_EMAIL_BACKENDS
+    return eager
+
+
+def enqueue(message, template=None):
+    """EmailMessage in die Warteschlange stellen, liefert die OutboxMessage"""
+    queued = OutboxMessage.objects.create(
+        next_attempt=timezone.now(),
+        template=template,
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients={
+            "to": list(message.to),
+            "cc": list(message.cc),
+            "bcc": list(message.bcc),
+            "reply_to": list(message.reply_to),
+        },
+        attachments=[
+            [name, base64.b64encode(content).decode("ascii"), mime]
+            for name, content, mime in _attachments(message)
+        ],
+    )
+    if is_eager():
+        process_mail_queue(ids=[queued.id])
+    else:
+        transaction.on_commit(_kick_worker)
+    return queued
+
+
+def _attachments(message):
+    for name, content, mime in message.attachments:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        yield name, content, mime
+
+
+def _kick_worker():
+    """startet den Worker, außer es wartet schon ein angestoßener Lauf"""
+    from events.tasks import process_mail_queue_task
+
+    delay = _setting("MAIL_QUEUE_KICK_DELAY", MAIL_QUEUE_KICK_DELAY)
+    if not cache.add(MAIL_QUEUE_KICK_KEY, 1, delay + 60):
+        return
+    try:
+        process_mail_queue_task.apply_async(countdown=delay)
+    except Exception:
+        cache.delete(MAIL_QUEUE_KICK_KEY)
+        # der Cron-Lauf holt die Nachricht später ab
+        logger.warning("Mail-Worker konnte nicht gestartet werden", exc_info=True)
+
+
+def process_kicked_mail_queue():
+    """
+    Lauf des angestoßenen Workers; Nachrichten, die ab jetzt eingestellt
+    werden, stoßen wieder einen neuen Lauf an
+    """
+    cache.delete(MAIL_QUEUE_KICK_KEY)
+    return process_mail_queue()
+
+
+def to_email_message(queued, connection=None):
+    recipients = queued.recipients
+    message = EmailMessage(
+        queued.subject,
+        queued.body,
+        from_email=queued.from_email,
+        to=recipients.get("to", []),
+        cc=recipients.get("cc", []),
+        bcc=recipients.get("bcc", []),
+        reply_to=recipients.get("reply_to", []),
+        connection=connection,
+    )
+    for name, content, mime in queued.attachments:
+        message.attach(name, base64.b64decode(content), mime)
+    return message
+
+
+def retry_delay(attempts):
+    """Backoff nach dem n-ten Fehlversuch: 1, 2, 4, ... Minuten, höchstens 1 h"""
+    delay = _setting("MAIL_QUEUE_RETRY_DELAY", MAIL_QUEUE_RETRY_DELAY)
+    return timedelta(
+        seconds=min(
+            delay * 2 ** (attempts - 1),
+            _setting("MAIL_QUEUE_MAX_RETRY_DELAY", MAIL_QUEUE_MAX_RETRY_DELAY),
+        )
+    )
+
+
+def flag_stale_messages(now):
+    """
+    Nachrichten eines abgestürzten Laufs zur Prüfung als fehlgeschlagen
+    markieren; ob sie schon verschickt wurden, ist nicht bekannt
+    """
+    timeout = _setting("MAIL_QUEUE_LOCK_TIMEOUT", MAIL_QUEUE_LOCK_TIMEOUT)
+    flagged = OutboxMessage.objects.filter(
+        status=OutboxMessage.SENDING, locked_at__lt=now - timedelta(seconds=timeout)
+    ).update(
+        status=OutboxMessage.FAILED,
+        locked_at=None,
+        last_error="Versand abgebrochen, evtl. schon verschickt: bitte prüfen",
+    )
+    if flagged:
+        logger.error(
+            "%s E-Mail(s) hingen im Versand und müssen geprüft werden", flagged
+        )
+    return flagged
+
+
+def claim(queued, now):
+    """bedingtes UPDATE, damit parallele Worker nicht doppelt senden"""
+    return (
+        OutboxMessage.objects.filter(id=queued.id, status=OutboxMessage.QUEUED).update(
+            status=OutboxMessage.SENDING, locked_at=now
+        )
+        == 1
+    )
+
+
+def mark_failed(queued, error, permanent=False):
+    queued.attempts += 1
+    queued.last_error = str(error)
+    queued.locked_at = None
+    max_attempts = _setting("MAIL_QUEUE_MAX_ATTEMPTS", MAIL_QUEUE_MAX_ATTEMPTS)
+    if permanent or queued.attempts >= max_attempts:
+        queued.status = OutboxMessage.FAILED
+        logger.error("E-Mail %s endgültig fehlgeschlagen: %s", queued.id, error)
+    else:
+        queued.status = OutboxMessage.QUEUED
+        queued.next_attempt = timezone.now() + retry_delay(queued.attempts)
+        logger.warning("E-Mail %s wird später erneut versucht: %s", queued.id, error)
+    queued.save(
+        update_fields=["attempts", "last_error", "locked_at", "status", "next_attempt"]
+    )
+
+
+def mark_sent(queued):
+    queued.attempts += 1
+    queued.status = OutboxMessage.SENT
+    queued.sent_at = timezone.now()
+    queued.locked_at = None
+    queued.last_error = ""
+    queued.save(
+        update_fields=["attempts", "status", "sent_at", "locked_at", "last_error"]
+    )
+
+
+def wait_for_rate_limit(sleep=time.sleep):
+    """wartet bis zum nächsten erlaubten Versand (über alle Läufe hinweg)"""
+    rate_limit = _setting("MAIL_QUEUE_RATE_LIMIT", MAIL_QUEUE_RATE_LIMIT)
+    if not rate_limit:
+        return
+    last_send = cache.get(MAIL_QUEUE_LAST_SEND_KEY)
+    if last_send is not None:
+        wait = 60 / rate_limit - (time.time() - last_send)
+        if wait > 0:
+            sleep(wait)
+    cache.set(MAIL_QUEUE_LAST_SEND_KEY, time.time(), 60)
+
+
+def process_mail_queue(ids=None, limit=None, connection=None, sleep=time.sleep):
+    """
+    verschickt fällige Nachrichten über eine Verbindung, liefert die Anzahl
+    der versendeten; ids beschränkt auf bestimmte Nachrichten.
+    Läuft schon ein anderer Lauf, wird nichts verschickt (0).
+    """
+    if is_eager():
+        return _process_mail_queue(ids, limit, connection, sleep=None)
+    timeout = _setting("MAIL_QUEUE_LOCK_TIMEOUT", MAIL_QUEUE_LOCK_TIMEOUT)
+    if not cache.add(MAIL_QUEUE_LOCK_KEY, 1, timeout):
+        logger.info("Mail-Warteschlange wird schon von einem anderen Lauf verschickt")
+        return 0
+    try:
+        flag_stale_messages(timezone.now())
+        return _process_mail_queue(ids, limit, connection, sleep)
+    finally:
+        cache.delete(MAIL_QUEUE_LOCK_KEY)
+
+
+def _process_mail_queue(ids, limit, connection, sleep):
+    now = timezone.now()
+    queryset = OutboxMessage.objects.filter(
+        status=OutboxMessage.QUEUED, next_attempt__lte=now
+    )
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    limit = limit or _setting("MAIL_QUEUE_BATCH_SIZE", MAIL_QUEUE_BATCH_SIZE)
+    due = list(queryset.order_by("next_attempt", "id")[:limit])
+    if not due:
+        return 0
+
+    sent_per_template = Counter()
+
+    connection = connection or get_connection()
+    with connection:
+        for queued in due:
+            if not claim(queued, timezone.now()):
+                continue
+            if sleep is not None:
+                wait_for_rate_limit(sleep)
+            try:
+                sent = connection.send_messages([to_email_message(queued)])
+            except SMTPRecipientsRefused as e:
+                mark_failed(queued, e, permanent=True)
+                continue
+            except (SMTPException, OSError) as e:
+                # kaputte Verbindung schließen, send_messages öffnet neu
+                connection.close()
+                mark_failed(queued, e)
+                continue
+            if not sent:
+                mark_failed(queued, "E-Mail wurde nicht verschickt")
+                continue
+            mark_sent(queued)
+            sent_per_template[queued.template_id] += 1
+
+    # increase count on email_template
+    record_sends(sent_per_template)
+    return sum(sent_per_template.values())
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from events.mail_queue import process_mail_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Verschickt die fälligen E-Mails aus der Warteschlange "
+        "(regelmäßig per Cron, falls der Celery-Worker nicht angestoßen wurde)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="höchstens so viele E-Mails verschicken",
+        )
+
+    def handle(self, *args, **options):
+        sent = process_mail_queue(limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(f"{sent} E-Mail(s) versendet"))
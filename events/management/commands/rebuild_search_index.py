@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from events.models import Event
+from events.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Baut den Suchindex der Veranstaltungen (events/search.py) neu auf."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event",
+            nargs="+",
+            type=int,
+            help="nur diese Event-IDs indizieren",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Event.objects.all()
+        if options["event"]:
+            queryset = queryset.filter(id__in=options["event"])
+        count = rebuild_index(queryset)
+        self.stdout.write(self.style.SUCCESS(f"{count} Event(s) indiziert"))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from events.caching import calendar_changed
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Gleicht die denormalisierten Teilnehmerzähler (registered_count, "
+        "waiting_count) der Events mit den EventMember-Einträgen ab."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event",
+            nargs="+",
+            type=int,
+            help="nur diese Event-IDs prüfen",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Abweichungen nur anzeigen, nichts speichern",
+        )
+
+    def handle(self, *args, **options):
+        events = Event.objects.annotate(
+            _registered=Count("members", filter=Q(members__attend_status="registered")),
+            _waiting=Count("members", filter=Q(members__attend_status="waiting")),
+        ).only("id", "name", "registered_count", "waiting_count")
+        if options["event"]:
+            events = events.filter(id__in=options["event"])
+
+        drifted = []
+        for event in events.iterator():
+            if (event.registered_count, event.waiting_count) != (
+                event._registered,
+                event._waiting,
+            ):
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{event.name} (id {event.id}): "
+                        f"angemeldet {event.registered_count} -> {event._registered}, "
+                        f"Warteliste {event.waiting_count} -> {event._waiting}"
+                    )
+                )
+                event.registered_count = event._registered
+                event.waiting_count = event._waiting
+                drifted.append(event)
+
+        if drifted and not options["dry_run"]:
+            Event.objects.bulk_update(
+                drifted, ["registered_count", "waiting_count"], batch_size=500
+            )
+            calendar_changed()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(drifted)} Event(s) mit abweichenden Zählern"
+                + (" gefunden" if options["dry_run"] else " korrigiert")
+            )
+        )
@@ -0,0 +1,79 @@
+"""
+Bestellung zu einem Teilnehmer (über Event und E-Mail) als Annotation
+
+Statt pro Zeile Order.objects.filter(email=..., items__event=...) abzufragen,
+werden Bestellnummer, Rechnungsdatum, Zahlungseingang und Betrag per
+Subquery in die Teilnehmer-Query eingebaut (Changelist und Exporte).
+Indizes: shop_orderitem_event_order_idx und shop_order_email_date_idx.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, When
+
+from shop.models import Order, OrderItem, format_order_number
+
+ORDER_ANNOTATIONS = (
+    "order_pk",
+    "order_payment_date",
+    "order_payment_receipt",
+    "order_item_cost",
+)
+
+
+def with_order_annotations(queryset):
+    # neueste Bestellung wie Order.Meta.ordering, erstes OrderItem nach id
+    orders = Order.objects.filter(
+        email=OuterRef("email"), items__event=OuterRef("event_id")
+    ).order_by("-date_created", "-id")
+    items = (
+        OrderItem.objects.filter(
+            event=OuterRef("event_id"), order__email=OuterRef("email")
+        )
+        .order_by("id")
+        .annotate(
+            # wie OrderItem.get_cost()
+            member_cost=Case(
+                When(order__discounted=True, then=F("price") * F("quantity")),
+                default=F("premium_price") * F("quantity"),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+    )
+    return queryset.annotate(
+        order_pk=Subquery(orders.values("id")[:1]),
+        order_payment_date=Subquery(orders.values("payment_date")[:1]),
+        order_payment_receipt=Subquery(orders.values("payment_receipt")[:1]),
+        order_item_cost=Subquery(items.values("member_cost")[:1]),
+    )
+
+
+def get_order_data(member):
+    """Annotationen des Teilnehmers, notfalls mit einer eigenen Query"""
+    if not hasattr(member, "order_pk"):
+        values = (
+            with_order_annotations(type(member).objects.filter(pk=member.pk))
+            .values(*ORDER_ANNOTATIONS)
+            .first()
+        ) or {}
+        for name in ORDER_ANNOTATIONS:
+            setattr(member, name, values.get(name))
+    return member
+
+
+def get_order_number(member):
+    order_pk = get_order_data(member).order_pk
+    return format_order_number(order_pk) if order_pk else ""
+
+
+def get_order_price(member):
+    cost = get_order_data(member).order_item_cost
+    # die Annotation kommt (z.B. bei SQLite) ohne feste Nachkommastellen
+    return cost.quantize(Decimal("0.01")) if cost is not None else ""
+
+
+def get_payment_receipt(member):
+    member = get_order_data(member)
+    if member.order_payment_receipt and member.order_payment_date:
+        return member.order_payment_date.strftime("%d.%m.%Y")
+    return ""
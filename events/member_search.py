@@ -0,0 +1,179 @@
+"""
+Suche in den Teilnehmerlisten (MV/FT-Orga)
+
+Die Suche läuft immer innerhalb eines Events (event_id) und nutzt die
+Indizes aus Migration 0176:
+- (event, attend_status), (event, email), (event, lastname, id)
+- PostgreSQL: Trigramm-GIN-Indizes (pg_trgm) auf Vorname, Nachname und
+  E-Mail, damit icontains ('%x%') ohne Full Table Scan auskommt; auf
+  anderen Datenbanken bleibt es bei icontains, nur ohne Index
+
+Die Ergebnisse werden per Keyset-Pagination (Sortierfeld, id) seitenweise
+ausgeliefert statt die komplette Liste zu rendern; alle Seiten laufen durch
+filter_members_list, die Filter werden mit dem Cursor weitergereicht
+(member_list_query). Die Gesamtzahl kommt aus
+einem Cache, der beim Speichern/Löschen von Teilnehmern invalidiert wird
+(members_changed in events/signals.py, bei Massenänderungen vom Aufrufer).
+"""
+
+import base64
+import hashlib
+import json
+from urllib.parse import urlencode
+
+from django.db.models import Q
+
+from .caching import bump_version_on_commit, get_or_set_versioned
+
+MEMBER_SEARCH_FIELDS = ("lastname", "firstname", "email")
+MEMBER_SORT_FIELDS = ("lastname", "firstname", "email", "date_created")
+MEMBER_PAGE_SIZE = 50
+MEMBER_COUNT_TIMEOUT = 60 * 60
+# GET-Parameter der Teilnehmerliste, die beim Nachladen erhalten bleiben
+MEMBER_LIST_PARAMS = (
+    "search",
+    "member_firstname",
+    "member_lastname",
+    "member_email",
+    "member_vote_transfer_yes",
+    "member_vote_transfer_no",
+    "flag",
+)
+
+
+def member_search_q(query):
+    """jeder Suchbegriff muss in Vorname, Nachname oder E-Mail vorkommen"""
+    condition = Q()
+    for term in (query or "").split():
+        term_condition = Q()
+        for field in MEMBER_SEARCH_FIELDS:
+            term_condition |= Q(**{f"{field}__icontains": term})
+        condition &= term_condition
+    return condition
+
+
+def search_members(queryset, query):
+    return queryset.filter(member_search_q(query))
+
+
+def filter_member_fields(queryset, **fields):
+    """Filter für die einzelnen Suchfelder, z.B. lastname="Mü" """
+    for field, value in fields.items():
+        if value and value.strip():
+            queryset = queryset.filter(**{f"{field}__icontains": value.strip()})
+    return queryset
+
+
+def filter_members_list(queryset, event, params, show_vote_transfer=False):
+    """
+    alle Filter der Teilnehmerliste aus den GET-Parametern, für die erste
+    Seite und jede weitere (search_members_list) gleich
+    """
+    queryset = search_members(queryset, params.get("search"))
+    queryset = filter_member_fields(
+        queryset,
+        firstname=params.get("member_firstname"),
+        lastname=params.get("member_lastname"),
+        email=params.get("member_email"),
+    )
+    if show_vote_transfer:
+        if params.get("member_vote_transfer_yes"):
+            queryset = queryset.exclude(vote_transfer__exact="")
+        if params.get("member_vote_transfer_no"):
+            queryset = queryset.filter(vote_transfer__exact="")
+    if params.get("flag") == "duplicates":
+        queryset = queryset.filter(email__in=event.get_duplicate_members())
+    return queryset
+
+
+def member_list_query(params, exclude=()):
+    """Querystring der gesetzten Filter (ohne cursor) für das Nachladen"""
+    return urlencode(
+        [
+            (name, params.get(name))
+            for name in MEMBER_LIST_PARAMS
+            if params.get(name) and name not in exclude
+        ]
+    )
+
+
+def get_sort(sort):
+    """gültige Sortierung ("lastname", "-date_created", ...), sonst lastname"""
+    if sort and sort.lstrip("-") in MEMBER_SORT_FIELDS:
+        return sort
+    return "lastname"
+
+
+def encode_cursor(member, sort, offset):
+    value = getattr(member, sort.lstrip("-"))
+    data = json.dumps([sort, value, member.pk, offset], default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor, sort="lastname"):
+    """
+    (Wert, id, offset) oder None bei fehlendem/ungültigem Cursor oder
+    wenn der Cursor zu einer anderen Sortierung gehört
+    """
+    if not cursor:
+        return None
+    try:
+        cursor_sort, value, pk, offset = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        if cursor_sort != sort:
+            return None
+        return str(value), int(pk), int(offset)
+    except (ValueError, TypeError):
+        return None
+
+
+def member_page(queryset, cursor=None, size=MEMBER_PAGE_SIZE, sort="lastname"):
+    """
+    eine Seite nach (sort, id) sortiert, ab dem Cursor;
+    liefert (members, offset, next_cursor), next_cursor ist None auf der
+    letzten Seite
+    """
+    sort = get_sort(sort)
+    field = sort.lstrip("-")
+    descending = sort.startswith("-")
+    queryset = queryset.order_by(sort, "-id" if descending else "id")
+    offset = 0
+    position = decode_cursor(cursor, sort)
+    if position:
+        value, pk, offset = position
+        after = "lt" if descending else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{field}__{after}": value})
+            | Q(**{field: value, f"id__{after}": pk})
+        )
+    members = list(queryset[: size + 1])
+    next_cursor = None
+    if len(members) > size:
+        members = members[:size]
+        next_cursor = encode_cursor(members[-1], sort, offset + size)
+    return members, offset, next_cursor
+
+
+def members_changed(event_id):
+    """
+    gecachte Anzahlen des Events verwerfen; nach save/delete über die Signale,
+    nach bulk_create/bulk_update/update() vom Aufrufer; wirksam erst nach
+    dem Commit
+    """
+    bump_version_on_commit(f"members-{event_id}")
+
+
+def count_members(queryset, event_id, **filters):
+    """
+    Anzahl der (gefilterten) Teilnehmer eines Events, gecacht bis sich ein
+    Teilnehmer des Events ändert; ohne Event wird nicht gecacht
+    """
+    if not event_id:
+        return queryset.count()
+    digest = hashlib.md5(
+        urlencode(sorted((k, v) for k, v in filters.items() if v)).encode()
+    ).hexdigest()
+    return get_or_set_versioned(
+        f"members-{event_id}", [digest], queryset.count, MEMBER_COUNT_TIMEOUT
+    )
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2025-07-02 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_member_counts(apps, schema_editor):
+    Event = apps.get_model("events", "Event")
+    events = Event.objects.annotate(
+        _registered=Count("members", filter=Q(members__attend_status="registered")),
+        _waiting=Count("members", filter=Q(members__attend_status="waiting")),
+    ).only("id")
+    for event in events.iterator():
+        Event.objects.filter(id=event.id).update(
+            registered_count=event._registered, waiting_count=event._waiting
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0173_alter_eventhighlight_event_eventquestion_eventanswer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="registered_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="angemeldet"
+            ),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="waiting_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Warteliste"
+            ),
+        ),
+        migrations.RunPython(fill_member_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,169 @@
+# Generated by Django 4.2.20 on 2025-07-04 16:40
+
+import re
+
+from bs4 import BeautifulSoup
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Stand von events/search.py zum Zeitpunkt der Migration, damit spätere
+# Änderungen dort das Befüllen hier nicht verändern
+FIELD_WEIGHTS = {
+    "name": 10,
+    "keywords": 5,
+    "category": 4,
+    "speakers": 4,
+    "oneliner": 3,
+    "description": 1,
+}
+MAX_TERM_LENGTH = 64
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def stem(word):
+    word = word.lower().translate(UMLAUTS)
+    while len(word) > 3:
+        if len(word) > 5 and word[-2:] in ("em", "er", "nd"):
+            word = word[:-2]
+        elif word[-1] in "estn":
+            word = word[:-1]
+        else:
+            break
+    return word[:MAX_TERM_LENGTH]
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(text or "") if len(word) > 1]
+
+
+def html_to_text(html):
+    if not html:
+        return ""
+    return BeautifulSoup(html, "html.parser").get_text(" ")
+
+
+# gleicher Ausdruck wie SearchVector("search_text", config="german") in
+# events/search.py, damit PostgreSQL den Index für die Suche nutzt
+SEARCH_TEXT_INDEX = (
+    "CREATE INDEX IF NOT EXISTS events_search_text_gin "
+    "ON events_eventsearchdocument USING gin "
+    "(to_tsvector('german'::regconfig, COALESCE((search_text)::text, '')))"
+)
+
+
+def add_search_gin_index(apps, schema_editor):
+    # GIN-Index nur für PostgreSQL, andere Datenbanken nutzen EventSearchTerm
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(SEARCH_TEXT_INDEX)
+
+
+def remove_search_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS events_search_text_gin")
+
+
+def fill_search_index(apps, schema_editor):
+    Event = apps.get_model("events", "Event")
+    EventSearchDocument = apps.get_model("events", "EventSearchDocument")
+    EventSearchTerm = apps.get_model("events", "EventSearchTerm")
+    for event in Event.objects.select_related("category").prefetch_related("speaker"):
+        category = event.category
+        fields = {
+            "name": event.name,
+            "keywords": event.keywords,
+            "category": " ".join(
+                t for t in (category.name, category.title, category.singular) if t
+            ),
+            "speakers": " ".join(
+                f"{s.first_name} {s.last_name}" for s in event.speaker.all()
+            ),
+            "oneliner": event.oneliner,
+            "description": html_to_text(event.description),
+        }
+        EventSearchDocument.objects.create(
+            event=event, search_text=" ".join(t for t in fields.values() if t)
+        )
+        terms = {}
+        for field, text in fields.items():
+            for term in tokenize(text):
+                terms[term] = max(terms.get(term, 0), FIELD_WEIGHTS[field])
+        EventSearchTerm.objects.bulk_create(
+            [
+                EventSearchTerm(event=event, term=term, weight=weight)
+                for term, weight in terms.items()
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0174_event_registered_count_event_waiting_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventSearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("search_text", models.TextField(blank=True)),
+                ("date_modified", models.DateTimeField(auto_now=True)),
+                (
+                    "event",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_document",
+                        to="events.event",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Suchindex",
+                "verbose_name_plural": "Suchindex",
+            },
+        ),
+        migrations.CreateModel(
+            name="EventSearchTerm",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=64)),
+                ("weight", models.PositiveSmallIntegerField(default=1)),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_terms",
+                        to="events.event",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["term", "event"], name="events_search_term_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(add_search_gin_index, remove_search_gin_index),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.20 on 2025-07-11 10:12
+
+from django.db import migrations, models
+
+# icontains wird bei PostgreSQL zu UPPER("feld"::text) LIKE UPPER(...)
+TRIGRAM_INDEXES = {
+    "events_member_lastname_trgm": "lastname",
+    "events_member_firstname_trgm": "firstname",
+    "events_member_email_trgm": "email",
+}
+
+
+def add_trigram_indexes(apps, schema_editor):
+    # nur PostgreSQL, andere Datenbanken suchen ohne Index (icontains)
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, field in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON events_eventmember "
+            f'USING gin ((UPPER("{field}"::text)) gin_trgm_ops)'
+        )
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0175_eventsearchdocument_eventsearchterm"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="eventmember",
+            index=models.Index(
+                fields=["event", "attend_status"], name="events_member_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventmember",
+            index=models.Index(
+                fields=["event", "email"], name="events_member_email_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventmember",
+            index=models.Index(
+                fields=["event", "lastname", "id"], name="events_member_lastname_idx"
+            ),
+        ),
+        migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+    ]
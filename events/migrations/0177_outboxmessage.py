@@ -0,0 +1,86 @@
+# Generated by Django 4.2.20 on 2025-07-23 08:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0176_eventmember_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxMessage",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="angelegt am"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("q", "wartend"),
+                            ("s", "in Versand"),
+                            ("v", "versendet"),
+                            ("f", "fehlgeschlagen"),
+                        ],
+                        default="q",
+                        max_length=1,
+                    ),
+                ),
+                (
+                    "next_attempt",
+                    models.DateTimeField(verbose_name="nächster Versuch"),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="Versuche"),
+                ),
+                ("locked_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "sent_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="versendet am"
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True, verbose_name="Fehler")),
+                ("subject", models.CharField(max_length=998, verbose_name="Betreff")),
+                ("body", models.TextField()),
+                ("from_email", models.CharField(max_length=255)),
+                ("recipients", models.JSONField(default=dict)),
+                ("attachments", models.JSONField(blank=True, default=list)),
+                (
+                    "template",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="events.emailtemplate",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "E-Mail-Warteschlange",
+                "verbose_name_plural": "E-Mail-Warteschlange",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt"],
+                        name="events_outbox_due_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.20 on 2025-07-24 09:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0177_outboxmessage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailTemplateSendStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Datum")),
+                (
+                    "count",
+                    models.PositiveIntegerField(default=0, verbose_name="versendet"),
+                ),
+                (
+                    "template",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="send_stats",
+                        to="events.emailtemplate",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Versandstatistik",
+                "verbose_name_plural": "Versandstatistik",
+                "ordering": ["-date", "template"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="emailtemplatesendstats",
+            constraint=models.UniqueConstraint(
+                fields=("template", "date"), name="events_template_stats_unique"
+            ),
+        ),
+    ]
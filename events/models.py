@@ -29,6 +29,7 @@ from embed_video.fields import EmbedVideoField
 from hitcount.models import HitCountMixin, HitCount
 
 from .abstract import BaseModel, AddressModel
+from .caching import calendar_changed
 from .managers import ShownEventCategoriesManager
 
 from .choices import PUB_STATUS_CHOICES, REGIO_GROUP_CHOICES
@@ -645,6 +646,15 @@ class Event(BaseModel, HitCountMixin):
     )
     students_number = models.PositiveSmallIntegerField(default=0, editable=False)
 
+    # denormalisierte Zähler, werden über Signale an EventMember gepflegt
+    # (siehe events/signals.py) und mit `manage.py reconcile_event_counts` abgeglichen
+    registered_count = models.PositiveIntegerField(
+        verbose_name="angemeldet", default=0, editable=False
+    )
+    waiting_count = models.PositiveIntegerField(
+        verbose_name="Warteliste", default=0, editable=False
+    )
+
     # couting hits with package django-hitcount
     # ref: https://django-hitcount.readthedocs.io/en/latest/overview.html
 
@@ -696,7 +706,7 @@ class Event(BaseModel, HitCountMixin):
         #    delta = self.end_date - self.start_date
         #    if delta.days >= 14:
         #        raise ValidationError(f"Das Event umfasst {delta.days} Tage! Korrekt?")
-        if self.capacity < self.members.filter(attend_status="registered").count():
+        if self.capacity < self.get_number_of_registered_members():
             raise ValidationError(
                 "Die Teilnehmer*innenzahl darf nicht größer als die Kapazität sein."
             )
@@ -775,7 +785,37 @@ class Event(BaseModel, HitCountMixin):
         return condition
 
     def get_number_of_registered_members(self):
-        return self.members.filter(attend_status="registered").count()
+        return self.registered_count
+
+    def get_number_of_waiting_members(self):
+        return self.waiting_count
+
+    def count_members(self):
+        """
+        zählt die Teilnehmer direkt in der Datenbank,
+        gibt (registered, waiting) zurück
+        """
+        counts = self.members.aggregate(
+            registered=models.Count("id", filter=models.Q(attend_status="registered")),
+            waiting=models.Count("id", filter=models.Q(attend_status="waiting")),
+        )
+        return counts["registered"], counts["waiting"]
+
+    def reconcile_member_counts(self):
+        """
+        gleicht registered_count/waiting_count mit der Datenbank ab,
+        gibt True zurück, wenn die Zähler korrigiert wurden
+        """
+        registered, waiting = self.count_members()
+        changed = (registered, waiting) != (self.registered_count, self.waiting_count)
+        if changed:
+            Event.objects.filter(pk=self.pk).update(
+                registered_count=registered, waiting_count=waiting
+            )
+            calendar_changed()
+            self.registered_count = registered
+            self.waiting_count = waiting
+        return changed
 
     def get_number_of_members(self):
         """
@@ -819,7 +859,20 @@ class Event(BaseModel, HitCountMixin):
         email_list = list(self.members.values_list("email", flat=True))
         return find_duplicates_in_list(email_list)
 
+    def _get_sorted_event_days(self):
+        """
+        nach Datum sortierte Veranstaltungstage;
+        nutzt prefetch_related("event_days") (siehe events/listing.py), wenn vorhanden
+        """
+        prefetched = getattr(self, "_prefetched_objects_cache", {}).get("event_days")
+        if prefetched is not None:
+            return sorted(prefetched, key=lambda day: day.start_date)
+        return None
+
     def get_first_day(self):
+        event_days = self._get_sorted_event_days()
+        if event_days is not None:
+            return event_days[0] if event_days else None
         try:
             return self.event_days.all().order_by("start_date")[0]
 
@@ -827,20 +880,19 @@ class Event(BaseModel, HitCountMixin):
             pass
 
     def get_first_day_start_date(self):
-        try:
-            return self.event_days.all().order_by("start_date")[0].start_date
-
-        except IndexError:
-            pass
+        first_day = self.get_first_day()
+        if first_day:
+            return first_day.start_date
 
     def get_year(self):
-        try:
-            return self.event_days.all().order_by("start_date")[0].start_date.year
-
-        except IndexError:
-            pass
+        first_day = self.get_first_day()
+        if first_day:
+            return first_day.start_date.year
 
     def get_last_day(self):
+        event_days = self._get_sorted_event_days()
+        if event_days is not None:
+            return event_days[-1] if event_days else None
         try:
             return self.event_days.all().order_by("-start_date")[0]
 
@@ -848,13 +900,14 @@ class Event(BaseModel, HitCountMixin):
             pass
 
     def get_last_day_start_date(self):
-        try:
-            return self.event_days.all().order_by("-start_date")[0].start_date
-
-        except IndexError:
-            pass
+        last_day = self.get_last_day()
+        if last_day:
+            return last_day.start_date
 
     def is_several_days(self):
+        event_days = self._get_sorted_event_days()
+        if event_days is not None:
+            return len(event_days) > 1
         return self.event_days.count() > 1
 
     def current_hit_count(self):
@@ -916,6 +969,16 @@ class Event(BaseModel, HitCountMixin):
         if add and self.category.name == "messen":
             self.registration_possible = False
 
+        # die Zähler werden nur über F()-Updates geschrieben, damit ein
+        # veraltetes Objekt (z.B. im Admin) sie nicht überschreibt
+        if not add and not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("registered_count", "waiting_count")
+            ]
+
         return super().save(*args, **kwargs)
 
 
@@ -1197,6 +1260,16 @@ class EventMember(AddressModel):
         verbose_name = "TeilnehmerIn"
         verbose_name_plural = "TeilnehmerInnen"
         unique_together = ["event", "name"]
+        # Teilnehmersuche, siehe events/member_search.py
+        indexes = [
+            models.Index(
+                fields=["event", "attend_status"], name="events_member_status_idx"
+            ),
+            models.Index(fields=["event", "email"], name="events_member_email_idx"),
+            models.Index(
+                fields=["event", "lastname", "id"], name="events_member_lastname_idx"
+            ),
+        ]
 
     def __str__(self):
         return str(f"Anmeldung von {self.lastname}, {self.firstname}")
@@ -1277,3 +1350,7 @@ class EventHighlight(BaseModel):
                 check=models.Q(id=1),
             ),
         ]
+
+
+# Volltextsuche (Modelle des Suchindex)
+from .search import EventSearchDocument, EventSearchTerm  # noqa: E402
@@ -0,0 +1,50 @@
+from django.db import models
+
+from events.email_template import EmailTemplate
+
+
+class OutboxMessage(models.Model):
+    """E-Mail in der Warteschlange (events.mail_queue)"""
+
+    QUEUED = "q"
+    SENDING = "s"
+    SENT = "v"
+    FAILED = "f"
+    STATUS_CHOICES = (
+        (QUEUED, "wartend"),
+        (SENDING, "in Versand"),
+        (SENT, "versendet"),
+        (FAILED, "fehlgeschlagen"),
+    )
+
+    created = models.DateTimeField("angelegt am", auto_now_add=True)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=QUEUED)
+    next_attempt = models.DateTimeField("nächster Versuch")
+    attempts = models.PositiveIntegerField("Versuche", default=0)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField("versendet am", null=True, blank=True)
+    last_error = models.TextField("Fehler", blank=True)
+
+    template = models.ForeignKey(
+        EmailTemplate, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    subject = models.CharField("Betreff", max_length=998)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    # {"to": [...], "cc": [...], "bcc": [...], "reply_to": [...]}
+    recipients = models.JSONField(default=dict)
+    # [[Dateiname, Inhalt (base64), MIME-Typ], ...]
+    attachments = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt"], name="events_outbox_due_idx"
+            ),
+        ]
+        verbose_name = "E-Mail-Warteschlange"
+        verbose_name_plural = "E-Mail-Warteschlange"
+
+    def __str__(self):
+        return f"{self.subject} ({', '.join(self.recipients.get('to', []))})"
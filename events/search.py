@@ -0,0 +1,225 @@
+"""
+Volltextsuche für Veranstaltungen
+
+Durchsucht werden Name, Oneliner, Beschreibung (ohne HTML), Dozent*innen,
+Keywords und Kategorie. Pro Event gibt es ein EventSearchDocument, das beim
+Speichern (Signale in events/signals.py) aktualisiert wird.
+
+- PostgreSQL: SearchVector/SearchQuery (config "german") über
+  EventSearchDocument.search_text, mit GIN-Index (nur per Migration 0175,
+  nicht in Meta.indexes, sonst scheitert das Schema auf SQLite)
+- andere Datenbanken: invertierter Index (EventSearchTerm) mit einfacher
+  deutscher Stammformreduktion und Umlaut-Faltung, Lookup über den
+  indizierten Term statt LIKE '%x%'
+
+Index neu aufbauen: manage.py rebuild_search_index
+"""
+
+import re
+from collections import defaultdict
+
+from bs4 import BeautifulSoup
+
+from django.db import connection, models, transaction
+
+# Gewichtung der Felder (Fallback-Ranking)
+FIELD_WEIGHTS = {
+    "name": 10,
+    "keywords": 5,
+    "category": 4,
+    "speakers": 4,
+    "oneliner": 3,
+    "description": 1,
+}
+MAX_TERM_LENGTH = 64
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class EventSearchDocument(models.Model):
+    event = models.OneToOneField(
+        "events.Event", related_name="search_document", on_delete=models.CASCADE
+    )
+    search_text = models.TextField(blank=True)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Suchindex"
+        verbose_name_plural = "Suchindex"
+
+    def __str__(self):
+        return str(self.event_id)
+
+
+class EventSearchTerm(models.Model):
+    event = models.ForeignKey(
+        "events.Event", related_name="search_terms", on_delete=models.CASCADE
+    )
+    term = models.CharField(max_length=MAX_TERM_LENGTH)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["term", "event"], name="events_search_term_idx")
+        ]
+
+
+def fold(word):
+    return word.lower().translate(UMLAUTS)
+
+
+def stem(word):
+    """
+    einfache deutsche Stammformreduktion (nach CISTEM),
+    "Lektorate", "Lektoraten" und "Lektorat" ergeben denselben Term
+    """
+    word = fold(word)
+    while len(word) > 3:
+        if len(word) > 5 and word[-2:] in ("em", "er", "nd"):
+            word = word[:-2]
+        elif word[-1] in "estn":
+            word = word[:-1]
+        else:
+            break
+    return word[:MAX_TERM_LENGTH]
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(text or "") if len(word) > 1]
+
+
+def html_to_text(html):
+    if not html:
+        return ""
+    return BeautifulSoup(html, "html.parser").get_text(" ")
+
+
+def get_event_fields(event):
+    speakers = " ".join(
+        f"{speaker.first_name} {speaker.last_name}" for speaker in event.speaker.all()
+    )
+    return {
+        "name": event.name,
+        "keywords": event.keywords,
+        "category": " ".join(
+            text
+            for text in (
+                event.category.name,
+                event.category.title,
+                event.category.singular,
+            )
+            if text
+        ),
+        "speakers": speakers,
+        "oneliner": event.oneliner,
+        "description": html_to_text(event.description),
+    }
+
+
+def get_event_terms(fields):
+    """{term: Gewicht} aus den Feldern, je Term zählt das höchste Gewicht"""
+    terms = {}
+    for field, text in fields.items():
+        for term in tokenize(text):
+            terms[term] = max(terms.get(term, 0), FIELD_WEIGHTS[field])
+    return terms
+
+
+def index_event(event):
+    """Suchindex für ein Event neu schreiben"""
+    fields = get_event_fields(event)
+    search_text = " ".join(text for text in fields.values() if text)
+    with transaction.atomic():
+        EventSearchDocument.objects.update_or_create(
+            event_id=event.pk, defaults={"search_text": search_text}
+        )
+        EventSearchTerm.objects.filter(event_id=event.pk).delete()
+        EventSearchTerm.objects.bulk_create(
+            [
+                EventSearchTerm(event_id=event.pk, term=term, weight=weight)
+                for term, weight in get_event_terms(fields).items()
+            ]
+        )
+
+
+def rebuild_index(queryset=None):
+    from events.models import Event
+
+    if queryset is None:
+        queryset = Event.objects.all()
+    count = 0
+    for event in queryset.select_related("category").prefetch_related("speaker"):
+        index_event(event)
+        count += 1
+    return count
+
+
+def use_postgres():
+    return connection.vendor == "postgresql"
+
+
+def _postgres_search(queryset, query):
+    # erst hier importieren, django.contrib.postgres braucht psycopg2
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    vector = SearchVector("search_document__search_text", config="german")
+    search_query = SearchQuery(query, config="german", search_type="websearch")
+    return (
+        queryset.annotate(search=vector)
+        .filter(search=search_query)
+        .annotate(rank=SearchRank(vector, search_query))
+    )
+
+
+def _term_scores(query):
+    """
+    {event_id: score} für Events, die alle Suchbegriffe enthalten;
+    die Begriffe werden als Präfix gesucht (Eingabe während des Tippens)
+    """
+    query_terms = tokenize(query)
+    if not query_terms:
+        return {}
+    condition = models.Q()
+    for term in query_terms:
+        condition |= models.Q(term__startswith=term)
+
+    matched = defaultdict(set)
+    scores = defaultdict(int)
+    for event_id, term, weight in EventSearchTerm.objects.filter(
+        condition
+    ).values_list("event_id", "term", "weight"):
+        for i, query_term in enumerate(query_terms):
+            if term.startswith(query_term):
+                matched[event_id].add(i)
+                scores[event_id] += weight
+    return {
+        event_id: score
+        for event_id, score in scores.items()
+        if len(matched[event_id]) == len(query_terms)
+    }
+
+
+def filter_events(queryset, query):
+    """Queryset auf die Treffer einschränken (Reihenfolge bleibt)"""
+    if not query or not query.strip():
+        return queryset
+    if use_postgres():
+        return queryset.filter(
+            id__in=_postgres_search(queryset.model.objects.all(), query).values("id")
+        )
+    return queryset.filter(id__in=list(_term_scores(query)))
+
+
+def search_events(query, queryset=None):
+    """Treffer nach Relevanz sortiert (Liste)"""
+    from events.models import Event
+
+    if queryset is None:
+        queryset = Event.objects.all()
+    if not query or not query.strip():
+        return []
+    if use_postgres():
+        return list(_postgres_search(queryset, query).order_by("-rank"))
+    scores = _term_scores(query)
+    events = list(queryset.filter(id__in=list(scores)))
+    return sorted(events, key=lambda event: (-scores[event.id], event.name))
@@ -0,0 +1,174 @@
+"""
+Platzvergabe für Veranstaltungen
+
+Ob eine Anmeldung einen Platz bekommt oder auf die Warteliste kommt, wird
+über ein bedingtes UPDATE auf der Event-Zeile entschieden:
+
+    UPDATE events_event
+       SET registered_count = registered_count + n
+     WHERE id = ... AND registered_count <= capacity - n
+
+Die Datenbank serialisiert konkurrierende Updates auf dieselbe Zeile, d.h.
+auch bei parallelen Workern kann die Kapazität nicht überschritten werden.
+Die Zähler sind die denormalisierten Felder aus events/signals.py.
+
+API:
+    reservation = reserve(event, n=1)    # Platz (oder Warteliste) reservieren
+    member = confirm(reservation, ...)   # EventMember anlegen (nur n=1)
+    release(reservation)                 # nicht bestätigte Reservierung freigeben
+    register_member(event, ...)          # reserve + confirm in einer Transaktion
+    cancel_member(member)                # Teilnahme stornieren, Platz freigeben
+    promote_waiting_members(event)       # Warteliste nachrücken lassen
+"""
+
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from events.caching import calendar_changed
+from events.models import Event, EventMember
+
+
+class EventFullError(Exception):
+    """keine freien Plätze und keine Warteliste gewünscht"""
+
+
+@dataclass
+class SeatReservation:
+    event_id: int
+    seats: int
+    attend_status: str  # "registered" oder "waiting"
+    confirmed: bool = False
+    released: bool = False
+
+    @property
+    def is_waiting(self):
+        return self.attend_status == "waiting"
+
+
+def _counter_field(attend_status):
+    return "registered_count" if attend_status == "registered" else "waiting_count"
+
+
+def _take_seats(event_id, n):
+    """bedingtes UPDATE, gibt True zurück, wenn die Plätze vergeben wurden"""
+    taken = bool(
+        Event.objects.filter(
+            id=event_id, registered_count__lte=F("capacity") - n
+        ).update(registered_count=F("registered_count") + n)
+    )
+    if taken:
+        calendar_changed()
+    return taken
+
+
+def reserve(event, n=1, waitlist=True):
+    """
+    reserviert n Plätze; ist das Event voll, werden die Plätze auf der
+    Warteliste reserviert (oder EventFullError, wenn waitlist=False)
+    """
+    event_id = getattr(event, "pk", event)
+    with transaction.atomic():
+        if _take_seats(event_id, n):
+            return SeatReservation(event_id, n, "registered")
+        if not waitlist:
+            raise EventFullError(f"Event {event_id}: keine {n} Plätze mehr frei")
+        Event.objects.filter(id=event_id).update(waiting_count=F("waiting_count") + n)
+        return SeatReservation(event_id, n, "waiting")
+
+
+def confirm(reservation, **member_data):
+    """
+    legt den EventMember zur Reservierung an; der Zähler wurde schon in
+    reserve() erhöht und wird vom Signal-Handler nicht noch einmal gezählt.
+    Nur für Reservierungen über einen Platz, ein EventMember belegt genau einen.
+    """
+    if reservation.confirmed or reservation.released:
+        raise ValueError("Reservierung wurde bereits verwendet")
+    if reservation.seats != 1:
+        raise ValueError(
+            f"Reservierung über {reservation.seats} Plätze, "
+            "confirm legt nur einen EventMember an"
+        )
+    member_data.pop("attend_status", None)
+    if "event" not in member_data:
+        member_data["event_id"] = reservation.event_id
+    member = EventMember(attend_status=reservation.attend_status, **member_data)
+    member._counted_by_reservation = True
+    member.save()
+    reservation.confirmed = True
+    return member
+
+
+def release(reservation, promote=None):
+    """
+    gibt eine nicht bestätigte Reservierung wieder frei,
+    gibt die nachgerückten EventMember zurück
+    """
+    if reservation.confirmed or reservation.released:
+        return []
+    field = _counter_field(reservation.attend_status)
+    Event.objects.filter(
+        id=reservation.event_id, **{f"{field}__gte": reservation.seats}
+    ).update(**{field: F(field) - reservation.seats})
+    reservation.released = True
+    if reservation.attend_status == "registered":
+        calendar_changed()
+        return _auto_promote(reservation.event_id, promote)
+    return []
+
+
+def register_member(event, waitlist=True, **member_data):
+    """Platz reservieren und Teilnehmer*in anlegen (eine Transaktion)"""
+    with transaction.atomic():
+        reservation = reserve(event, waitlist=waitlist)
+        member = confirm(reservation, event=event, **member_data)
+    event.refresh_from_db(fields=["registered_count", "waiting_count"])
+    return member
+
+
+def cancel_member(member, promote=None):
+    """
+    storniert die Teilnahme; war die Person angemeldet, wird der Platz frei
+    und ggf. die Warteliste nachgezogen
+    """
+    was_registered = member.attend_status == "registered"
+    member.attend_status = "cancelled"
+    member.save()
+    if was_registered:
+        return _auto_promote(member.event_id, promote)
+    return []
+
+
+def promote_waiting_members(event, limit=None):
+    """
+    lässt Personen von der Warteliste (in Anmeldereihenfolge) nachrücken,
+    solange Plätze frei sind; gibt die nachgerückten EventMember zurück
+    """
+    event_id = getattr(event, "pk", event)
+    promoted = []
+    while limit is None or len(promoted) < limit:
+        with transaction.atomic():
+            member = (
+                EventMember.objects.select_for_update(skip_locked=True)
+                .filter(event_id=event_id, attend_status="waiting")
+                .order_by("date_created", "id")
+                .first()
+            )
+            if member is None or not _take_seats(event_id, 1):
+                break
+            member.attend_status = "registered"
+            member._counted_by_reservation = True
+            member.save()
+        promoted.append(member)
+    return promoted
+
+
+def _auto_promote(event_id, promote):
+    if promote is None:
+        promote = getattr(settings, "WAITING_LIST_AUTO_PROMOTION", False)
+    if promote:
+        return promote_waiting_members(event_id)
+    return []
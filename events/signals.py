@@ -1,18 +1,39 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.db import transaction
+from django.db.models import F, Max, Min, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from events.models import Event, EventDay, EventSpeakerThrough
+from events.caching import bump_version_on_commit, calendar_changed
+from events.models import (
+    Event,
+    EventCategory,
+    EventCollection,
+    EventDay,
+    EventMember,
+    EventSpeaker,
+    EventSpeakerThrough,
+)
+from events.search import index_event, rebuild_index
+from events.email_template import EmailTemplate
+from events.template_registry import templates_changed
+from events.member_search import members_changed
 
 from moodle.management.commands.moodle import create_or_update_trainer
 
 
 # @receiver(post_save, sender=Event)
 def first_day_handler(sender, instance, **kwargs):
-    event = instance.event
-    # print(event.get_first_day_start_date())
-    Event.objects.filter(id=event.id).update(first_day=event.get_first_day_start_date())
+    # first_day/last_day sind denormalisiert (Sortierung/Gruppierung der Listen)
+    dates = EventDay.objects.filter(event_id=instance.event_id).aggregate(
+        first=Min("start_date"), last=Max("start_date")
+    )
+    Event.objects.filter(id=instance.event_id).update(
+        first_day=dates["first"], last_day=dates["last"]
+    )
 
 
 post_save.connect(first_day_handler, sender=EventDay)
+post_delete.connect(first_day_handler, sender=EventDay)
 
 # try to build a trainer handler
 # @receiver(m2m_changed, sender=EventSpeakerThrough)
@@ -31,3 +52,196 @@ def event_speakers_changed(sender, instance, **kwargs):
 
 
 post_save.connect(event_speakers_changed, sender=EventSpeakerThrough)
+
+
+# denormalisierte Teilnehmerzähler am Event
+# attend_status -> Zählerfeld am Event
+MEMBER_COUNT_FIELDS = {
+    "registered": "registered_count",
+    "waiting": "waiting_count",
+}
+
+
+def _member_count_state(instance):
+    """
+    (event_id, attend_status) so wie sie in der DB stehen;
+    None, wenn attend_status nicht geladen wurde (deferred)
+    """
+    if "attend_status" not in instance.__dict__ or "event_id" not in instance.__dict__:
+        return None
+    return (instance.__dict__["event_id"], instance.__dict__["attend_status"])
+
+
+def apply_member_count_deltas(deltas):
+    """
+    deltas: {(event_id, field): step}
+    sperrt die betroffenen Events (in fester Reihenfolge gegen Deadlocks)
+    und aktualisiert die Zähler mit F()-Ausdrücken
+    """
+    deltas = {key: step for key, step in deltas.items() if key[0] and step}
+    if not deltas:
+        return
+    event_ids = sorted({event_id for event_id, _ in deltas})
+    with transaction.atomic():
+        list(
+            Event.objects.select_for_update()
+            .filter(id__in=event_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        for event_id in event_ids:
+            updates = {
+                field: Greatest(F(field) + step, Value(0))
+                for (e_id, field), step in deltas.items()
+                if e_id == event_id
+            }
+            if updates:
+                Event.objects.filter(id=event_id).update(**updates)
+    if any(field == "registered_count" for _, field in deltas):
+        # ausgebucht/wenige Plätze im Kalender
+        calendar_changed()
+
+
+def member_count_deltas(old_state, new_state):
+    deltas = {}
+    if old_state:
+        field = MEMBER_COUNT_FIELDS.get(old_state[1])
+        if field:
+            deltas[(old_state[0], field)] = deltas.get((old_state[0], field), 0) - 1
+    if new_state:
+        field = MEMBER_COUNT_FIELDS.get(new_state[1])
+        if field:
+            deltas[(new_state[0], field)] = deltas.get((new_state[0], field), 0) + 1
+    return deltas
+
+
+def _refresh_cached_event_counts(instance):
+    # ein bereits geladenes Event-Objekt am Teilnehmer aktuell halten
+    if EventMember.event.is_cached(instance):
+        instance.event.refresh_from_db(fields=["registered_count", "waiting_count"])
+
+
+def member_count_init_handler(sender, instance, **kwargs):
+    instance._member_count_state = _member_count_state(instance)
+
+
+def member_count_save_handler(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    update_fields = kwargs.get("update_fields")
+    if (
+        not created
+        and update_fields is not None
+        and not {"attend_status", "event", "event_id"} & set(update_fields)
+    ):
+        return
+    new_state = (instance.event_id, instance.attend_status)
+    old_state = None if created else getattr(instance, "_member_count_state", None)
+    if not created and old_state is None:
+        # alter Zustand unbekannt -> Event neu zählen
+        instance.event.reconcile_member_counts()
+    else:
+        deltas = member_count_deltas(old_state, new_state)
+        if getattr(instance, "_counted_by_reservation", False):
+            # der Platz wurde schon in events.seats reserviert
+            key = (new_state[0], MEMBER_COUNT_FIELDS.get(new_state[1]))
+            deltas[key] = deltas.get(key, 0) - 1
+            instance._counted_by_reservation = False
+        apply_member_count_deltas(deltas)
+        if deltas:
+            _refresh_cached_event_counts(instance)
+    instance._member_count_state = new_state
+
+
+def member_count_delete_handler(sender, instance, **kwargs):
+    old_state = getattr(instance, "_member_count_state", None) or (
+        instance.event_id,
+        instance.attend_status,
+    )
+    apply_member_count_deltas(member_count_deltas(old_state, None))
+
+
+post_init.connect(member_count_init_handler, sender=EventMember)
+post_save.connect(member_count_save_handler, sender=EventMember)
+post_delete.connect(member_count_delete_handler, sender=EventMember)
+
+
+# gecachte Teilnehmerzahlen der Tabellen (events/member_search.py)
+def members_changed_handler(sender, instance, raw=False, **kwargs):
+    if not raw:
+        members_changed(instance.event_id)
+
+
+post_save.connect(members_changed_handler, sender=EventMember)
+post_delete.connect(members_changed_handler, sender=EventMember)
+
+
+# Cache-Invalidierung für die Context Processors (custom_context_processor.py)
+def categories_changed_handler(sender, **kwargs):
+    bump_version_on_commit("categories")
+
+
+def frontend_events_changed_handler(sender, **kwargs):
+    bump_version_on_commit("frontend_events")
+
+
+for signal in (post_save, post_delete):
+    signal.connect(categories_changed_handler, sender=Event)
+    signal.connect(categories_changed_handler, sender=EventCategory)
+    signal.connect(frontend_events_changed_handler, sender=Event)
+m2m_changed.connect(
+    frontend_events_changed_handler, sender=Event.visible_to_groups.through
+)
+
+
+# Fragment-Cache des Kalenders (FilteredEventListView)
+def calendar_changed_handler(sender, **kwargs):
+    calendar_changed()
+
+
+for signal in (post_save, post_delete):
+    for model in (Event, EventDay, EventCategory, EventCollection):
+        signal.connect(calendar_changed_handler, sender=model)
+
+
+# gecachte E-Mail-Vorlagen (events/template_registry.py)
+def email_template_changed_handler(sender, **kwargs):
+    # nach dem Commit, sonst lädt ein paralleler Request die alte Fassung
+    # unter der neuen Version
+    transaction.on_commit(templates_changed)
+
+
+for signal in (post_save, post_delete):
+    signal.connect(email_template_changed_handler, sender=EmailTemplate)
+
+
+# Suchindex (events/search.py) inkrementell aktualisieren
+def search_index_event_handler(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_event(instance)
+
+
+def search_index_speaker_through_handler(sender, instance, raw=False, **kwargs):
+    # nach dem Commit, damit das Löschen eines ganzen Events nicht stört
+    if not raw:
+        event_id = instance.event_id
+        transaction.on_commit(
+            lambda: rebuild_index(Event.objects.filter(id=event_id))
+        )
+
+
+def search_index_related_handler(sender, instance, raw=False, **kwargs):
+    # Kategorie oder Dozent*in geändert: alle zugehörigen Events
+    if raw:
+        return
+    if sender is EventCategory:
+        rebuild_index(Event.objects.filter(category=instance))
+    else:
+        rebuild_index(Event.objects.filter(speaker=instance))
+
+
+post_save.connect(search_index_event_handler, sender=Event)
+post_save.connect(search_index_speaker_through_handler, sender=EventSpeakerThrough)
+post_delete.connect(search_index_speaker_through_handler, sender=EventSpeakerThrough)
+post_save.connect(search_index_related_handler, sender=EventCategory)
+post_save.connect(search_index_related_handler, sender=EventSpeaker)
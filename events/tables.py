@@ -7,6 +7,13 @@ import itertools
 from .models import EventMember
 
 
+def start_index(table):
+    # ohne Paginator (Keyset-Pagination in den Views) über table.offset
+    if hasattr(table, "page"):
+        return table.page.start_index()
+    return getattr(table, "offset", 0) + 1
+
+
 class MemberViewLinkColumn(tables.LinkColumn):
     def render(self, record, value):
         return super().render(record, value)
@@ -27,7 +34,7 @@ class EventMembersTable(tables.Table):
 
     def render_counter(self):
         self.row_counter = getattr(self, "row_counter", itertools.count())
-        return next(self.row_counter) + self.page.start_index()
+        return next(self.row_counter) + start_index(self)
         # self.page.sart_index() is default Table function and return number of start index per page
 
     view = MemberViewLinkColumn(
@@ -73,7 +80,7 @@ class FTEventMembersTable(tables.Table):
 
     def render_counter(self):
         self.row_counter = getattr(self, "row_counter", itertools.count())
-        return next(self.row_counter) + self.page.start_index()
+        return next(self.row_counter) + start_index(self)
         # self.page.sart_index() is default Table function and return number of start index per page
 
     view = MemberViewLinkColumn(
@@ -107,7 +114,7 @@ class MVEventMembersTable(tables.Table):
 
     def render_counter(self):
         self.row_counter = getattr(self, "row_counter", itertools.count())
-        return next(self.row_counter) + self.page.start_index()
+        return next(self.row_counter) + start_index(self)
         # self.page.sart_index() is default Table function and return number of start index per page
 
     view = MemberViewLinkColumn(
@@ -29,3 +29,10 @@ def get_and_save_courses_from_moodle():
     from django.core.management import call_command
 
     call_command("moodle")
+
+
+@shared_task
+def process_mail_queue_task():
+    from events.mail_queue import process_kicked_mail_queue
+
+    return process_kicked_mail_queue()
@@ -0,0 +1,94 @@
+"""
+E-Mail-Vorlagen im Prozess zwischenspeichern
+
+get_template(name) lädt eine EmailTemplate nur einmal aus der Datenbank.
+Der Eintrag gilt, solange die Version "email_templates" (events/caching.py)
+gleich ist und höchstens TEMPLATE_CACHE_TIMEOUT Sekunden alt (für andere
+Prozesse, falls der Cache nicht geteilt wird); post_save/post_delete der
+EmailTemplate erhöhen die Version (events/signals.py).
+
+compile_template zerlegt den Vorlagentext einmal in Text und Platzhalter,
+render() setzt danach nur noch die Werte ein. Dasselbe Ergebnis wie
+raw_template.format(**formatting_dict); Platzhalter mit Attributen, Index
+oder verschachteltem Format fallen auf str.format zurück.
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from string import Formatter
+from typing import Optional
+
+from events.caching import bump_version, get_version
+from events.email_template import EmailTemplate
+
+TEMPLATE_CACHE_TIMEOUT = 5 * 60
+VERSION_NAME = "email_templates"
+
+# name -> (Version, geladen um, EmailTemplate)
+_templates = {}
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    raw: str
+    # wie bisher über die Regex ermittelt (validate_email_template)
+    placeholders: frozenset
+    # ((Text, Feldname, Format, Konvertierung), ...) oder None für str.format
+    parts: Optional[tuple]
+
+    def render(self, formatting_dict):
+        if self.parts is None:
+            return self.raw.format(**formatting_dict)
+        chunks = []
+        for literal, field, spec, conversion in self.parts:
+            chunks.append(literal)
+            if field is None:
+                continue
+            value = formatting_dict[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            chunks.append(format(value, spec))
+        return "".join(chunks)
+
+    def render_many(self, formatting_dicts):
+        return [self.render(formatting_dict) for formatting_dict in formatting_dicts]
+
+
+@lru_cache(maxsize=256)
+def compile_template(raw_template):
+    parts = tuple(Formatter().parse(raw_template))
+    simple = all(
+        field is None or (field.isidentifier() and "{" not in (spec or ""))
+        for _, field, spec, _ in parts
+    )
+    return CompiledTemplate(
+        raw=raw_template,
+        placeholders=frozenset(re.findall("{(.+?)}", raw_template)),
+        parts=parts if simple else None,
+    )
+
+
+def get_template(name):
+    """EmailTemplate zum Namen, wirft EmailTemplate.DoesNotExist"""
+    version = get_version(VERSION_NAME)
+    cached = _templates.get(name)
+    if (
+        cached is not None
+        and cached[0] == version
+        and time.monotonic() - cached[1] < TEMPLATE_CACHE_TIMEOUT
+    ):
+        return cached[2]
+    template = EmailTemplate.objects.get(name=name)
+    _templates[name] = (version, time.monotonic(), template)
+    return template
+
+
+def templates_changed():
+    _templates.clear()
+    bump_version(VERSION_NAME)
@@ -1,6 +1,30 @@
-from django.test import TestCase
+import datetime
+from smtplib import SMTPException
+from unittest import mock
 
-from events.models import Event, EventCategory, EventFormat, EventLocation
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from events.models import (
+    Event,
+    EventCategory,
+    EventFormat,
+    EventDay,
+    EventLocation,
+    EventMember,
+)
+from events.listing import group_by_year_and_month, listing_queryset, sort_by_first_day
+from events.search import search_events, stem
+from events.email_template import EmailTemplate, EmailTemplateSendStats
+from events.mail_queue import (
+    MAIL_QUEUE_LOCK_KEY,
+    process_kicked_mail_queue,
+    process_mail_queue,
+)
+from events.outbox import OutboxMessage
+from events.utils import get_email_template, render_email_templates, send_email
 
 #############################
 # Events
@@ -33,3 +57,299 @@ class EventModelTest(TestCase):
         slug = event.slug
         # This will also fail if the urlconf is not defined.
         self.assertEqual(event.get_absolute_url(), f"/detail/{slug}")
+
+
+class EventMemberCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = EventCategory.objects.create(name="testcat")
+        cls.eventformat = EventFormat.objects.create(name="testformat")
+        cls.location = EventLocation.objects.create(title="testloc")
+
+    def setUp(self):
+        self.event = Event.objects.create(
+            name="Count Event",
+            category=self.category,
+            eventformat=self.eventformat,
+            location=self.location,
+            capacity=2,
+            price="100.00",
+        )
+
+    def add_member(self, attend_status="registered", **kwargs):
+        return EventMember.objects.create(
+            event=self.event,
+            firstname="Hans",
+            lastname="Test",
+            email=f"{EventMember.objects.count()}@test.de",
+            attend_status=attend_status,
+            **kwargs,
+        )
+
+    def test_counts_follow_member_changes(self):
+        member = self.add_member()
+        self.add_member(attend_status="waiting")
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 1)
+        self.assertEqual(self.event.waiting_count, 1)
+
+        member.attend_status = "cancelled"
+        member.save()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 0)
+
+        EventMember.objects.filter(attend_status="waiting").delete()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.waiting_count, 0)
+
+    def test_capacity_methods_without_queries(self):
+        self.add_member()
+        self.add_member()
+        event = Event.objects.get(id=self.event.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(event.is_full())
+            self.assertTrue(event.few_remaining_places())
+            self.assertEqual(event.get_number_of_free_places(), 0)
+
+    def test_stale_event_save_keeps_counts(self):
+        stale_event = Event.objects.get(id=self.event.id)
+        self.add_member()
+        stale_event.save()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 1)
+
+    def test_reconcile_member_counts(self):
+        self.add_member()
+        Event.objects.filter(id=self.event.id).update(registered_count=5)
+        self.event.refresh_from_db()
+        self.assertTrue(self.event.reconcile_member_counts())
+        self.assertEqual(self.event.registered_count, 1)
+
+
+class EventListingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = EventCategory.objects.create(name="testcat")
+        eventformat = EventFormat.objects.create(name="testformat")
+        location = EventLocation.objects.create(title="testloc")
+        start = datetime.date.today() + datetime.timedelta(days=10)
+        for i in range(6):
+            event = Event.objects.create(
+                name=f"Listing Event {i}",
+                category=category,
+                eventformat=eventformat,
+                location=location,
+                price="100.00",
+            )
+            for day in range(2):
+                EventDay.objects.create(
+                    event=event,
+                    start_date=start + datetime.timedelta(days=30 * i + day),
+                    start_time=datetime.time(10, 0),
+                    end_time=datetime.time(12, 0),
+                )
+
+    def test_first_day_is_denormalized_from_event_days(self):
+        event = Event.objects.get(name="Listing Event 0")
+        self.assertEqual(event.first_day, event.get_first_day_start_date())
+        self.assertEqual(event.last_day, event.get_last_day_start_date())
+
+    def test_grouping_with_bounded_queries(self):
+        # events + prefetched event_days
+        with self.assertNumQueries(2):
+            events = sort_by_first_day(listing_queryset(Event.objects.all()))
+            events_dict = group_by_year_and_month(events)
+            for event in events:
+                event.is_full()
+                event.few_remaining_places()
+                event.get_last_day()
+                event.category.name
+        self.assertEqual(
+            sum(len(month) for year in events_dict.values() for month in year.values()),
+            6,
+        )
+
+
+class EventSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = EventCategory.objects.create(name="Fortbildung")
+        eventformat = EventFormat.objects.create(name="testformat")
+        location = EventLocation.objects.create(title="testloc")
+        cls.lektorat = Event.objects.create(
+            name="Lektorate für Sachbücher",
+            oneliner="Grundlagen",
+            description="<p>Wir <b>überarbeiten</b> Texte</p>",
+            category=category,
+            eventformat=eventformat,
+            location=location,
+            price="100.00",
+        )
+        cls.other = Event.objects.create(
+            name="Korrektorat",
+            keywords="Lektorat",
+            category=category,
+            eventformat=eventformat,
+            location=location,
+            price="100.00",
+        )
+
+    def test_stem_folds_umlauts_and_suffixes(self):
+        self.assertEqual(stem("Lektoraten"), stem("Lektorat"))
+        self.assertEqual(stem("Übersetzung"), stem("uebersetzung"))
+
+    def test_ranked_by_field_weight(self):
+        self.assertEqual(search_events("lektorat"), [self.lektorat, self.other])
+
+    def test_description_without_html_and_all_terms(self):
+        self.assertEqual(search_events("Ueberarbeiten Texte"), [self.lektorat])
+        self.assertEqual(search_events("Korrektorat Texte"), [])
+
+    def test_index_is_updated_on_save(self):
+        self.other.name = "Satz und Layout"
+        self.other.save()
+        self.assertEqual(search_events("layout"), [self.other])
+
+
+#############################
+# Mail queue
+#############################
+
+
+@override_settings(
+    MAIL_QUEUE_EAGER=False,
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+)
+class MailQueueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.template = EmailTemplate.objects.create(
+            name="reminder", text_template="Hallo {firstname}"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def enqueue(self):
+        send_email(
+            {"to": ["erika@example.com"], "bcc": []},
+            "Mahnung",
+            "from@example.com",
+            ["reply@example.com"],
+            "reminder",
+            formatting_dict={"firstname": "Erika"},
+            invoice_name="invoice.pdf",
+            pdf=b"%PDF-x",
+            mime="application/pdf",
+        )
+
+    def test_worker_sends_queued_mail(self):
+        self.enqueue()
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(process_mail_queue(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].body, "Hallo Erika")
+        self.assertEqual(mail.outbox[0].attachments[0][1], b"%PDF-x")
+        self.assertEqual(OutboxMessage.objects.get().status, OutboxMessage.SENT)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.counter, 1)
+        self.assertEqual(process_mail_queue(), 0)
+
+    def test_failed_mail_is_retried_later(self):
+        self.enqueue()
+        connection = mail.get_connection()
+        with mock.patch.object(
+            connection, "send_messages", side_effect=SMTPException("busy")
+        ):
+            self.assertEqual(process_mail_queue(connection=connection), 0)
+        queued = OutboxMessage.objects.get()
+        self.assertEqual((queued.status, queued.attempts), (OutboxMessage.QUEUED, 1))
+        self.assertGreater(queued.next_attempt, timezone.now())
+        self.assertEqual(process_mail_queue(), 0)
+
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.assertEqual(process_mail_queue(sleep=mock.Mock()), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_only_one_run_sends_at_a_time(self):
+        self.enqueue()
+        cache.add(MAIL_QUEUE_LOCK_KEY, 1)
+        self.assertEqual(process_mail_queue(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+        cache.delete(MAIL_QUEUE_LOCK_KEY)
+        self.assertEqual(process_mail_queue(), 1)
+
+    def test_rate_limit_carries_over_to_next_run(self):
+        self.enqueue()
+        self.enqueue()
+        sleep = mock.Mock()
+        self.assertEqual(process_mail_queue(limit=1, sleep=sleep), 1)
+        sleep.assert_not_called()
+        self.assertEqual(process_mail_queue(sleep=sleep), 1)
+        # MAIL_QUEUE_RATE_LIMIT = 60: eine Sekunde Abstand, auch über Läufe
+        self.assertAlmostEqual(sleep.call_args[0][0], 1, delta=0.5)
+
+    def test_stale_message_is_flagged_for_review_not_resent(self):
+        self.enqueue()
+        OutboxMessage.objects.update(
+            status=OutboxMessage.SENDING,
+            locked_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+        self.assertEqual(process_mail_queue(), 0)
+        queued = OutboxMessage.objects.get()
+        self.assertEqual(queued.status, OutboxMessage.FAILED)
+        self.assertIn("prüfen", queued.last_error)
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(MAIL_QUEUE_RATE_LIMIT=0)
+    def test_worker_kick_is_debounced(self):
+        with mock.patch("events.tasks.process_mail_queue_task") as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.enqueue()
+                self.enqueue()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.enqueue()
+            self.assertEqual(task.apply_async.call_count, 1)
+
+            self.assertEqual(process_kicked_mail_queue(), 3)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.enqueue()
+            self.assertEqual(task.apply_async.call_count, 2)
+
+    def test_add_count_is_atomic_and_recorded_per_day(self):
+        modified = self.template.date_modified
+        # zweite, veraltete Instanz darf keine Zählung überschreiben
+        stale = EmailTemplate.objects.get(id=self.template.id)
+        self.template.add_count()
+        stale.add_count(2)
+
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.counter, 3)
+        self.assertEqual(self.template.date_modified, modified)
+        stats = EmailTemplateSendStats.objects.get(template=self.template)
+        self.assertEqual((stats.date, stats.count), (datetime.date.today(), 3))
+
+
+class EmailTemplateRegistryTest(TestCase):
+    def test_template_is_cached_until_saved(self):
+        template = EmailTemplate.objects.create(
+            name="absage", text_template="Liebe/r {firstname}, {event} fällt aus"
+        )
+        get_email_template("absage")
+        with self.assertNumQueries(0):
+            self.assertEqual(get_email_template("absage").id, template.id)
+
+        template.text_template = "Hallo {firstname}, {event} ist abgesagt"
+        with self.captureOnCommitCallbacks(execute=True):
+            template.save()
+        self.assertEqual(
+            render_email_templates(
+                "absage",
+                [
+                    {"firstname": "Erika", "event": "Kurs A"},
+                    {"firstname": "Hans", "event": "Kurs A"},
+                ],
+            ),
+            ["Hallo Erika, Kurs A ist abgesagt", "Hallo Hans, Kurs A ist abgesagt"],
+        )
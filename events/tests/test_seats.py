@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from events import seats
+from events.models import Event, EventCategory, EventFormat, EventLocation, EventMember
+
+
+def create_event(capacity):
+    return Event.objects.create(
+        name="Seat Event",
+        category=EventCategory.objects.create(name="testcat"),
+        eventformat=EventFormat.objects.create(name="testformat"),
+        location=EventLocation.objects.create(title="testloc"),
+        capacity=capacity,
+        price="100.00",
+    )
+
+
+def member_data(i):
+    return {
+        "firstname": "Hans",
+        "lastname": f"Test {i}",
+        "email": f"hans{i}@test.de",
+    }
+
+
+class SeatAllocationTest(TestCase):
+    def setUp(self):
+        self.event = create_event(capacity=2)
+
+    def test_register_until_full_then_waiting(self):
+        statuses = [
+            seats.register_member(self.event, **member_data(i)).attend_status
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, ["registered", "registered", "waiting"])
+        self.assertEqual(self.event.registered_count, 2)
+        self.assertEqual(self.event.waiting_count, 1)
+
+    def test_no_waitlist_raises(self):
+        seats.register_member(self.event, **member_data(1))
+        seats.register_member(self.event, **member_data(2))
+        with self.assertRaises(seats.EventFullError):
+            seats.reserve(self.event, waitlist=False)
+
+    def test_release_unconfirmed_reservation(self):
+        reservation = seats.reserve(self.event, n=2)
+        self.assertEqual(reservation.attend_status, "registered")
+        seats.release(reservation)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 0)
+
+    def test_confirm_needs_single_seat_reservation(self):
+        reservation = seats.reserve(self.event, n=2)
+        with self.assertRaises(ValueError):
+            seats.confirm(reservation, **member_data(1))
+        self.assertFalse(EventMember.objects.exists())
+        seats.release(reservation)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 0)
+
+    def test_cancel_promotes_waiting_member(self):
+        first = seats.register_member(self.event, **member_data(1))
+        seats.register_member(self.event, **member_data(2))
+        waiting = seats.register_member(self.event, **member_data(3))
+
+        promoted = seats.cancel_member(first, promote=True)
+
+        self.assertEqual([m.pk for m in promoted], [waiting.pk])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 2)
+        self.assertEqual(self.event.waiting_count, 0)
+        self.assertEqual(self.event.count_members(), (2, 0))
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class SeatAllocationConcurrencyTest(TransactionTestCase):
+    capacity = 20
+    registrations = 200
+
+    def test_capacity_never_exceeded(self):
+        event = create_event(capacity=self.capacity)
+
+        def register(i):
+            try:
+                return seats.register_member(
+                    Event.objects.get(id=event.id), **member_data(i)
+                ).attend_status
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            statuses = list(executor.map(register, range(self.registrations)))
+
+        self.assertEqual(statuses.count("registered"), self.capacity)
+        self.assertEqual(
+            statuses.count("waiting"), self.registrations - self.capacity
+        )
+        event.refresh_from_db()
+        self.assertEqual(event.registered_count, self.capacity)
+        self.assertEqual(
+            event.count_members(),
+            (self.capacity, self.registrations - self.capacity),
+        )
@@ -1,10 +1,18 @@
 import datetime
+import io
 
+from openpyxl import load_workbook
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.conf import settings
+from django.contrib.auth.models import Group, User
 from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 
 from events.models import (
@@ -14,11 +22,16 @@ from events.models import (
     EventFormat,
     EventLocation,
     EventMember,
+    EventMemberChangeDate,
     EventCollection,
     PayLessAction,
 )
 
 from events.email_template import EmailTemplate
+from shop.models import Order, OrderItem
+from events.caching import get_calendar_cache_stats
+from events.member_search import MEMBER_PAGE_SIZE, count_members
+from events.custom_context_processor import category_renderer, get_events_in_frontend
 
 
 # Function to calculate  elements of a nested dict where the non dict value is list
@@ -118,6 +131,441 @@ class EventListViewTest(TestCase):
         )
 
 
+class FilteredEventListCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        future_date = (timezone.now() + timezone.timedelta(days=7)).date()
+        cls.event = Event.objects.create(
+            name="Cached Event",
+            category=EventCategory.objects.create(name="testcat"),
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            pub_status="PUB",
+            price="100.00",
+        )
+        EventDay.objects.create(
+            event=cls.event,
+            start_date=future_date,
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(12, 0),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_request_is_served_from_cache(self):
+        self.client.get(reverse("event-filter"))
+        self.client.get(reverse("event-filter"))
+        stats = get_calendar_cache_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+    def test_parameter_order_does_not_matter(self):
+        self.client.get(reverse("event-filter") + "?search=cached&cat=")
+        self.client.get(reverse("event-filter") + "?cat=&search=cached")
+        self.assertEqual(get_calendar_cache_stats()["hits"], 1)
+
+    def test_empty_date_param_does_not_share_the_default_key(self):
+        past = Event.objects.create(
+            name="Past Event",
+            category=self.event.category,
+            eventformat=self.event.eventformat,
+            location=self.event.location,
+            pub_status="PUB",
+            price="100.00",
+        )
+        EventDay.objects.create(
+            event=past,
+            start_date=(timezone.now() - timezone.timedelta(days=7)).date(),
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(12, 0),
+        )
+        cache.clear()
+        response = self.client.get(reverse("event-filter") + "?first_day_min=")
+        self.assertContains(response, "Past Event")
+        response = self.client.get(reverse("event-filter"))
+        self.assertNotContains(response, "Past Event")
+        self.assertEqual(get_calendar_cache_stats()["misses"], 2)
+
+    def test_event_change_invalidates_cache(self):
+        response = self.client.get(reverse("event-filter"))
+        self.assertContains(response, "Cached Event")
+        version = get_calendar_cache_stats()["version"]
+        self.event.name = "Renamed Event"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.save()
+            # vor dem Commit bleibt die alte Version gültig
+            self.assertEqual(get_calendar_cache_stats()["version"], version)
+        self.assertGreater(get_calendar_cache_stats()["version"], version)
+        response = self.client.get(reverse("event-filter"))
+        self.assertContains(response, "Renamed Event")
+        self.assertEqual(get_calendar_cache_stats()["misses"], 2)
+
+
+class ContextProcessorCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = EventCategory.objects.create(name="lektorat", position=1)
+        cls.empty_category = EventCategory.objects.create(name="satz", position=2)
+        cls.event = Event.objects.create(
+            name="Frontend Event",
+            category=cls.category,
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            price="100.00",
+            edit_in_frontend=True,
+        )
+        EventDay.objects.create(
+            event=cls.event,
+            start_date=(timezone.now() + timezone.timedelta(days=7)).date(),
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(12, 0),
+        )
+        cls.event.save()
+        cls.group = Group.objects.create(name="ft_orga")
+        cls.event.visible_to_groups.add(cls.group)
+        cls.user = User.objects.create_user(username="orga", password="orgapass")
+        cls.user.groups.add(cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def categories(self):
+        return [c.name for c in category_renderer(None)["all_categories"]]
+
+    def test_categories_are_served_from_cache(self):
+        self.assertEqual(self.categories(), ["lektorat"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.categories(), ["lektorat"])
+
+    def test_category_change_invalidates_categories(self):
+        self.categories()
+        self.category.name = "korrektorat"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+            # erst nach dem Commit neu laden
+            self.assertEqual(self.categories(), ["lektorat"])
+        self.assertEqual(self.categories(), ["korrektorat"])
+
+    def test_event_change_invalidates_categories(self):
+        self.categories()
+        self.event.category = self.empty_category
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.save()
+        self.assertEqual(self.categories(), ["satz"])
+
+    def test_frontend_events_are_cached_until_event_changes(self):
+        self.assertEqual(get_events_in_frontend(self.user), [self.event])
+        # nur noch die Gruppen des Users
+        with self.assertNumQueries(1):
+            self.assertEqual(get_events_in_frontend(self.user), [self.event])
+        self.event.edit_in_frontend = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.save()
+        self.assertEqual(get_events_in_frontend(self.user), [])
+
+    def test_group_change_invalidates_frontend_events(self):
+        self.assertEqual(get_events_in_frontend(self.user), [self.event])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.visible_to_groups.clear()
+        self.assertEqual(get_events_in_frontend(self.user), [])
+
+
+class SearchMembersListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            name="Mitgliederversammlung",
+            label="MV-2025",
+            category=EventCategory.objects.create(name="testcat"),
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            capacity=500,
+            price="100.00",
+        )
+        for i in range(MEMBER_PAGE_SIZE + 10):
+            EventMember.objects.create(
+                event=cls.event,
+                name=f"member-{i}",
+                firstname="Erika",
+                lastname=f"Muster{i:03d}",
+                email=f"erika{i}@example.com",
+                attend_status="registered",
+            )
+        EventMember.objects.create(
+            event=cls.event,
+            name="schulz",
+            firstname="Anna",
+            lastname="Schulz",
+            email="anna@example.com",
+            attend_status="registered",
+        )
+        user = User.objects.create_user(username="orga", password="orgapass")
+        user.groups.add(Group.objects.create(name="ft_orga"))
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username="orga", password="orgapass")
+        self.url = reverse("search-members-list", kwargs={"event": "MV-2025"})
+        self.api_url = reverse("members-api", kwargs={"event": "MV-2025"})
+
+    def test_first_page_and_keyset_continuation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context["event_members"]), MEMBER_PAGE_SIZE)
+        self.assertTemplateUsed(response, "events/includes/member_list.html")
+        response = self.client.get(
+            self.url, {"cursor": response.context["next_cursor"]}
+        )
+        self.assertTemplateUsed(response, "events/includes/member_rows.html")
+        self.assertEqual(len(response.context["event_members"]), 11)
+        self.assertIsNone(response.context["next_cursor"])
+        self.assertEqual(response.context["event_members"][-1].lastname, "Schulz")
+
+    def test_filtered_list_keeps_filter_on_every_page(self):
+        filters = {"member_lastname": "muster", "member_email": "example"}
+        response = self.client.get(self.url, filters)
+        self.assertEqual(len(response.context["event_members"]), MEMBER_PAGE_SIZE)
+        # der Button "weitere laden" gibt die Filter mit dem Cursor weiter
+        self.assertContains(
+            response, "?member_lastname=muster&amp;member_email=example&amp;cursor="
+        )
+        response = self.client.get(
+            self.url, {**filters, "cursor": response.context["next_cursor"]}
+        )
+        self.assertEqual(
+            [member.lastname for member in response.context["event_members"]],
+            [f"Muster{i:03d}" for i in range(MEMBER_PAGE_SIZE, MEMBER_PAGE_SIZE + 10)],
+        )
+        self.assertIsNone(response.context["next_cursor"])
+
+    def test_search_matches_inside_fields(self):
+        response = self.client.get(self.url, {"search": "chul"})
+        self.assertEqual(
+            [member.lastname for member in response.context["event_members"]],
+            ["Schulz"],
+        )
+
+    def test_search_all_terms(self):
+        response = self.client.get(self.url, {"search": "anna schul"})
+        self.assertEqual(
+            [member.lastname for member in response.context["event_members"]],
+            ["Schulz"],
+        )
+        self.assertIsNone(response.context["next_cursor"])
+
+    def test_api_pages_descending_by_keyset(self):
+        data = self.client.get(self.api_url, {"sort": "-lastname"}).json()
+        self.assertEqual(data["count"], MEMBER_PAGE_SIZE + 11)
+        self.assertEqual(data["results"][0]["lastname"], "Schulz")
+        data = self.client.get(
+            self.api_url, {"sort": "-lastname", "cursor": data["next_cursor"]}
+        ).json()
+        self.assertEqual(data["offset"], MEMBER_PAGE_SIZE)
+        self.assertEqual(len(data["results"]), 11)
+        self.assertEqual(data["results"][-1]["lastname"], "Muster000")
+        self.assertIsNone(data["next_cursor"])
+
+    def test_cached_count_follows_member_changes(self):
+        self.assertEqual(self.client.get(self.api_url).json()["count"], 61)
+        with self.captureOnCommitCallbacks(execute=True):
+            EventMember.objects.get(name="schulz").delete()
+        self.assertEqual(self.client.get(self.api_url).json()["count"], 60)
+
+    def test_cached_count_follows_csv_import(self):
+        self.assertEqual(self.client.get(self.api_url).json()["count"], 61)
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "adminpass")
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/admin/events/eventmember/import-csv/",
+                {
+                    "event": self.event.id,
+                    settings.HONEYPOT_FIELD_NAME: "",
+                    "csv_file": SimpleUploadedFile(
+                        "members.csv",
+                        b"firstname;lastname;email\nMax;Neu;max@example.com\n",
+                    ),
+                },
+            )
+        self.client.login(username="orga", password="orgapass")
+        self.assertEqual(self.client.get(self.api_url).json()["count"], 62)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.registered_count, 61)
+
+    def test_count_without_event_is_not_cached(self):
+        queryset = EventMember.objects.filter(event=None)
+        self.assertEqual(count_members(queryset, None), 0)
+        self.assertFalse(cache.get("events:version:members-None"))
+
+
+class MVMembersCsvExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        event = Event.objects.create(
+            name="Digitale Mitgliederversammlung 2023",
+            label="Digitale-Mitgliederversammlung-2023",
+            category=EventCategory.objects.create(name="testcat"),
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            price="100.00",
+        )
+        EventMember.objects.create(
+            event=event,
+            name="mv-member",
+            firstname="Erika",
+            lastname="Muster",
+            email="erika@example.com",
+            attend_status="registered",
+            vote_transfer="Max Muster",
+            vote_transfer_check=True,
+        )
+        user = User.objects.create_user(username="mv", password="mvpass")
+        user.groups.add(Group.objects.create(name="mv_orga"))
+
+    def test_streams_rows_with_vote_transfer_columns(self):
+        self.client.login(username="mv", password="mvpass")
+        response = self.client.get(
+            reverse(
+                "export-members-mv-csv",
+                kwargs={"event": "Digitale-Mitgliederversammlung-2023"},
+            )
+        )
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith("Einverständnis MV"))
+        self.assertTrue(lines[1].startswith("Erika,Muster,erika@example.com"))
+        self.assertTrue(lines[1].endswith("Max Muster,x,"))
+
+
+class ParticipantsXlsxExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            name="Controlling Event",
+            category=EventCategory.objects.create(name="testcat"),
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            capacity=20,
+            price="100.00",
+        )
+        User.objects.create_user(username="staff", password="staffpass", is_staff=True)
+        User.objects.create_superuser(username="admin", password="adminpass")
+
+    def add_member(self, i):
+        EventMember.objects.create(
+            event=self.event,
+            name=f"member-{i}",
+            firstname="Erika",
+            lastname=f"Muster{i}",
+            email=f"erika{i}@example.com",
+            attend_status="registered",
+        )
+        order = Order.objects.create(
+            firstname="Erika", lastname=f"Muster{i}", email=f"erika{i}@example.com"
+        )
+        OrderItem.objects.create(
+            order=order, event=self.event, price=100, premium_price=120
+        )
+        return order
+
+    def export(self):
+        url = reverse(
+            "export-participants",
+            kwargs={"event_id": self.event.id, "version": "controlling"},
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, len(queries)
+
+    def test_controlling_export_with_prejoined_orders(self):
+        self.client.login(username="staff", password="staffpass")
+        order = self.add_member(1)
+        response, query_count = self.export()
+        rows = list(load_workbook(io.BytesIO(response.content)).active.values)
+        self.assertEqual(rows[1][1], "Muster1")
+        self.assertIn(order.get_order_number, rows[1])
+        self.assertIn("100.00", rows[1])
+
+        for i in range(2, 6):
+            self.add_member(i)
+        response, more_query_count = self.export()
+        self.assertEqual(query_count, more_query_count)
+
+    def test_member_changelist_reads_order_annotations(self):
+        self.client.login(username="admin", password="adminpass")
+        url = reverse("admin:events_eventmember_changelist")
+        order = self.add_member(1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, order.get_order_number)
+        for i in range(2, 6):
+            self.add_member(i)
+        with CaptureQueriesContext(connection) as more_queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), len(more_queries))
+
+
+class EventCancellationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            name="Abgesagtes Event",
+            category=EventCategory.objects.create(name="testcat"),
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            capacity=20,
+            price="100.00",
+        )
+        User.objects.create_superuser(username="admin", password="adminpass")
+
+    def add_member(self, i):
+        EventMember.objects.create(
+            event=self.event,
+            firstname="Erika",
+            lastname=f"Muster{i}",
+            email=f"erika{i}@example.com",
+            attend_status="registered",
+        )
+        order = Order.objects.create(
+            firstname="Erika", lastname=f"Muster{i}", email=f"erika{i}@example.com"
+        )
+        OrderItem.objects.create(
+            order=order, event=self.event, price=100, premium_price=120
+        )
+        return order
+
+    def cancel(self):
+        url = reverse("admin:confirm-cancel-event", args=[self.event.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {settings.HONEYPOT_FIELD_NAME: ""})
+        return len(queries)
+
+    def test_cancel_event_in_bulk(self):
+        self.client.login(username="admin", password="adminpass")
+        self.add_member(1)
+        query_count = self.cancel()
+        for i in range(2, 7):
+            self.add_member(i)
+        self.assertEqual(self.cancel(), query_count)
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.status, "cancel")
+        self.assertEqual(self.event.registered_count, 0)
+        self.assertFalse(
+            self.event.members.exclude(attend_status="cancelled").exists()
+        )
+        self.assertFalse(Order.objects.filter(storno=False).exists())
+        self.assertEqual(
+            EventMemberChangeDate.objects.filter(
+                event_member__event=self.event,
+                action="Status von registered zu cancelled geändert",
+            ).count(),
+            6,
+        )
+
+
 #################
 # Testing context
 #################
@@ -13,6 +13,7 @@ from .views import (
     EventMemberDetailView,
     EventUpdateCapacityView,
     FilteredEventListView,
+    calendar_cache_stats,
     EventCreateView,
     EventLocationCreateView,
     EventLocationListView,
@@ -40,6 +41,7 @@ from .views import (
     EventApi,
     EventMembersListView,
     get_members_list,
+    members_table_api,
     search_members_list,
     edit_member,
     edit_member_submit,
@@ -85,6 +87,11 @@ urlpatterns = [
     path("dashboard/", dashboard, name="dashboard"),
     path("event_list/", EventListView.as_view(), name="event-list"),
     path("event_filter/", FilteredEventListView.as_view(), name="event-filter"),
+    path(
+        "event_filter/cache_stats/",
+        calendar_cache_stats,
+        name="calendar-cache-stats",
+    ),
     path("event_create/", EventCreateView.as_view(), name="event-create"),
     path(
         "event_location/lost",
@@ -225,6 +232,7 @@ urlpatterns = [
     ),
     path("ft_members/<event>/", FTEventMembersListView.as_view(), name="ft-members"),
     path("mv_members/<event>/", MVEventMembersListView.as_view(), name="mv-members"),
+    path("members_api/<event>/", members_table_api, name="members-api"),
     path("members_ft/export/csv/", export_ft_members_csv, name="export-members-ft-csv"),
     path(
         "members_ft/export/excel/", export_ft_members_xls, name="export-members-ft-xls"
@@ -1,9 +1,6 @@
-import re
 import logging
 from bs4 import BeautifulSoup
 
-from smtplib import SMTPException
-
 import pandas as pd
 import plotly.express as px
 from plotly.offline import plot
@@ -14,6 +11,8 @@ from django.conf import settings
 from django.http import HttpResponse
 
 from events.email_template import EmailTemplate
+from events.mail_queue import enqueue
+from events import template_registry
 
 from events.parameters import ws_limits
 
@@ -26,7 +25,8 @@ class EmailTemplateError(Exception):
 
 
 def validate_email_template(raw_template, formatting_dict, required=True):
-    required_keys = set(re.findall("{(.+?)}", raw_template))
+    template = template_registry.compile_template(raw_template)
+    required_keys = set(template.placeholders)
     if not required_keys.issubset(set(formatting_dict.keys())):
         if required:
             logger.critical(
@@ -47,28 +47,39 @@ def validate_email_template(raw_template, formatting_dict, required=True):
             )
             return raw_template
 
-    return raw_template.format(**formatting_dict)
+    return template.render(formatting_dict)
+
+
+def render_email_templates(template_name, formatting_dicts, required=True):
+    """
+    Texte einer Vorlage für viele Empfänger (z.B. Absage eines Events),
+    Vorlage und Platzhalter werden nur einmal ermittelt
+    """
+    template = get_email_template(template_name)
+    return [
+        validate_email_template(template.text_template, formatting_dict, required)
+        for formatting_dict in formatting_dicts
+    ]
 
 
 def get_email_template(template_name):
     try:
-        template = EmailTemplate.objects.get(name=template_name)
-        return template
+        return template_registry.get_template(template_name)
     except EmailTemplate.DoesNotExist:
         raise EmailTemplateError("No such template: {}".format(template_name))
 
 
-def send_email(
+def build_email_message(
+    template,
     addresses,
     subject,
     from_email,
     reply_to,
-    template_name,
     formatting_dict=None,
     **kwargs,
 ):
+    """EmailMessage aus einer EmailTemplate, ohne sie zu versenden"""
     formatting_dict = formatting_dict or {}
-    template = get_email_template(template_name)
     text_template = getattr(template, "text_template", "")
     # html_template = getattr(template, "html_template", "")
     invoice_name = kwargs.get("invoice_name")
@@ -93,7 +104,6 @@ def send_email(
     to = addresses.get("to", [])
     cc = addresses.get("cc", [])
     bcc = addresses.get("bcc", settings.EMAIL_NOTIFY_BCC)
-    reply_to = reply_to
 
     msg = EmailMessage(
         subject,
@@ -106,17 +116,29 @@ def send_email(
     )
     if invoice_name and pdf and mime:
         msg.attach(invoice_name, pdf, mime)
+    return msg
 
-    try:
-        msg.send()
-    except (SMTPException, ConnectionRefusedError) as e:
-        logger.critical("Sending email raised an exception: %s", e)
-    else:
-        # increase count on email_template
-        template.add_count()
-        if kwargs.get("verbose", 0) > 1:
-            print(msg)
-        return True
+
+def send_email(
+    addresses,
+    subject,
+    from_email,
+    reply_to,
+    template_name,
+    formatting_dict=None,
+    **kwargs,
+):
+    template = get_email_template(template_name)
+    msg = build_email_message(
+        template, addresses, subject, from_email, reply_to, formatting_dict, **kwargs
+    )
+
+    # versendet wird vom Worker (events.mail_queue), der auch den Zähler der
+    # Vorlage erhöht
+    enqueue(msg, template)
+    if kwargs.get("verbose", 0) > 1:
+        print(msg)
+    return True
 
 
 def send_email_after_registration(to, event, form, template, formatting_dict):
@@ -1,5 +1,4 @@
 import os
-import csv
 import json
 import ast
 from datetime import date, datetime
@@ -7,7 +6,6 @@ import pandas as pd
 from decimal import Decimal
 from itertools import chain
 
-from openpyxl import Workbook
 from .export_excel import ExportExcelAction
 from openpyxl.styles import Font
 from unidecode import unidecode
@@ -17,7 +15,9 @@ import markdown
 from django.db import transaction
 from django.db.models import Max, Q, Sum, Count
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import request, HttpResponse, Http404
+from django.http import request, HttpResponse, Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.contrib import messages
 from django.utils import timezone
 from django.urls import reverse_lazy, reverse
@@ -71,8 +71,43 @@ from rest_framework.decorators import (
 from rest_framework.response import Response
 
 from events.filter import EventFilter
-from events.actions import style_output_file, convert_boolean_field
+from events.listing import group_by_year_and_month, listing_queryset, sort_by_first_day
+from events.search import filter_events
+from events.member_search import (
+    count_members,
+    filter_member_fields,
+    filter_members_list,
+    get_sort,
+    member_list_query,
+    member_page,
+    search_members,
+    MEMBER_SEARCH_FIELDS,
+    MEMBER_SORT_FIELDS,
+)
+from events.caching import (
+    calendar_cache_key,
+    get_calendar_cache_stats,
+    get_or_render_calendar,
+)
+from events.actions import convert_boolean_field
+from events.member_orders import with_order_annotations
+from events.xlsx_export import (
+    WriteOnlySheet,
+    XLSX_CHUNK_SIZE,
+    create_workbook,
+    member_row,
+    xlsx_response,
+)
+from events.csv_export import (
+    CsvColumn,
+    CSV_CHUNK_SIZE,
+    csv_response,
+    format_boolean,
+    format_datetime,
+    streaming_csv_response,
+)
 from events.decorators import check_user_able_to_see_page
+from events import seats
 
 from events.utils import (
     send_email_after_registration,
@@ -278,7 +313,7 @@ class EventListInternalView(LoginRequiredMixin, ListView):
         if "category" in self.request.GET:
             qs = qs.filter(category__name=self.request.GET["category"])
         if "search" in self.request.GET:
-            qs = qs.filter(name__icontains=self.request.GET["search"])
+            qs = filter_events(qs, self.request.GET["search"])
         return qs
 
     def get_context(self):
@@ -325,7 +360,7 @@ class EventListView(ListView):
             queryset = queryset.filter(category__name=self.request.GET.get("cat"))
 
         # return qs
-        return queryset.order_by("first_day")
+        return listing_queryset(queryset.order_by("first_day"))
 
     def get_context_data(self, **kwargs):
         # get moodle courses
@@ -343,24 +378,11 @@ class EventListView(ListView):
             first_day__gte=date.today()
         )
 
-        # sorting events and event_collections
-
-        events_sorted = sorted(
-            chain(events_with_date, event_collections),
-            key=lambda t: t.get_first_day_start_date(),
-        )
+        # sorting events and event_collections by (denormalized) first_day
+        events_sorted = sort_by_first_day(events_with_date, event_collections)
 
         # Version 1
-        events_dict = {}
-
-        for year, group in itertools.groupby(
-            events_sorted, lambda e: e.get_first_day_start_date().strftime("%Y")
-        ):
-            events_dict[year] = {}
-            for month, inner_group in itertools.groupby(
-                group, lambda e: e.get_first_day_start_date().strftime("%B")
-            ):
-                events_dict[year][month] = list(inner_group)
+        events_dict = group_by_year_and_month(events_sorted)
 
         # print(events_dict)
 
@@ -399,7 +421,7 @@ class FilteredEventListView(ListView):
 
         # search
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = filter_events(queryset, search)
 
         if cat and cat == "onlyvfll":
             queryset = queryset.filter(category__belongs_to_all_events=True)
@@ -451,44 +473,56 @@ class FilteredEventListView(ListView):
 
         # Return the filtered queryset
 
-        return self.filterset.qs.distinct()
+        return listing_queryset(self.filterset.qs.distinct())
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        # filtered_queryset = self.filterset.qs.distinct()
+    def get_event_list_context(self):
+        events_with_date = listing_queryset(self.filterset.qs.filter(show_date=True))
+
+        filterset_sorted = sort_by_first_day(events_with_date)
 
-        events_with_date = self.filterset.qs.filter(show_date=True)
+        events_dict = group_by_year_and_month(filterset_sorted)
 
-        filterset_sorted = sorted(
-            events_with_date, key=lambda t: t.get_first_day_start_date()
+        events_without_date = listing_queryset(
+            self.filterset.qs.filter(show_date=False)
         )
+        return {
+            "events_dict": events_dict,
+            "events_without_date": events_without_date,
+            "has_filter": self.has_filter,
+            "show_registration_date": settings.REGISTRATION_DATE_SHOWN_IN_EVENT_LIST,
+        }
 
-        events_dict = {}
+    def render_event_list(self):
+        return render_to_string(
+            "events/includes/event_list_items.html",
+            self.get_event_list_context(),
+        )
 
-        for year, group in itertools.groupby(
-            filterset_sorted, lambda e: e.get_first_day_start_date().strftime("%Y")
-        ):
-            events_dict[year] = {}
-            for month, inner_group in itertools.groupby(
-                group, lambda e: e.get_first_day_start_date().strftime("%B")
-            ):
-                events_dict[year][month] = list(inner_group)
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # filtered_queryset = self.filterset.qs.distinct()
 
         # Pass the filterset to the template - it provides the form.
         context["filterset"] = self.filterset
-        context["events_dict"] = events_dict
         context["has_filter"] = self.has_filter
         context["filter_string"] = self.filter_string
 
-        events_without_date = self.filterset.qs.filter(show_date=False)
-        context["events_without_date"] = events_without_date
-        context["show_registration_date"] = (
-            settings.REGISTRATION_DATE_SHOWN_IN_EVENT_LIST
+        # the list itself is the same for all users with the same filter params,
+        # cart badge and messages are rendered outside of it
+        digest = calendar_cache_key(self.request.GET, date.today())
+        context["event_list_html"] = mark_safe(
+            get_or_render_calendar(digest, self.render_event_list)
         )
 
         return context
 
 
+@staff_member_required
+def calendar_cache_stats(request):
+    # hit/miss counters of the calendar fragment cache
+    return JsonResponse(get_calendar_cache_stats())
+
+
 class EventCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
     permission_required = "events.add_event"
     form_class = EventModelForm
@@ -827,27 +861,16 @@ def search_event(request):
     if request.method == "POST":
         data = request.POST["search"]
 
-        event_queryset_unsorted = (
-            Event.objects.all()
-            .exclude(event_days=None)
-            .filter(pub_status="PUB")
-            .filter(name__icontains=data)
+        event_queryset_unsorted = filter_events(
+            listing_queryset(
+                Event.objects.all().exclude(event_days=None).filter(pub_status="PUB")
+            ),
+            data,
         )  # unsorted
 
-        event_queryset = sorted(
-            event_queryset_unsorted, key=lambda t: t.get_first_day_start_date()
-        )
-
-        events_dict = {}
+        event_queryset = sort_by_first_day(event_queryset_unsorted)
 
-        for year, group in itertools.groupby(
-            event_queryset, lambda e: e.get_first_day_start_date().strftime("%Y")
-        ):
-            events_dict[year] = {}
-            for month, inner_group in itertools.groupby(
-                group, lambda e: e.get_first_day_start_date().strftime("%B")
-            ):
-                events_dict[year][month] = list(inner_group)
+        events_dict = group_by_year_and_month(event_queryset)
         context = {"events_dict": events_dict}
 
         return render(request, "events/event_list_filter.html", context)
@@ -1020,9 +1043,8 @@ def make_event_registration(request, form, event):
     personal_data_dict = get_personal_form_data(form)
     if event.registration_form == "s":
         s_data_dict = get_additional_form_data(form, event, "s")
-        new_member = EventMember.objects.create(
-            event=event, **personal_data_dict, **s_data_dict
-        )
+        # Platz oder Warteliste wird beim Anlegen race-free vergeben
+        new_member = seats.register_member(event, **personal_data_dict, **s_data_dict)
     elif event.registration_form == "w":
         w_data_dict = get_additional_form_data(form, event, "w")
         new_member = EventMember.objects.create(
@@ -1051,7 +1073,7 @@ def make_event_registration(request, form, event):
     Das wird in models.py in der save method hinzugefügt
     """
 
-    member_label = EventMember.objects.latest("date_created").label
+    member_label = new_member.label
 
     if event.registration_form == "s" or event.registration_form == "w":
         # attend_status = get_additional_form_data(form, event, "s")["attend_status"]
@@ -1133,7 +1155,6 @@ def make_event_registration(request, form, event):
         )
 
     # save new member
-    new_member = EventMember.objects.latest("date_created")
     new_member.save()
 
     if vfll_mail_sent:
@@ -1144,6 +1165,8 @@ def make_event_registration(request, form, event):
         new_member.mail_to_member = True
         new_member.save()
 
+    return new_member
+
 
 def add_to_newsletter(email):
     try:
@@ -1153,22 +1176,31 @@ def add_to_newsletter(email):
         newsletter.save()
 
 
+def register_form_submission(request, form, event):
+    """
+    legt die Anmeldung an und gibt den EventMember zurück,
+    None wenn es mit der E-Mail-Adresse schon eine Anmeldung gibt
+    """
+    newsletter = form.cleaned_data.get("newsletter", None)
+    personal_data_dict = get_personal_form_data(form)
+    if no_duplicate_check(personal_data_dict.get("email"), event):
+
+        if newsletter:
+            add_to_newsletter(personal_data_dict.get("email"))
+        return make_event_registration(request, form, event)
+
+    if not event.direct_payment:
+        messages.error(
+            request,
+            "Es gibt bereits eine Anmeldung mit dieser E-Mail-Adresse!",
+            fail_silently=True,
+        )
+    return None
+
+
 def handle_form_submission(request, form, event):
     if form.is_valid():
-        newsletter = form.cleaned_data.get("newsletter", None)
-        personal_data_dict = get_personal_form_data(form)
-        if no_duplicate_check(personal_data_dict.get("email"), event):
-
-            if newsletter:
-                add_to_newsletter(personal_data_dict.get("email"))
-            make_event_registration(request, form, event)
-
-        elif not event.direct_payment:
-            messages.error(
-                request,
-                "Es gibt bereits eine Anmeldung mit dieser E-Mail-Adresse!",
-                fail_silently=True,
-            )
+        register_form_submission(request, form, event)
 
     return form.is_valid()
 
@@ -1351,47 +1383,30 @@ class EventMembersListView(MVOrgaGroupTestMixin, ListView):
         return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        event_members = EventMember.objects.filter(
-            event__label=self.event_label
-        ).order_by("lastname")
-        query_ln = self.request.GET.get("member_lastname")
-        query_fn = self.request.GET.get("member_firstname")
-        query_email = self.request.GET.get("member_email")
-
-        if self.show_vote_transfer:
-            query_vote_transfer_yes = self.request.GET.get("member_vote_transfer_yes")
-            query_vote_transfer_no = self.request.GET.get("member_vote_transfer_no")
-
-        flag = self.request.GET.get("flag")
-        # print(f"flag: {flag}")
-        # print(f"vt: {query_vote_transfer_yes}")
-
-        if query_fn:
-            event_members = event_members.filter(firstname__icontains=query_fn)
-        if query_ln:
-            event_members = event_members.filter(lastname__icontains=query_ln)
-        if query_email:
-            event_members = event_members.filter(email__icontains=query_email)
-
-        if self.show_vote_transfer:
-            if query_vote_transfer_yes:
-                event_members = event_members.exclude(vote_transfer__exact="")
-            if query_vote_transfer_no:
-                event_members = event_members.filter(vote_transfer__exact="")
-        if flag == "duplicates":
-            duplicate_email_list = Event.objects.get(
-                label=self.kwargs["event"]
-            ).get_duplicate_members()
-            event_members = event_members.filter(email__in=duplicate_email_list)
-
-        return event_members
+        self.event = get_object_or_404(Event, label=self.event_label)
+        event_members = EventMember.objects.filter(event=self.event).order_by(
+            "lastname"
+        )
+        return filter_members_list(
+            event_members, self.event, self.request.GET, self.show_vote_transfer
+        )
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super().get_context_data(**kwargs)
         # Add a context
-        context["event"] = Event.objects.get(label=self.event_label)
+        context["event"] = self.event
         context["show_vote_transfer"] = self.show_vote_transfer
+        context["filter_query"] = member_list_query(self.request.GET)
+        context["field_query"] = member_list_query(
+            self.request.GET, exclude=("search",)
+        )
+        # nur die erste Seite, weitere per htmx (search_members_list)
+        (
+            context["event_members"],
+            context["offset"],
+            context["next_cursor"],
+        ) = member_page(self.object_list)
         # print(context)
         return context
 
@@ -1409,28 +1424,45 @@ def get_members_list(request, event):
 
     if not common_group_exists:
         raise PermissionDenied
-    event_members = EventMember.objects.filter(event__label=event).order_by("lastname")
     context = {}
-    context["event"] = Event.objects.get(label=event)
-    context["event_members"] = event_members
+    context["event"] = event_obj
+    (
+        context["event_members"],
+        context["offset"],
+        context["next_cursor"],
+    ) = member_page(EventMember.objects.filter(event=event_obj))
     return render(request, "events/members_list.html", context)
 
 
 @login_required
 def search_members_list(request, event):
-    query = request.GET.get("search", "")
-    event_members = EventMember.objects.filter(event__label=event).order_by("lastname")
-
-    if query:
-        event_members = event_members.filter(
-            Q(lastname__icontains=query)
-            | Q(firstname__icontains=query)
-            | Q(email__icontains=query)
-        )
+    """
+    htmx-Endpoint der Teilnehmersuche, liefert eine Seite (Keyset-Pagination);
+    mit cursor nur die weiteren Zeilen zum Anhängen
+    """
+    from .parameters import has_vote_transfer
 
-    context = {}
-    context["event_members"] = event_members
+    event_obj = get_object_or_404(Event, label=event)
+    cursor = request.GET.get("cursor")
+    event_members = filter_members_list(
+        EventMember.objects.filter(event=event_obj),
+        event_obj,
+        request.GET,
+        has_vote_transfer.get(event_obj.label),
+    )
 
+    context = {}
+    context["event"] = event_obj
+    context["search"] = request.GET.get("search", "")
+    context["filter_query"] = member_list_query(request.GET)
+    (
+        context["event_members"],
+        context["offset"],
+        context["next_cursor"],
+    ) = member_page(event_members, cursor)
+
+    if cursor:
+        return render(request, "events/includes/member_rows.html", context)
     return render(request, "events/includes/member_list.html", context)
 
 
@@ -1464,24 +1496,101 @@ def edit_member_submit(request, member_pk):
     return render(request, "events/includes/member_row.html", context)
 
 
-class FTEventMembersListView(FTOrgaGroupTestMixin, SingleTableView):
+class KeysetMemberTableMixin:
+    """
+    Teilnehmertabellen (django_tables2) seitenweise per Keyset-Pagination
+    statt Paginator mit COUNT/OFFSET, Parameter: sort, cursor und die
+    Suchfelder; die Gesamtzahl kommt aus dem Cache (count_members)
+    """
+
+    table_pagination = False
+    member_filter_params = (
+        "member_firstname",
+        "member_lastname",
+        "member_email",
+        "member_remark",
+    )
+
+    def get_member_event(self):
+        return get_object_or_404(Event, label=self.kwargs["event"])
+
+    def get_filters(self):
+        return {
+            param: self.request.GET.get(param, "").strip()
+            for param in self.member_filter_params
+        }
+
+    def get(self, request, *args, **kwargs):
+        self.event = self.get_member_event()
+        return super().get(request, *args, **kwargs)
+
+    def get_table_data(self):
+        queryset = self.object_list
+        self.sort = get_sort(self.request.GET.get("sort"))
+        self.members, self.offset, self.next_cursor = member_page(
+            queryset, self.request.GET.get("cursor"), sort=self.sort
+        )
+        self.member_count = count_members(
+            queryset, self.event.pk if self.event else None, **self.get_filters()
+        )
+        return self.members
+
+    def get_table_kwargs(self):
+        # sortiert wird in der Datenbank (sort), nicht in der Tabelle
+        return {"orderable": False}
+
+    def get_table(self, **kwargs):
+        table = super().get_table(**kwargs)
+        table.offset = self.offset
+        return table
+
+    def get_page_url(self, **params):
+        query = self.request.GET.copy()
+        query.pop("cursor", None)
+        for key, value in params.items():
+            if value:
+                query[key] = value
+            else:
+                query.pop(key, None)
+        return f"?{query.urlencode()}"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["member_count"] = self.member_count
+        context["sort"] = self.sort
+        context["sort_urls"] = [
+            (
+                field,
+                self.get_page_url(
+                    sort=f"-{field}" if self.sort == field else field
+                ),
+            )
+            for field in MEMBER_SORT_FIELDS
+        ]
+        context["first_page_url"] = self.get_page_url() if self.offset else None
+        context["next_page_url"] = (
+            self.get_page_url(cursor=self.next_cursor) if self.next_cursor else None
+        )
+        return context
+
+
+class FTEventMembersListView(
+    FTOrgaGroupTestMixin, KeysetMemberTableMixin, SingleTableView
+):
     model = EventMember
     table_class = FTEventMembersTable
     template_name = "events/ft_members_list.html"
 
     def get_queryset(self):
-        event_members = EventMember.objects.filter(event__label=self.kwargs["event"])
-        query_ln = self.request.GET.get("member_lastname")
-        query_fn = self.request.GET.get("member_firstname")
-        query_email = self.request.GET.get("member_email")
+        event_members = EventMember.objects.filter(event=self.event)
         query_remark = self.request.GET.get("member_remark")
 
-        if query_fn:
-            event_members = event_members.filter(firstname__icontains=query_fn)
-        if query_ln:
-            event_members = event_members.filter(lastname__icontains=query_ln)
-        if query_email:
-            event_members = event_members.filter(email__icontains=query_email)
+        event_members = filter_member_fields(
+            event_members,
+            firstname=self.request.GET.get("member_firstname"),
+            lastname=self.request.GET.get("member_lastname"),
+            email=self.request.GET.get("member_email"),
+        )
         if query_remark:
             if query_remark.strip() == "*":
                 event_members = event_members.exclude(data__remark="")
@@ -1501,27 +1610,26 @@ class FTEventMembersListView(FTOrgaGroupTestMixin, SingleTableView):
         return context
 
 
-class MVEventMembersListView(MVOrgaGroupTestMixin, SingleTableView):
+class MVEventMembersListView(
+    MVOrgaGroupTestMixin, KeysetMemberTableMixin, SingleTableView
+):
     model = EventMember
     table_class = MVEventMembersTable
     template_name = "events/mv_members_list.html"
+    event_name = "Digitale Mitgliederversammlung 2023"
 
-    def get_queryset(self):
-        event_members = EventMember.objects.filter(
-            event__name="Digitale Mitgliederversammlung 2023"
-        )
-        query_ln = self.request.GET.get("member_lastname")
-        query_fn = self.request.GET.get("member_firstname")
-        query_email = self.request.GET.get("member_email")
+    def get_member_event(self):
+        return Event.objects.filter(name=self.event_name).first()
 
-        if query_fn:
-            event_members = event_members.filter(firstname__icontains=query_fn)
-        if query_ln:
-            event_members = event_members.filter(lastname__icontains=query_ln)
-        if query_email:
-            event_members = event_members.filter(email__icontains=query_email)
+    def get_queryset(self):
+        event_members = EventMember.objects.filter(event__name=self.event_name)
 
-        return event_members
+        return filter_member_fields(
+            event_members,
+            firstname=self.request.GET.get("member_firstname"),
+            lastname=self.request.GET.get("member_lastname"),
+            email=self.request.GET.get("member_email"),
+        )
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
@@ -1532,6 +1640,50 @@ class MVEventMembersListView(MVOrgaGroupTestMixin, SingleTableView):
         return context
 
 
+@login_required
+def members_table_api(request, event):
+    """
+    Teilnehmer eines Events als JSON, eine Seite pro Aufruf
+    Parameter: sort, cursor, search, member_firstname/lastname/email
+    """
+    if not (is_member_of_mv_orga(request.user) or is_member_of_ft_orga(request.user)):
+        raise PermissionDenied
+    event_obj = get_object_or_404(Event, label=event)
+    filters = {
+        field: request.GET.get(f"member_{field}", "").strip()
+        for field in MEMBER_SEARCH_FIELDS
+    }
+    search = request.GET.get("search", "").strip()
+    queryset = search_members(
+        filter_member_fields(EventMember.objects.filter(event=event_obj), **filters),
+        search,
+    )
+    sort = get_sort(request.GET.get("sort"))
+    members, offset, next_cursor = member_page(
+        queryset, request.GET.get("cursor"), sort=sort
+    )
+    return JsonResponse(
+        {
+            "count": count_members(queryset, event_obj.pk, search=search, **filters),
+            "offset": offset,
+            "sort": sort,
+            "next_cursor": next_cursor,
+            "results": [
+                {
+                    "id": member.pk,
+                    "firstname": member.firstname,
+                    "lastname": member.lastname,
+                    "email": member.email,
+                    "attend_status": member.attend_status,
+                    "member_type": member.member_type,
+                    "date_created": member.date_created.isoformat(),
+                }
+                for member in members
+            ],
+        }
+    )
+
+
 class EventMemberDetailView(MVOrgaGroupTestMixin, DetailView):
     model = EventMember
     template_name = "events/member_detail.html"
@@ -1625,11 +1777,13 @@ class EventMemberCreateView(MVOrgaGroupTestMixin, CreateView):
         self.object.takes_part = True
         self.object.agree = True
         self.object.event = self.event
-        if self.event_members.count() >= self.event.capacity:
-            self.object.attend_status = "waiting"
-        else:
-            self.object.attend_status = "registered"
-        return super().form_valid(form)
+        # Platz oder Warteliste race-free vergeben
+        with transaction.atomic():
+            reservation = seats.reserve(self.event)
+            self.object.attend_status = reservation.attend_status
+            self.object._counted_by_reservation = True
+            response = super().form_valid(form)
+        return response
 
     def get_success_url(self):
         return reverse_lazy("members", kwargs={"event": self.event.label})
@@ -1667,38 +1821,19 @@ def export_members_csv(request, event):
     if not common_group_exists:
         raise PermissionDenied
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = (
-        f'attachment; filename="{event}_TN_{date.today()}.csv"'
-    )
-
-    writer = csv.writer(response)
-    writer.writerow(
-        [
-            "Vorname",
-            "Nachname",
-            "E-Mail",
-            "Datum",
-            "Mitgliedschaft",
-        ]
-    )
-
-    members = EventMember.objects.filter(event__label=event).values_list(
-        "firstname",
-        "lastname",
-        "email",
-        "date_created",
-        "member_type",
+    columns = [
+        CsvColumn("Vorname", "firstname"),
+        CsvColumn("Nachname", "lastname"),
+        CsvColumn("E-Mail", "email"),
+        CsvColumn("Datum", "date_created", format_datetime),
+        CsvColumn("Mitgliedschaft", "member_type"),
+    ]
+    return streaming_csv_response(
+        EventMember.objects.filter(event=event_obj),
+        columns,
+        f"{event}_TN_{date.today()}.csv",
     )
 
-    for member in members:
-        member = list(member)
-        member[3] = member[3].strftime("%d.%m.%y %H:%M")
-
-        writer.writerow(member)
-
-    return response
-
 
 @login_required
 @user_passes_test(is_member_of_mv_orga)
@@ -1711,57 +1846,39 @@ def export_mv_members_csv(request, event):
     query_vote_transfer_yes = request.GET.get("member_vote_transfer_yes")
     query_vote_transfer_no = request.GET.get("member_vote_transfer_no")
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = (
-        f'attachment; filename="teilnehmer_{date.today()}.csv"'
-    )
-
-    writer = csv.writer(response)
-    writer_list = ["Vorname", "Nachname", "E-Mail", "Status", "Datum", "Mitgliedschaft"]
+    columns = [
+        CsvColumn("Vorname", "firstname"),
+        CsvColumn("Nachname", "lastname"),
+        CsvColumn("E-Mail", "email"),
+        CsvColumn("Status", "attend_status"),
+        CsvColumn("Datum", "date_created", format_datetime),
+        CsvColumn("Mitgliedschaft", "member_type"),
+    ]
     from .parameters import has_vote_transfer
 
     if has_vote_transfer.get(event, None):
-        writer_list.extend(
-            ["Stimmübertragung", "Check Stimmübertragung", "Einverständnis MV"]
+        columns.extend(
+            [
+                CsvColumn("Stimmübertragung", "vote_transfer"),
+                CsvColumn("Check Stimmübertragung", "vote_transfer_check", format_boolean),
+                CsvColumn("Einverständnis MV", "agree", format_boolean),
+            ]
         )
-    writer.writerow(writer_list)
-
-    members_mv = EventMember.objects.filter(event__label=event)
-    if query_fn:
-        members_mv = members_mv.filter(firstname__icontains=query_fn)
-    if query_ln:
-        members_mv = members_mv.filter(lastname__icontains=query_ln)
-    if query_email:
-        members_mv = members_mv.filter(email__icontains=query_email)
+
+    members_mv = filter_member_fields(
+        EventMember.objects.filter(event__label=event),
+        firstname=query_fn,
+        lastname=query_ln,
+        email=query_email,
+    )
     if query_vote_transfer_yes:
         members_mv = members_mv.exclude(vote_transfer__exact="")
     if query_vote_transfer_no:
         members_mv = members_mv.filter(vote_transfer__exact="")
 
-    members_mv = members_mv.values_list(
-        "firstname",
-        "lastname",
-        "email",
-        "attend_status",
-        "date_created",
-        "member_type",
+    return streaming_csv_response(
+        members_mv, columns, f"teilnehmer_{date.today()}.csv"
     )
-    if has_vote_transfer.get(event, None):
-        members_mv.extend(
-            members_mv.values_list(
-                "vote_transfer",
-                "vote_transfer_check",
-                "agree",
-            )
-        )
-
-    for member in members_mv:
-        member = list(member)
-        member[4] = member[4].strftime("%d.%m.%y %H:%M")
-
-        writer.writerow(member)
-
-    return response
 
 
 def download(request, path):
@@ -1879,56 +1996,55 @@ def ft_members_dashboard_view(request):
 
 @staff_member_required
 def ft_report(request):
-    qs = EventMember.objects.filter(event__label="ffl_mv_2024")
+    event = Event.objects.filter(label="ffl_mv_2024").only("id").first()
+    qs = EventMember.objects.filter(event=event)
     template_name = "admin/events/ft_report.html"
-    return render(request, template_name, {"members": qs, "number_members": len(qs)})
+    return render(
+        request,
+        template_name,
+        {
+            "members": qs,
+            "number_members": count_members(qs, event.pk) if event else 0,
+        },
+    )
 
 
 @login_required
 def export_ft_members_csv(request):
-    response = HttpResponse(content_type="text/csv")
     date = datetime.today().strftime("%Y-%m-%d")
-    response["Content-Disposition"] = f"attachment; filename='members_ft_{date}.csv'"
-
-    writer = csv.writer(response)
-    writer.writerow(
-        [
-            "Vorname",
-            "Nachname",
-            "E-Mail",
-            "Adresszusatz",
-            "Straße",
-            "PLZ",
-            "Ort",
-            "Tel.",
-            "Anmeldedatum",
-            "Workshop",
-            "WS-Alternative",
-            "MV",
-            "Mittagessen",
-            "Führung",
-            "Netzwerkabend",
-            "Yoga",
-            "Feier",
-            "Essenswunsch",
-            "Mitgliedschaft",
-            "kein Mitglied",
-            "Bemerkung",
-        ]
-    )
+    header = [
+        "Vorname",
+        "Nachname",
+        "E-Mail",
+        "Adresszusatz",
+        "Straße",
+        "PLZ",
+        "Ort",
+        "Tel.",
+        "Anmeldedatum",
+        "Workshop",
+        "WS-Alternative",
+        "MV",
+        "Mittagessen",
+        "Führung",
+        "Netzwerkabend",
+        "Yoga",
+        "Feier",
+        "Essenswunsch",
+        "Mitgliedschaft",
+        "kein Mitglied",
+        "Bemerkung",
+    ]
 
     members_ft = EventMember.objects.filter(event__label="ffl_mv_2024")
-
-    data_list = members_ft.values_list(
-        "data",
+    # Formulardaten (JSON), eine Spalte pro Eintrag
+    rows = (
+        list((data or {}).values())
+        for data in members_ft.values_list("data", flat=True).iterator(
+            chunk_size=CSV_CHUNK_SIZE
+        )
     )
-
-    for member in members_ft:
-        json_object = member.data
-        values = list(json_object.values())
-        writer.writerow(values)
-
-    return response
+    return csv_response(header, rows, f"members_ft_{date}.csv")
 
 
 @login_required
@@ -2042,28 +2158,15 @@ def export_moodle_participants(request, event_id):
     participants = event.members.all().filter(attend_status="registered")
     today = date.today()
     filename = f"members_{event.label}_{today}.csv"
-    response = HttpResponse(content_type="text/csv")
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-
-    writer = csv.writer(response)
-    fields_to_export = [
-        "email",
-        "firstname",
-        "lastname",
-        "email",
+    columns = [
+        CsvColumn("username", "email"),
+        CsvColumn("firstname", "firstname"),
+        CsvColumn("lastname", "lastname"),
+        CsvColumn("email", "email"),
+        CsvColumn("course1", value=event.label),
+        CsvColumn("role1", value="student"),
     ]
-    header_list = ["username", "firstname", "lastname", "email", "course1", "role1"]
-    writer.writerow(header_list)
-    # Write data rows
-    print("event label: ", event.label)
-    for member in participants:
-        row = [getattr(member, field) for field in fields_to_export]
-        print("row: ", row)
-        row.append(event.label)
-        row.append("student")
-        writer.writerow(row)
-    return response
+    return streaming_csv_response(participants, columns, filename)
 
 
 def export_participants(request, event_id, version):
@@ -2105,82 +2208,37 @@ def export_participants(request, event_id, version):
         file_name = f"TeilnehmerInnen_{event.label}_{datetime.now().date()}"
         sheet_title = "TeilnehmerInnen"
 
-    # invoice_items_list = ["get_cost_property", "order", "get_invoice_number"]
-
+    wb = create_workbook()
+    ws = WriteOnlySheet(wb, sheet_title)
     blank_line = []
-    wb = Workbook()
-    ws = wb.active
-    ws.title = sheet_title
 
     ws.append(
-        ExportExcelAction.generate_header(EventMemberAdmin, EventMember, field_names)
+        ExportExcelAction.generate_header(EventMemberAdmin, EventMember, field_names),
+        bold=True,
     )
 
-    # if version == "participants":
-    #     ws.append(
-    #         ExportExcelAction.generate_header(
-    #             EventMemberAdmin, EventMember, field_names
-    #         )
-    #     )
-    # elif version == "controlling":
-    #     ws.append(
-    #         ExportExcelAction.generate_header(
-    #             OrderItemAdmin, OrderItem, invoice_items_list
-    #         )
-    #     )
-
-    def iterate(ws, queryset, admin_cls, field_names):
-        from django.contrib import admin
-
-        # get model for admin_cls
-        model_class = EventMember
-        # crate instance of admin_cls
-        admin_cls_instance = admin_cls(model_class, admin.site)
-        counter = 1
-        for obj in queryset:
-            row = [str(counter)]
-            for field in field_names:
-                is_admin_field = hasattr(admin_cls, field)
-                if (
-                    is_admin_field and not field == "check"
-                ):  # check is also admin_field, but we need model field
-                    # if field == "get_order":
-                    #     get_order = getattr(admin_cls_instance, field)
-                    #     value = get_order(obj)
-                    # else:
-                    #     value = getattr(admin_cls, field)(obj)
-                    method = getattr(admin_cls_instance, field)
-                    value = method(obj)
-                    if isinstance(value, bool):
-                        value = convert_boolean_field(value)
-                else:
-                    value = getattr(obj, field)
-                    if isinstance(value, datetime) or isinstance(value, date):
-                        value = convert_data_date(value)
-                    elif isinstance(value, bool):
-                        value = convert_boolean_field(value)
-                    elif value == None:
-                        value = ""
+    from django.contrib import admin
 
-                row.append(str(value))
+    admin_instance = EventMemberAdmin(EventMember, admin.site)
 
-            ws.append(row)
-            counter += 1
+    def iterate(ws, queryset):
+        members = queryset.iterator(chunk_size=XLSX_CHUNK_SIZE)
+        for counter, obj in enumerate(members, 1):
+            row = member_row(obj, field_names, admin_instance)
+            ws.append([str(counter)] + row)
 
     # all data
-    qs_event_members = event.members.all()
-    qs_event_members_registered = qs_event_members.filter(
-        Q(attend_status="registered")
-    ).annotate(vfll_true=Count("vfll", filter=Q(vfll=True)))
-    admin_cls = EventMemberAdmin
+    qs_event_members = event.members.order_by("id")
+    if version == "controlling":
+        # Rechnungsdaten per Subquery in derselben Query
+        qs_event_members = with_order_annotations(qs_event_members)
     # registered participants
-    iterate(ws, qs_event_members_registered, admin_cls, field_names)
+    iterate(ws, qs_event_members.filter(attend_status="registered"))
     if version == "controlling":
-        qs_event_members_waiting = qs_event_members.filter(Q(attend_status="waiting"))
         ws.append(blank_line)
         # waiting participants on same sheet
         ws.append(["", "Warteliste"])
-        iterate(ws, qs_event_members_waiting, admin_cls, field_names)
+        iterate(ws, qs_event_members.filter(attend_status="waiting"))
         # Speakers
         ws.append(blank_line)
         ws.append(["", "Referentinnen"])
@@ -2206,49 +2264,8 @@ def export_participants(request, event_id, version):
         ws.append(
             ["", "Veranstalter:", event.organizer.name if event.organizer else ""]
         )
-        # for field_name in field_names:
-        #     value = getattr(event, field_name)
-        #     if isinstance(value, datetime) or isinstance(value, date):
-        #         value = convert_data_date(value)
-        #     elif isinstance(value, bool):
-        #         value = convert_boolean_field(value)
-        #     ws.append(["", field_name, value])
-
-    # invoices items on next sheet
-    # qs_order_items = OrderItem.objects.filter(event=event)
-    # admin_cls = OrderItemAdmin
-    # iterate(ws2, qs_order_items, admin_cls, invoice_items_list)
-
-    # sum of costs
-    # total_costs = sum(item.get_cost_property for item in qs_order_items)
-
-    # ws2.append(blank_line)
-    # ws2.append(["Summe", total_costs])
-
-    ws = style_output_file(ws)
-    # ws1 = style_output_file(ws1)
-    # ws2 = style_output_file(ws1)
-
-    # Controlling
-    # ws3.append(["Veranstaltung:", event.name])
-    # ws3.append(["Anz. TN:", len(qs_event_members_registered)])
-    # ws3.append(["Einnahmen:", total_costs])
-    # total_vfll_true = sum(obj.vfll_true for obj in qs_event_members_registered)
-    # ws3.append(["vfll Mitglieder:", total_vfll_true])
-    # memberships_list = []  #
-    # # obj.memberships is str repr of list so it must be converted to list
-    # for obj in qs_event_members_registered:
-    #     if not obj.vfll:
-    #         memberships_list.extend(ast.literal_eval(obj.memberships))
-    # for ms_short, ms_long in MEMBERSHIP_CHOICES:
-    #     ws3.append([ms_long, memberships_list.count(ms_short)])
 
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response["Content-Disposition"] = f"attachment; filename={file_name}.xlsx"
-    wb.save(response)
-    return response
+    return xlsx_response(wb, [ws], file_name)
 
 
 @login_required
@@ -0,0 +1,108 @@
+"""
+XLSX-Exporte mit openpyxl im write-only Modus
+
+Zeilen werden direkt in die Datei geschrieben statt als Cell-Objekte im
+Speicher gehalten zu werden. Die Spaltenbreiten werden beim Schreiben aus
+den ersten WIDTH_SAMPLE_ROWS Zeilen ermittelt (write-only Blätter brauchen
+die Breiten vor der ersten Zeile), danach wird nur noch gestreamt.
+
+Rechnungsdaten der Teilnehmer (get_order_nr, get_order_price,
+get_payment_receipt) kommen aus den Annotationen von
+events.member_orders.with_order_annotations statt aus Queries pro Zeile.
+"""
+
+from datetime import date, datetime
+
+from django.http import HttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from .utils import convert_boolean_field, convert_data_date
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_CHUNK_SIZE = 2000
+WIDTH_SAMPLE_ROWS = 500
+
+
+class WriteOnlySheet:
+    """Tabellenblatt, das die Spaltenbreiten beim Schreiben mitberechnet"""
+
+    def __init__(self, workbook, title, sample_rows=WIDTH_SAMPLE_ROWS):
+        self.ws = workbook.create_sheet(title)
+        self.sample_rows = sample_rows
+        self.widths = {}
+        self.buffer = []
+        self.header_font = Font(color="000000", bold=True)
+
+    def _measure(self, row):
+        for index, value in enumerate(row, 1):
+            if value not in (None, ""):
+                width = len(str(value)) + 2
+                self.widths[index] = max(self.widths.get(index, 0), width)
+
+    def _write(self, row, bold):
+        if bold:
+            cells = []
+            for value in row:
+                cell = WriteOnlyCell(self.ws, value=value)
+                cell.font = self.header_font
+                cells.append(cell)
+            row = cells
+        self.ws.append(row)
+
+    def _flush(self):
+        for index, width in self.widths.items():
+            self.ws.column_dimensions[get_column_letter(index)].width = width
+        for row, bold in self.buffer:
+            self._write(row, bold)
+        self.buffer = None
+
+    def append(self, row, bold=False):
+        if self.buffer is None:
+            self._write(row, bold)
+            return
+        self._measure(row)
+        self.buffer.append((row, bold))
+        if len(self.buffer) >= self.sample_rows:
+            self._flush()
+
+    def close(self):
+        if self.buffer is not None:
+            self._flush()
+
+
+def create_workbook():
+    return Workbook(write_only=True)
+
+
+def xlsx_response(workbook, sheets, file_name):
+    for sheet in sheets:
+        sheet.close()
+    response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
+    response["Content-Disposition"] = f"attachment; filename={file_name}.xlsx"
+    workbook.save(response)
+    return response
+
+
+def format_value(value):
+    if isinstance(value, (datetime, date)):
+        return convert_data_date(value)
+    if isinstance(value, bool):
+        return convert_boolean_field(value)
+    if value is None:
+        return ""
+    return value
+
+
+def member_row(member, field_names, admin=None):
+    """Werte einer Zeile: Model-Felder und Admin-Methoden (ohne "check")"""
+    row = []
+    for field in field_names:
+        if admin is not None and hasattr(admin, field) and field != "check":
+            value = getattr(admin, field)(member)
+        else:
+            value = getattr(member, field, "")
+        row.append(str(format_value(value)))
+    return row
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.shortcuts import render
 from django.http import HttpResponseRedirect
 
-from moodle.models import MoodleUser
+from moodle.models import MoodleCourseSync, MoodleUser
 from events.models import Event
 from moodle.forms import EventForm
 
@@ -39,3 +39,8 @@ class MoodleUserAdmin(admin.ModelAdmin):
         return render(request, "admin/event_choose.html", {'items': queryset, 'form': form})
 
 
+
+
+@admin.register(MoodleCourseSync)
+class MoodleCourseSyncAdmin(admin.ModelAdmin):
+    list_display = ["moodle_id", "timemodified", "synced"]
@@ -0,0 +1,234 @@
+"""
+Client für die Moodle-Webservices (REST, JSON)
+
+Eine Instanz hält eine requests.Session mit Connection-Pool (Keep-Alive),
+alle Aufrufe haben einen Timeout. Fehler werden nicht mehr ausgegeben,
+sondern als Exceptions aus events/exception.py geworfen:
+- MoodleException: Moodle hat einen Fehler geliefert (errorcode, exception,
+  message)
+- NetworkMoodleException: Verbindung/Timeout/HTTP-Fehler nach allen Versuchen
+- EmptyResponseException: leere Antwort
+
+Wiederholt wird mit Backoff bei Verbindungsfehlern (der Request ist dann
+nicht angekommen), bei lesenden Funktionen ("_get_") auch bei Timeouts und
+5xx-Antworten; schreibende Funktionen werden sonst nicht doppelt ausgeführt.
+
+map/gather verteilen viele Aufrufe auf einen Thread-Pool, die Laufzeit
+hängt dann vom langsamsten Aufruf ab statt von der Summe:
+
+    client = get_client()
+    users = client.map("core_enrol_get_enrolled_users",
+                       [{"courseid": id} for id in course_ids])
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from events.exception import (
+    EmptyResponseException,
+    MoodleException,
+    NetworkMoodleException,
+)
+from events.warnings import Warning
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) in Sekunden
+MOODLE_TIMEOUT = (3.05, 30)
+MOODLE_RETRIES = 2
+MOODLE_BACKOFF = 0.5
+MOODLE_MAX_WORKERS = 8
+
+RETRY_STATUS = (429, 502, 503, 504)
+
+MOODLE_ERRORS = (MoodleException, NetworkMoodleException, EmptyResponseException)
+
+
+def is_read_only(fname):
+    return "_get_" in fname
+
+
+class MoodleClient:
+    def __init__(
+        self,
+        url=None,
+        token=None,
+        timeout=None,
+        retries=None,
+        backoff=None,
+        max_workers=None,
+        session=None,
+    ):
+        self.url = url or settings.MOODLE_URL + settings.MOODLE_ENDPOINT
+        self.token = token if token is not None else settings.MOODLE_SECRET
+        self.timeout = timeout or getattr(settings, "MOODLE_TIMEOUT", MOODLE_TIMEOUT)
+        self.retries = (
+            retries
+            if retries is not None
+            else getattr(settings, "MOODLE_RETRIES", MOODLE_RETRIES)
+        )
+        self.backoff = (
+            backoff
+            if backoff is not None
+            else getattr(settings, "MOODLE_BACKOFF", MOODLE_BACKOFF)
+        )
+        self.max_workers = max_workers or getattr(
+            settings, "MOODLE_MAX_WORKERS", MOODLE_MAX_WORKERS
+        )
+        self.session = session or requests.Session()
+        # ein Pool-Platz pro Thread, sonst werden Verbindungen verworfen
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.max_workers, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _post(self, fname, params):
+        data = dict(params)
+        data.update(
+            {
+                "wstoken": self.token,
+                "moodlewsrestformat": "json",
+                "wsfunction": fname,
+            }
+        )
+        return self.session.post(self.url, data=data, timeout=self.timeout)
+
+    def _should_retry(self, fname, error=None, response=None):
+        if isinstance(error, requests.ConnectionError) and not isinstance(
+            error, requests.ReadTimeout
+        ):
+            return True
+        if not is_read_only(fname):
+            return False
+        if isinstance(error, requests.Timeout):
+            return True
+        return response is not None and response.status_code in RETRY_STATUS
+
+    def call(self, fname, **params):
+        """Ergebnis der Webservice-Funktion (JSON), wirft MoodleException & Co."""
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = self._post(fname, params)
+            except requests.RequestException as e:
+                if last_attempt or not self._should_retry(fname, error=e):
+                    raise NetworkMoodleException(
+                        exception=e, message=f"{fname}: {e}"
+                    ) from e
+            else:
+                if response.ok:
+                    return self.process_response(fname, response)
+                if last_attempt or not self._should_retry(fname, response=response):
+                    raise NetworkMoodleException(
+                        message=f"{fname}: HTTP {response.status_code}"
+                    )
+            time.sleep(self.backoff * 2**attempt)
+
+    def process_response(self, fname, response):
+        if not response.content:
+            raise EmptyResponseException()
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise NetworkMoodleException(
+                exception=e, message=f"{fname}: keine gültige JSON-Antwort"
+            ) from e
+        if isinstance(data, dict):
+            if "exception" in data or "errorcode" in data:
+                raise MoodleException(
+                    errorcode=data.get("errorcode", ""),
+                    exception=data.get("exception", ""),
+                    message=data.get("message", ""),
+                )
+            for warning in self.get_warnings(data):
+                logger.warning(
+                    "Moodle %s: %s (%s)", fname, warning, warning.warningcode
+                )
+        return data
+
+    @staticmethod
+    def get_warnings(data):
+        return [
+            Warning(
+                item=item.get("item"),
+                itemid=item.get("itemid"),
+                warningcode=item.get("warningcode", ""),
+                message=item.get("message", ""),
+            )
+            for item in data.get("warnings") or []
+        ]
+
+    def gather(self, calls, return_exceptions=False):
+        """
+        führt [(fname, params), ...] parallel aus, Ergebnisse in derselben
+        Reihenfolge; mit return_exceptions stehen Fehler statt Ergebnissen
+        in der Liste, sonst wird der erste Fehler geworfen
+        """
+        calls = list(calls)
+        if not calls:
+            return []
+
+        def run(call):
+            fname, params = call
+            try:
+                return self.call(fname, **params)
+            except MOODLE_ERRORS as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        if len(calls) == 1:
+            return [run(calls[0])]
+        workers = min(self.max_workers, len(calls))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, calls))
+
+    def map(self, fname, params_list, return_exceptions=False):
+        """dieselbe Funktion für viele Parameter-Dicts parallel"""
+        return self.gather(
+            [(fname, params) for params in params_list], return_exceptions
+        )
+
+
+_local = threading.local()
+
+
+def get_client():
+    """MoodleClient des aktuellen Threads (Session wird wiederverwendet)"""
+    client = getattr(_local, "client", None)
+    if client is None:
+        client = _local.client = MoodleClient()
+    return client
+
+
+def error_response(e):
+    """MoodleException als Dict, wie Moodle es liefert"""
+    return {"exception": e.exception, "errorcode": e.errorcode, "message": e.message}
+
+
+def call(fname, **kwargs):
+    """
+    wie bisher: Fehler von Moodle kommen als Dict mit "exception"/"errorcode"
+    zurück (die Admin-Aktionen prüfen darauf), Netzwerkfehler werden geworfen
+    """
+    try:
+        return get_client().call(fname, **kwargs)
+    except MoodleException as e:
+        logger.warning("Moodle %s: %s (%s)", fname, e, e.errorcode)
+        return error_response(e)
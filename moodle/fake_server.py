@@ -0,0 +1,317 @@
+"""
+Moodle-Webservice-Simulator für Tests und Benchmarks
+
+FakeMoodleServer startet einen HTTP-Server im eigenen Prozess (Thread) und
+beantwortet die Webservice-Funktionen, die das Projekt nutzt, aus einem
+Datensatz im Speicher:
+
+    with FakeMoodleServer(make_dataset(courses=50, users=30), latency=0.05) as m:
+        sync_courses(client=m.client())
+        print(m.calls)
+
+- latency: Wartezeit pro Aufruf in Sekunden
+- failure_rate: Anteil der Aufrufe, die mit HTTP 503 abgelehnt werden
+- fail_functions: {wsfunction: Anzahl} die nächsten Aufrufe schlagen fehl
+Fehler im Moodle-Format (ungültiges Token, doppelter Benutzername, ...)
+werden wie von Moodle als JSON mit exception/errorcode geliefert.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from moodle.client import MoodleClient
+
+FAKE_MOODLE_TOKEN = "fake-token"
+FAKE_MOODLE_ENDPOINT = "/webservice/rest/server.php"
+
+STUDENT_ROLE_ID = 5
+TRAINER_ROLE_ID = 3
+
+WS_FUNCTIONS = (
+    "core_course_get_courses",
+    "core_course_create_courses",
+    "core_course_delete_courses",
+    "core_enrol_get_enrolled_users",
+    "core_user_get_users_by_field",
+    "core_user_create_users",
+    "enrol_manual_enrol_users",
+    "enrol_manual_unenrol_users",
+)
+
+
+class FakeMoodleError(Exception):
+    def __init__(self, errorcode, message):
+        super().__init__(message)
+        self.errorcode = errorcode
+        self.message = message
+
+
+def parse_params(pairs):
+    """
+    PHP-Parameter wie "users[0][email]" in verschachtelte Dicts/Listen
+    zerlegen: {"users": [{"email": ...}]}
+    """
+    data = {}
+    for key, value in pairs:
+        parts = re.findall(r"[^\[\]]+", key)
+        target = data
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+
+    def to_lists(value):
+        if isinstance(value, dict):
+            if value and all(k.isdigit() for k in value):
+                return [to_lists(value[k]) for k in sorted(value, key=int)]
+            return {k: to_lists(v) for k, v in value.items()}
+        return value
+
+    return to_lists(data)
+
+
+class MoodleDataset:
+    """Kurse, User und Einschreibungen des simulierten Moodle"""
+
+    def __init__(self):
+        self.courses = {}
+        self.users = {}
+        # {courseid: {userid: {roleid}}}
+        self.enrolments = {}
+        self.lock = threading.Lock()
+        self._next_id = 1
+
+    def next_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def add_course(self, fullname, shortname, categoryid=4, **values):
+        course_id = self.next_id()
+        now = int(time.time())
+        self.courses[course_id] = {
+            "id": course_id,
+            "categoryid": int(categoryid),
+            "fullname": fullname,
+            "shortname": shortname,
+            "summary": values.get("summary", ""),
+            "startdate": int(values.get("startdate", now)),
+            "enddate": int(values.get("enddate", now + 86400)),
+            "timemodified": now,
+        }
+        self.enrolments[course_id] = {}
+        return self.courses[course_id]
+
+    def add_user(self, username, email, firstname="", lastname=""):
+        if any(user["username"] == username for user in self.users.values()):
+            raise FakeMoodleError(
+                "invalidparameter", f"Username already exists: {username}"
+            )
+        user_id = self.next_id()
+        self.users[user_id] = {
+            "id": user_id,
+            "username": username,
+            "email": email,
+            "firstname": firstname,
+            "lastname": lastname,
+        }
+        return self.users[user_id]
+
+    def enrol(self, userid, courseid, roleid):
+        if courseid not in self.courses or userid not in self.users:
+            raise FakeMoodleError("invalidrecord", "Can't find data record")
+        self.enrolments[courseid].setdefault(userid, set()).add(roleid)
+
+
+def make_dataset(courses=10, users=20, trainers=1, seed=0):
+    """courses Kurse mit je users Teilnehmern und trainers Trainern"""
+    rng = random.Random(seed)
+    dataset = MoodleDataset()
+    for c in range(courses):
+        course = dataset.add_course(
+            f"Kurs {c}", f"K-{c}", categoryid=rng.choice([3, 4])
+        )
+        for u in range(users + trainers):
+            user = dataset.add_user(
+                f"user{c}-{u}", f"user{c}-{u}@example.com", "Hans", f"Test{u}"
+            )
+            roleid = TRAINER_ROLE_ID if u < trainers else STUDENT_ROLE_ID
+            dataset.enrol(user["id"], course["id"], roleid)
+    return dataset
+
+
+class FakeMoodleHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        pairs = parse_qsl(self.rfile.read(length).decode(), keep_blank_values=True)
+        self.respond(*self.server.moodle.handle(pairs))
+
+    def do_GET(self):
+        query = self.path.partition("?")[2]
+        self.respond(*self.server.moodle.handle(parse_qsl(query)))
+
+    def respond(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeMoodleServer:
+    def __init__(
+        self,
+        dataset=None,
+        latency=0,
+        failure_rate=0,
+        fail_functions=None,
+        token=FAKE_MOODLE_TOKEN,
+        seed=0,
+    ):
+        self.dataset = dataset or MoodleDataset()
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.fail_functions = dict(fail_functions or {})
+        self.token = token
+        self.calls = Counter()
+        self.requests = []
+        self._random = random.Random(seed)
+        self._server = None
+
+    # Server
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMoodleHandler)
+        self._server.daemon_threads = True
+        self._server.moodle = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}{FAKE_MOODLE_ENDPOINT}"
+
+    def client(self, **kwargs):
+        kwargs.setdefault("backoff", 0)
+        return MoodleClient(url=self.url, token=self.token, **kwargs)
+
+    # Webservice
+
+    def handle(self, pairs):
+        """(HTTP-Status, JSON-Daten) für einen Aufruf"""
+        params = dict(pairs)
+        fname = params.get("wsfunction", "")
+        with self.dataset.lock:
+            self.calls[fname] += 1
+            self.requests.append(params)
+            fail = self.fail_functions.get(fname, 0)
+            if fail:
+                self.fail_functions[fname] = fail - 1
+            elif self.failure_rate:
+                fail = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 503, {"error": "service unavailable"}
+        if params.get("wstoken") != self.token:
+            return 200, self.error("invalidtoken", "Invalid token - token not found")
+        if fname not in WS_FUNCTIONS:
+            return 200, self.error(
+                "invalidrecord", f"Can't find data record in database table: {fname}"
+            )
+        try:
+            with self.dataset.lock:
+                return 200, getattr(self, fname)(parse_params(pairs))
+        except FakeMoodleError as e:
+            return 200, self.error(e.errorcode, e.message)
+        except (KeyError, ValueError) as e:
+            return 200, self.error("invalidparameter", f"Invalid parameter: {e}")
+
+    @staticmethod
+    def error(errorcode, message):
+        return {
+            "exception": "moodle_exception",
+            "errorcode": errorcode,
+            "message": message,
+        }
+
+    def core_course_get_courses(self, params):
+        ids = [int(i) for i in params.get("options", {}).get("ids", [])]
+        courses = self.dataset.courses
+        return [dict(courses[i]) for i in ids or courses if i in courses]
+
+    def core_enrol_get_enrolled_users(self, params):
+        course_id = int(params["courseid"])
+        if course_id not in self.dataset.courses:
+            raise FakeMoodleError("invalidrecord", "Can't find data record")
+        users = self.dataset.users
+        return [
+            dict(users[userid], roles=[{"roleid": r} for r in sorted(roles)])
+            for userid, roles in self.dataset.enrolments[course_id].items()
+        ]
+
+    def core_user_get_users_by_field(self, params):
+        values = set(params.get("values", []))
+        return [
+            dict(user)
+            for user in self.dataset.users.values()
+            if str(user[params["field"]]) in values
+        ]
+
+    def core_user_create_users(self, params):
+        created = []
+        for user in params["users"]:
+            new = self.dataset.add_user(
+                user["username"],
+                user["email"],
+                user.get("firstname", ""),
+                user.get("lastname", ""),
+            )
+            created.append({"id": new["id"], "username": new["username"]})
+        return created
+
+    def enrol_manual_enrol_users(self, params):
+        for enrolment in params["enrolments"]:
+            self.dataset.enrol(
+                int(enrolment["userid"]),
+                int(enrolment["courseid"]),
+                int(enrolment["roleid"]),
+            )
+        return None
+
+    def enrol_manual_unenrol_users(self, params):
+        for enrolment in params["enrolments"]:
+            course = self.dataset.enrolments.get(int(enrolment["courseid"]), {})
+            course.pop(int(enrolment["userid"]), None)
+        return None
+
+    def core_course_create_courses(self, params):
+        created = []
+        for course in params["courses"]:
+            new = self.dataset.add_course(**course)
+            created.append({"id": new["id"], "shortname": new["shortname"]})
+        return created
+
+    def core_course_delete_courses(self, params):
+        for course_id in params["courseids"]:
+            self.dataset.courses.pop(int(course_id), None)
+            self.dataset.enrolments.pop(int(course_id), None)
+        return {"warnings": []}
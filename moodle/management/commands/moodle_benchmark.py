@@ -0,0 +1,114 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from events.models import Event, EventCategory, EventFormat, EventLocation
+from moodle.fake_server import FakeMoodleServer, make_dataset
+from moodle.provisioning import enrol_registered_members
+from moodle.sync import sync_courses
+
+
+class Command(BaseCommand):
+    help = (
+        "Misst den Moodle-Abgleich und die Einschreibung gegen einen simulierten "
+        "Moodle-Server (moodle.fake_server): Aufrufe, DB-Queries und Laufzeit. "
+        "Alle Änderungen an der Datenbank werden am Ende zurückgerollt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=50)
+        parser.add_argument("--users", type=int, default=30, help="pro Kurs")
+        parser.add_argument(
+            "--latency", type=float, default=0.02, help="Sekunden pro Aufruf"
+        )
+        parser.add_argument(
+            "--failure-rate",
+            type=float,
+            default=0,
+            help="Anteil der Aufrufe, die mit HTTP 503 scheitern",
+        )
+        parser.add_argument(
+            "--workers", type=int, help="parallele Aufrufe (MOODLE_MAX_WORKERS)"
+        )
+        parser.add_argument(
+            "--enrol", type=int, default=60, help="Teilnehmer für die Einschreibung"
+        )
+
+    def handle(self, *args, **options):
+        dataset = make_dataset(courses=options["courses"], users=options["users"])
+        with FakeMoodleServer(
+            dataset,
+            latency=options["latency"],
+            failure_rate=options["failure_rate"],
+        ) as moodle:
+            client = moodle.client(max_workers=options["workers"])
+            self.stdout.write(
+                f"{options['courses']} Kurse × {options['users']} Teilnehmer, "
+                f"{options['latency'] * 1000:.0f} ms Latenz, "
+                f"{client.max_workers} parallele Aufrufe"
+            )
+            with transaction.atomic():
+                self.run_benchmark(moodle, client, options)
+                transaction.set_rollback(True)
+            client.close()
+
+    def run_benchmark(self, moodle, client, options):
+        dataset = moodle.dataset
+        self.measure("Abgleich, erster Lauf", moodle, sync_courses, client=client)
+        self.measure("Abgleich, unverändert", moodle, sync_courses, client=client)
+
+        # in jedem zehnten Kurs kommt ein Teilnehmer dazu
+        for i, course_id in enumerate(sorted(dataset.courses)):
+            if i % 10 == 0:
+                user = dataset.add_user(
+                    f"new{course_id}", f"new{course_id}@example.com", "Neu", "Neu"
+                )
+                dataset.enrol(user["id"], course_id, 5)
+        self.measure("Abgleich, 10 % geändert", moodle, sync_courses, client=client)
+
+        event = self.create_enrolment_event(dataset, options["enrol"])
+        self.measure(
+            f"Einschreibung ({options['enrol']})",
+            moodle,
+            enrol_registered_members,
+            event,
+            client=client,
+        )
+
+    def create_enrolment_event(self, dataset, members):
+        course = dataset.add_course("Benchmark", "BENCH-1", categoryid=1)
+        event = Event.objects.create(
+            name="Benchmark",
+            label="BENCH-1",
+            category=EventCategory.objects.get_or_create(name="Onlineseminare")[0],
+            eventformat=EventFormat.objects.get_or_create(name="Online")[0],
+            location=EventLocation.objects.get_or_create(title="FOBI Moodle")[0],
+            price=Decimal(0),
+            moodle_id=course["id"],
+        )
+        # die Hälfte gibt es schon in Moodle
+        for i in range(members):
+            email = f"bench{i}@example.com"
+            if i % 2:
+                dataset.add_user(f"bench{i}", email)
+            event.members.create(
+                firstname="Hans",
+                lastname="Bench",
+                email=email,
+                attend_status="registered",
+            )
+        return event
+
+    def measure(self, label, moodle, func, *args, **kwargs):
+        moodle.calls.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.monotonic()
+            func(*args, **kwargs)
+            elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{label:<28} {elapsed:7.2f} s  {sum(moodle.calls.values()):5} Aufrufe  "
+            f"{len(queries):6} Queries"
+        )
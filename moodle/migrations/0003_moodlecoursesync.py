@@ -0,0 +1,46 @@
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("moodle", "0002_auto_20210327_1009"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MoodleCourseSync",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("uuid", models.UUIDField(default=uuid.uuid4, editable=False)),
+                (
+                    "date_created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="angelegt am"
+                    ),
+                ),
+                (
+                    "date_modified",
+                    models.DateTimeField(auto_now=True, verbose_name="geändert am"),
+                ),
+                ("moodle_id", models.PositiveIntegerField(unique=True)),
+                ("timemodified", models.PositiveIntegerField(default=0)),
+                ("enrolment_hash", models.CharField(blank=True, max_length=40)),
+                ("synced", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Moodle-Abgleich",
+                "verbose_name_plural": "Moodle-Abgleiche",
+            },
+        ),
+    ]
@@ -13,3 +13,22 @@ class MoodleUser(BaseModel):
     def __str__(self):
         return f"{self.lastname}, {self.firstname}"
 
+
+
+class MoodleCourseSync(BaseModel):
+    """
+    Stand des letzten Abgleichs eines Moodle-Kurses (moodle.sync):
+    unveränderte Kurse und Einschreibungen werden übersprungen
+    """
+
+    moodle_id = models.PositiveIntegerField(unique=True)
+    timemodified = models.PositiveIntegerField(default=0)
+    enrolment_hash = models.CharField(max_length=40, blank=True)
+    synced = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Moodle-Abgleich"
+        verbose_name_plural = "Moodle-Abgleiche"
+
+    def __str__(self):
+        return f"Kurs {self.moodle_id}"
@@ -0,0 +1,257 @@
+"""
+Moodle-User anlegen und in Kurse einschreiben, gesammelt statt pro Person
+
+enrol_people() braucht unabhängig von der Anzahl höchstens vier Aufrufe:
+1. alle E-Mail-Adressen in einer Abfrage (values[n])
+2. für die fehlenden User Benutzernamen-Kandidaten erzeugen und belegte
+   Namen in einer Abfrage ermitteln
+3. alle fehlenden User mit einem core_user_create_users anlegen
+4. alle mit einem enrol_manual_enrol_users einschreiben (enrolments[i])
+
+Fehler von Moodle werden als MoodleException geworfen (moodle.client).
+"""
+
+from dataclasses import dataclass, field
+
+from django.utils import timezone
+
+from events.member_search import members_changed
+from events.models import EventMember, EventMemberRole, MemberRole
+from moodle.client import get_client
+from moodle.sync import roles_dict
+
+# Anzahl der Benutzernamen pro Nachname, die in einer Abfrage geprüft werden
+USERNAME_CANDIDATES = 10
+
+# test user
+test_user_list = [f"user{str(i)}@elearning-and-more.de" for i in range(1, 7)]
+
+
+@dataclass
+class Person:
+    email: str
+    firstname: str = ""
+    lastname: str = ""
+
+
+@dataclass
+class ProvisioningResult:
+    # {email: Moodle-User-ID}
+    user_ids: dict = field(default_factory=dict)
+    created: list = field(default_factory=list)
+    enrolled: int = 0
+    calls: int = 0
+
+
+def convert_umlaute_and_whitespace(string_with_umlaute):
+    umlaute_dict = {"ä": "ae", "ü": "ue", "ö": "oe", "ß": "ss", " ": ""}
+    for k in umlaute_dict.keys():
+        string_with_umlaute = string_with_umlaute.replace(k, umlaute_dict[k])
+    return string_with_umlaute
+
+
+def indexed(prefix, items):
+    """[{key: value}] -> {"prefix[i][key]": value} für die Moodle-REST-API"""
+    params = {}
+    for i, item in enumerate(items):
+        for key, value in item.items():
+            params[f"{prefix}[{i}][{key}]"] = value
+    return params
+
+
+class Provisioner:
+    def __init__(self, client=None):
+        self.client = client or get_client()
+        self.result = ProvisioningResult()
+
+    def call(self, fname, **params):
+        self.result.calls += 1
+        return self.client.call(fname, **params)
+
+    def get_users_by_field(self, field_name, values):
+        values = list(values)
+        if not values:
+            return []
+        params = {f"values[{i}]": value for i, value in enumerate(values)}
+        return self.call("core_user_get_users_by_field", field=field_name, **params)
+
+    def lookup_users(self, emails):
+        """{email (klein): Moodle-User-ID} der vorhandenen User"""
+        return {
+            user["email"].lower(): user["id"]
+            for user in self.get_users_by_field("email", emails)
+        }
+
+    def resolve_usernames(self, people):
+        """
+        {email: freier Benutzername}: Nachname ohne Umlaute, bei Kollision
+        mit -1, -2, ... wie bisher, belegte Namen in einer Abfrage
+        """
+        bases = {
+            person.email: convert_umlaute_and_whitespace(person.lastname.lower())
+            for person in people
+        }
+        usernames, pending = {}, list(people)
+        offset = 0
+        while pending:
+            size = USERNAME_CANDIDATES + len(pending)
+            candidates = {
+                base: [
+                    f"{base}-{offset + i}" if offset + i else base for i in range(size)
+                ]
+                for base in set(bases[person.email] for person in pending)
+            }
+            taken = {
+                user["username"]
+                for user in self.get_users_by_field(
+                    "username",
+                    [name for names in candidates.values() for name in names],
+                )
+            }
+            taken.update(usernames.values())
+            still_pending = []
+            for person in pending:
+                names = candidates[bases[person.email]]
+                free = [name for name in names if name not in taken]
+                if free:
+                    usernames[person.email] = free[0]
+                    taken.add(free[0])
+                else:
+                    still_pending.append(person)
+            pending = still_pending
+            offset += size
+        return usernames
+
+    def create_users(self, people, new_user_password_flag, standard_password):
+        """legt alle User in einem Aufruf an, liefert {email: Moodle-User-ID}"""
+        if not people:
+            return {}
+        usernames = self.resolve_usernames(people)
+        users = []
+        for person in people:
+            # if moodle_new_user_flag is set to True (default=False) a password
+            # is created an sent to new user
+            createpassword = int(
+                bool(new_user_password_flag or person.email in test_user_list)
+            )
+            user = {
+                "username": usernames[person.email],
+                "createpassword": createpassword,
+                "firstname": person.firstname,
+                "lastname": person.lastname,
+                "email": person.email,
+            }
+            if createpassword == 0:
+                user["password"] = standard_password
+            users.append(user)
+        created = self.call("core_user_create_users", **indexed("users", users))
+        # Moodle liefert [{"id": ..., "username": ...}] in derselben Reihenfolge
+        user_ids = {
+            person.email.lower(): user["id"] for person, user in zip(people, created)
+        }
+        self.result.created.extend(user_ids)
+        return user_ids
+
+    def enrol(self, enrolments):
+        """[(userid, courseid, roleid)] in einem Aufruf einschreiben"""
+        if not enrolments:
+            return None
+        response = self.call(
+            "enrol_manual_enrol_users",
+            **indexed(
+                "enrolments",
+                [
+                    {"roleid": roleid, "userid": userid, "courseid": courseid}
+                    for userid, courseid, roleid in enrolments
+                ],
+            ),
+        )
+        self.result.enrolled += len(enrolments)
+        return response
+
+    def enrol_people(
+        self,
+        people,
+        courseid,
+        roleid=roles_dict["STUDENT_ROLE_ID"],
+        new_user_password_flag=False,
+        standard_password="",
+    ):
+        """legt fehlende User an und schreibt alle in den Kurs ein"""
+        people = list({person.email.lower(): person for person in people}.values())
+        user_ids = self.lookup_users(person.email for person in people)
+        missing = [person for person in people if person.email.lower() not in user_ids]
+        created = self.create_users(missing, new_user_password_flag, standard_password)
+        user_ids.update(created)
+        self.result.user_ids.update(user_ids)
+        if created:
+            # update members in db with moodle_id
+            members = list(
+                EventMember.objects.filter(email__in=[p.email for p in missing])
+            )
+            for member in members:
+                member.moodle_id = created.get(member.email.lower(), member.moodle_id)
+                member.date_modified = timezone.now()
+            EventMember.objects.bulk_update(members, ["moodle_id", "date_modified"])
+        self.enrol(
+            [
+                (user_ids[person.email.lower()], courseid, roleid)
+                for person in people
+                if person.email.lower() in user_ids
+            ]
+        )
+        return self.result
+
+
+def enrol_people(people, courseid, client=None, **kwargs):
+    return Provisioner(client).enrol_people(people, courseid, **kwargs)
+
+
+def enrol_registered_members(event, client=None):
+    """
+    schreibt alle angemeldeten, noch nicht eingeschriebenen Teilnehmer
+    des Events in den Moodle-Kurs ein (Admin-Aktion)
+    """
+    members = list(
+        event.members.filter(attend_status="registered", enroled=False).exclude(
+            email=""
+        )
+    )
+    if not members:
+        return ProvisioningResult()
+    result = enrol_people(
+        [Person(m.email, m.firstname, m.lastname) for m in members],
+        event.moodle_id,
+        client=client,
+        new_user_password_flag=event.moodle_new_user_flag,
+        standard_password=event.moodle_standard_password,
+    )
+
+    student_role = roles_dict["STUDENT_ROLE_ID"]
+    enrolled = [m for m in members if m.email.lower() in result.user_ids]
+    for member in enrolled:
+        member.enroled = True
+        member.moodle_id = result.user_ids[member.email.lower()]
+        member.date_modified = timezone.now()
+    EventMember.objects.bulk_update(
+        enrolled, ["enroled", "moodle_id", "date_modified"], batch_size=500
+    )
+    # bulk_update löst keine Signale aus
+    members_changed(event.id)
+    # Rolle Teilnehmer*in wie in der Inline-Aktion enrol_to_moodle_course
+    role = MemberRole.objects.filter(roleid=student_role).first()
+    if role is None:
+        role = MemberRole.objects.create(roleid=student_role)
+    has_role = set(
+        EventMemberRole.objects.filter(
+            eventmember__in=enrolled, memberrole=role
+        ).values_list("eventmember_id", flat=True)
+    )
+    EventMemberRole.objects.bulk_create(
+        [
+            EventMemberRole(eventmember=member, memberrole=role)
+            for member in enrolled
+            if member.id not in has_role
+        ]
+    )
+    return result
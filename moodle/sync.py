@@ -0,0 +1,417 @@
+"""
+Abgleich der Moodle-Kurse und Einschreibungen mit der Datenbank
+(manage.py moodle, nächtlich per Celery)
+
+- Kurse und Teilnehmer werden mit wenigen, parallelen Aufrufen geholt
+  (moodle.client), jeder Kurs genau einmal
+- pro Kurs merkt sich MoodleCourseSync timemodified und einen Hash der
+  Einschreibungen; unveränderte Kurse werden übersprungen
+- geänderte Einschreibungen werden im Speicher mit der Datenbank verglichen
+  und per bulk_create/bulk_update geschrieben, Rollen einmal pro Lauf geladen
+
+Mit force=True (manage.py moodle --full) werden alle Kurse geschrieben.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from events.member_search import members_changed
+from events.models import (
+    Event,
+    EventCategory,
+    EventFormat,
+    EventLocation,
+    EventMember,
+    EventMemberRole,
+    EventSpeaker,
+    MemberRole,
+)
+from moodle.client import get_client
+from moodle.models import MoodleCourseSync, MoodleUser
+
+logger = logging.getLogger(__name__)
+
+# Roles Dict
+roles_dict = {"MANAGER_ROLE_ID": 1, "TRAINER_ROLE_ID": 3, "STUDENT_ROLE_ID": 5}
+
+# nur die Kurse aus den Bereichen in Planung (id = 3) und Fortbildungen (id = 4)
+# werden gespeichert
+SYNC_CATEGORY_IDS = (3, 4)
+
+
+@dataclass
+class SyncResult:
+    courses: int = 0
+    skipped: int = 0
+    events_created: int = 0
+    events_updated: int = 0
+    events_deleted: int = 0
+    members_created: int = 0
+    members_updated: int = 0
+    members_deleted: int = 0
+    failed: int = 0
+
+    def __str__(self):
+        return (
+            f"{self.courses} Kurse, {self.skipped} unverändert, {self.failed} Fehler; "
+            f"Events: {self.events_created} neu, {self.events_updated} geändert, "
+            f"{self.events_deleted} gelöscht; "
+            f"Teilnehmer: {self.members_created} neu, {self.members_updated} "
+            f"geändert, {self.members_deleted} gelöscht"
+        )
+
+
+def get_timestamp(timestamp):
+    try:
+        # assume, that timestamp is given in seconds with decimal point
+        ts = float(timestamp)
+    except (TypeError, ValueError):
+        return None
+    return datetime.datetime.fromtimestamp(ts)
+
+
+def has_role(user_dict, role_id):
+    return any(d["roleid"] == role_id for d in user_dict["roles"])
+
+
+def enrolment_hash(users):
+    """Hash über alle Felder der Einschreibungen, die gespeichert werden"""
+    data = sorted(
+        (
+            user["id"],
+            user.get("email", ""),
+            user.get("firstname", ""),
+            user.get("lastname", ""),
+            sorted(role["roleid"] for role in user["roles"]),
+        )
+        for user in users
+    )
+    return hashlib.sha1(json.dumps(data).encode()).hexdigest()
+
+
+class CourseSync:
+    def __init__(self, client=None, force=False):
+        self.client = client or get_client()
+        self.force = force
+        self.result = SyncResult()
+        self._roles = None
+        self._event_defaults = None
+
+    # Rollen und Standardwerte einmal pro Lauf
+
+    @property
+    def roles(self):
+        """{roleid: MemberRole}, fehlende Rollen werden angelegt"""
+        if self._roles is None:
+            self._roles = {}
+            for role in MemberRole.objects.order_by("-id"):
+                self._roles[role.roleid] = role
+            for roleid in roles_dict.values():
+                self.get_role(roleid)
+        return self._roles
+
+    def get_role(self, roleid):
+        roles = self.roles
+        if roleid not in roles:
+            roles[roleid] = MemberRole.objects.create(roleid=roleid)
+        return roles[roleid]
+
+    @property
+    def event_defaults(self):
+        """Kategorie, Ort und Format neuer Moodle-Kurse"""
+        if self._event_defaults is None:
+            category, _ = EventCategory.objects.get_or_create(name="Onlineseminare")
+            location, _ = EventLocation.objects.get_or_create(title="FOBI Moodle")
+            eventformat, _ = EventFormat.objects.get_or_create(name="Online")
+            self._event_defaults = {
+                "category": category,
+                "location": location,
+                "eventformat": eventformat,
+                "price": Decimal(0.00),
+            }
+        return self._event_defaults
+
+    # Kurse
+
+    def run(self, courses=None):
+        """gleicht alle Kurse ab, liefert SyncResult"""
+        if courses is None:
+            courses = self.client.call("core_course_get_courses")
+        self.delete_removed_courses([course["id"] for course in courses])
+
+        courses = [
+            course for course in courses if course["categoryid"] in SYNC_CATEGORY_IDS
+        ]
+        self.result.courses = len(courses)
+        # Teilnehmer aller Kurse parallel holen: die Laufzeit hängt vom
+        # langsamsten Aufruf ab, nicht von der Summe
+        users = self.client.map(
+            "core_enrol_get_enrolled_users",
+            [{"courseid": course["id"]} for course in courses],
+            return_exceptions=True,
+        )
+
+        ids = [course["id"] for course in courses]
+        events = {
+            event.moodle_id: event for event in Event.objects.filter(moodle_id__in=ids)
+        }
+        states = {
+            state.moodle_id: state
+            for state in MoodleCourseSync.objects.filter(moodle_id__in=ids)
+        }
+
+        changed, changed_states = [], []
+        for course, course_users in zip(courses, users):
+            if isinstance(course_users, Exception):
+                logger.error(
+                    "Moodle-Kurs %s: Teilnehmer nicht abrufbar: %s",
+                    course["id"],
+                    course_users,
+                )
+                self.result.failed += 1
+                continue
+            state = states.get(course["id"]) or MoodleCourseSync(
+                moodle_id=course["id"]
+            )
+            event = events.get(course["id"])
+            timemodified = int(course.get("timemodified") or 0)
+            digest = enrolment_hash(course_users)
+
+            course_changed = (
+                self.force or event is None or state.timemodified != timemodified
+            )
+            users_changed = course_changed or state.enrolment_hash != digest
+            if not users_changed:
+                self.result.skipped += 1
+                continue
+            if course_changed:
+                event = self.save_course(course, event)
+            changed.append((event, course_users))
+            state.timemodified = timemodified
+            state.enrolment_hash = digest
+            state.synced = state.date_modified = timezone.now()
+            changed_states.append(state)
+
+        if not changed_states:
+            return self.result
+        with transaction.atomic():
+            self.save_enrolments(changed)
+            MoodleCourseSync.objects.bulk_create(
+                [state for state in changed_states if state.pk is None]
+            )
+            MoodleCourseSync.objects.bulk_update(
+                [state for state in changed_states if state.pk is not None],
+                ["timemodified", "enrolment_hash", "synced", "date_modified"],
+            )
+        return self.result
+
+    def delete_removed_courses(self, moodle_ids):
+        """alle Kurse löschen, die es nur noch in der Datenbank gibt"""
+        removed = set(
+            Event.objects.filter(moodle_id__gt=0)
+            .exclude(moodle_id__in=moodle_ids)
+            .values_list("moodle_id", flat=True)
+        )
+        if removed:
+            _, deleted = Event.objects.filter(moodle_id__in=removed).delete()
+            self.result.events_deleted = deleted.get(Event._meta.label, 0)
+            MoodleCourseSync.objects.filter(moodle_id__in=removed).delete()
+
+    def save_course(self, course, event=None):
+        values = {
+            "name": course["fullname"],
+            "label": course["shortname"],
+            "start_date": get_timestamp(course["startdate"]),
+            "end_date": get_timestamp(course["enddate"]),
+        }
+        if event is None:
+            self.result.events_created += 1
+            return Event.objects.create(
+                moodle_id=course["id"], **self.event_defaults, **values
+            )
+        if any(getattr(event, name) != value for name, value in values.items()):
+            for name, value in values.items():
+                setattr(event, name, value)
+            event.save()
+            self.result.events_updated += 1
+        return event
+
+    # Einschreibungen
+
+    def save_enrolments(self, events_users):
+        """
+        [(event, Teilnehmerliste aus Moodle)]: Teilnehmer, Moodle-User,
+        Rollen und Trainer im Speicher abgleichen und gesammelt schreiben
+        """
+        if not events_users:
+            return
+        student_role = roles_dict["STUDENT_ROLE_ID"]
+        trainer_role = roles_dict["TRAINER_ROLE_ID"]
+        event_ids = [event.id for event, _ in events_users]
+
+        # vorhandene Teilnehmer: erster Eintrag je (Event, E-Mail)
+        members = list(
+            EventMember.objects.filter(event_id__in=event_ids).order_by("-id")
+        )
+        existing = {(member.event_id, member.email): member for member in members}
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        student_ids = set()  # (event_id, moodle_id) der Teilnehmer in Moodle
+        member_roles = []  # (member, [roleid]) für die Rollenzuordnung
+        moodle_users, trainers = {}, {}
+        for event, users in events_users:
+            for user_dict in users:
+                if has_role(user_dict, trainer_role):
+                    trainers[user_dict["email"]] = user_dict
+                if not has_role(user_dict, student_role):
+                    continue
+                moodle_users[user_dict["email"]] = user_dict
+                student_ids.add((event.id, user_dict["id"]))
+                values = {
+                    "firstname": user_dict["firstname"],
+                    "lastname": user_dict["lastname"],
+                    "moodle_id": user_dict["id"],
+                    "enroled": True,
+                }
+                member = existing.get((event.id, user_dict["email"]))
+                if member is None:
+                    member = EventMember(
+                        event=event,
+                        email=user_dict["email"],
+                        # wie in EventMember.save, aber eindeutig im Event
+                        name=f"{event.label} | {now} | {user_dict['id']}",
+                        **values,
+                    )
+                    to_create.append(member)
+                elif any(getattr(member, k) != v for k, v in values.items()):
+                    for k, v in values.items():
+                        setattr(member, k, v)
+                    member.date_modified = now
+                    to_update.append(member)
+                member_roles.append(
+                    (member, [role["roleid"] for role in user_dict["roles"]])
+                )
+
+        # Teilnehmer, die in Moodle ausgetragen wurden
+        to_delete = [
+            member.id
+            for member in members
+            if member.moodle_id > 0
+            and (member.event_id, member.moodle_id) not in student_ids
+        ]
+
+        with transaction.atomic():
+            EventMember.objects.bulk_create(to_create, batch_size=500)
+            # ids nachladen: bulk_create setzt sie nicht bei jeder Datenbank
+            # (z.B. SQLite unter Django 3.2); name enthält den Zeitstempel
+            # dieses Laufs und ist darin eindeutig
+            created_ids = dict(
+                EventMember.objects.filter(
+                    event_id__in=event_ids, name__contains=f" | {now} | "
+                ).values_list("name", "id")
+            )
+            # Kürzel wie in EventMember.save, dafür wird die id gebraucht
+            for member in to_create:
+                member.id = created_ids[member.name]
+                member.label = f"{member.event.label}-A{member.id}"
+            EventMember.objects.bulk_update(to_create, ["label"], batch_size=500)
+            EventMember.objects.bulk_update(
+                to_update,
+                ["firstname", "lastname", "moodle_id", "enroled", "date_modified"],
+                batch_size=500,
+            )
+            if to_delete:
+                EventMember.objects.filter(id__in=to_delete).delete()
+
+            self.save_member_roles(member_roles)
+            self.save_moodle_users(moodle_users)
+            self.save_trainers(trainers)
+
+            # bulk_create/bulk_update lösen keine Signale aus
+            for event, _ in events_users:
+                event.reconcile_member_counts()
+                members_changed(event.id)
+
+        self.result.members_created += len(to_create)
+        self.result.members_updated += len(to_update)
+        self.result.members_deleted += len(to_delete)
+
+    def save_member_roles(self, member_roles):
+        existing = set(
+            EventMemberRole.objects.filter(
+                eventmember_id__in=[member.id for member, _ in member_roles]
+            ).values_list("eventmember_id", "memberrole_id")
+        )
+        new_roles = []
+        for member, roleids in member_roles:
+            for roleid in roleids:
+                role = self.get_role(roleid)
+                if (member.id, role.id) not in existing:
+                    existing.add((member.id, role.id))
+                    new_roles.append(
+                        EventMemberRole(eventmember=member, memberrole=role)
+                    )
+        EventMemberRole.objects.bulk_create(new_roles, batch_size=500)
+
+    def save_moodle_users(self, users):
+        """payload : fill extra table with moodle users"""
+        existing = {}
+        for moodle_user in MoodleUser.objects.filter(email__in=users).order_by("-id"):
+            existing[moodle_user.email] = moodle_user
+        to_create, to_update = [], []
+        for email, user_dict in users.items():
+            values = {
+                "firstname": user_dict["firstname"],
+                "lastname": user_dict["lastname"],
+                "moodle_id": user_dict["id"],
+            }
+            moodle_user = existing.get(email)
+            if moodle_user is None:
+                to_create.append(MoodleUser(email=email, **values))
+            elif any(getattr(moodle_user, k) != v for k, v in values.items()):
+                for k, v in values.items():
+                    setattr(moodle_user, k, v)
+                moodle_user.date_modified = timezone.now()
+                to_update.append(moodle_user)
+        MoodleUser.objects.bulk_create(to_create, batch_size=500)
+        MoodleUser.objects.bulk_update(
+            to_update,
+            ["firstname", "lastname", "moodle_id", "date_modified"],
+            batch_size=500,
+        )
+
+    def save_trainers(self, trainers):
+        """Trainer als EventSpeaker (Abgleich per E-Mail)"""
+        existing = {}
+        for speaker in EventSpeaker.objects.filter(email__in=trainers).order_by("-id"):
+            existing[speaker.email] = speaker
+        to_create, to_update = [], []
+        for email, trainer_dict in trainers.items():
+            values = {
+                "first_name": trainer_dict["firstname"],
+                "last_name": trainer_dict["lastname"],
+            }
+            speaker = existing.get(email)
+            if speaker is None:
+                to_create.append(EventSpeaker(email=email, **values))
+            elif any(getattr(speaker, k) != v for k, v in values.items()):
+                for k, v in values.items():
+                    setattr(speaker, k, v)
+                speaker.date_modified = timezone.now()
+                to_update.append(speaker)
+        EventSpeaker.objects.bulk_create(to_create, batch_size=500)
+        EventSpeaker.objects.bulk_update(
+            to_update, ["first_name", "last_name", "date_modified"], batch_size=500
+        )
+
+
+def sync_courses(courses=None, client=None, force=False):
+    return CourseSync(client=client, force=force).run(courses)
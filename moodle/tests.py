@@ -1,3 +1,186 @@
-from django.test import TestCase
+import time
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from events.exception import MoodleException, NetworkMoodleException
+from events.models import (
+    Event,
+    EventCategory,
+    EventFormat,
+    EventLocation,
+    EventMember,
+    EventMemberRole,
+    EventSpeaker,
+)
+from moodle.fake_server import FakeMoodleServer, MoodleDataset, make_dataset
+from moodle.models import MoodleCourseSync, MoodleUser
+from moodle.provisioning import enrol_registered_members
+from moodle.sync import sync_courses
+
+
+class FakeMoodleTestMixin:
+    """startet pro Test einen FakeMoodleServer (moodle.fake_server)"""
+
+    def start_moodle(self, dataset=None, **kwargs):
+        self.moodle = FakeMoodleServer(dataset, **kwargs).start()
+        self.addCleanup(self.moodle.stop)
+        self.client = self.moodle.client()
+        self.addCleanup(self.client.close)
+        return self.moodle
+
+
+class MoodleClientTest(FakeMoodleTestMixin, SimpleTestCase):
+    def setUp(self):
+        self.start_moodle(make_dataset(courses=8, users=2))
+        self.course_ids = sorted(self.moodle.dataset.courses)
+
+    def test_call_sends_token_and_function(self):
+        result = self.client.call(
+            "core_enrol_get_enrolled_users", courseid=self.course_ids[0]
+        )
+        self.assertEqual(len(result), 3)
+        self.assertEqual(self.moodle.requests[0]["moodlewsrestformat"], "json")
+
+    def test_moodle_error_is_raised(self):
+        self.client.token = "wrong"
+        with self.assertRaises(MoodleException) as cm:
+            self.client.call("core_course_get_courses")
+        self.assertEqual(cm.exception.errorcode, "invalidtoken")
+
+    def test_read_only_call_is_retried(self):
+        self.moodle.fail_functions["core_course_get_courses"] = 2
+        self.assertEqual(len(self.client.call("core_course_get_courses")), 8)
+        self.assertEqual(self.moodle.calls["core_course_get_courses"], 3)
+
+    def test_write_call_is_not_retried(self):
+        self.moodle.fail_functions["enrol_manual_enrol_users"] = 1
+        with self.assertRaises(NetworkMoodleException):
+            self.client.call("enrol_manual_enrol_users")
+        self.assertEqual(self.moodle.calls["enrol_manual_enrol_users"], 1)
+
+    def test_map_runs_calls_concurrently(self):
+        self.moodle.latency = 0.2
+        started = time.monotonic()
+        results = self.client.map(
+            "core_enrol_get_enrolled_users",
+            [{"courseid": course_id} for course_id in self.course_ids],
+        )
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual([len(result) for result in results], [3] * 8)
+
+    def test_gather_returns_exceptions(self):
+        results = self.client.gather(
+            [
+                ("core_enrol_get_enrolled_users", {"courseid": 0}),
+                ("core_enrol_get_enrolled_users", {"courseid": self.course_ids[0]}),
+            ],
+            return_exceptions=True,
+        )
+        self.assertIsInstance(results[0], MoodleException)
+        self.assertEqual(len(results[1]), 3)
+
+
+class CourseSyncTest(FakeMoodleTestMixin, TestCase):
+    def setUp(self):
+        dataset = MoodleDataset()
+        self.course = dataset.add_course("Moodle-Kurs", "MK-1", categoryid=4)
+        dataset.add_course("Anderer Bereich", "AB-1", categoryid=1)
+        for i in range(1, 4):
+            user = dataset.add_user(
+                f"user{i}", f"user{i}@example.com", "Hans", f"Test{i}"
+            )
+            dataset.enrol(user["id"], self.course["id"], 3 if i == 3 else 5)
+        self.start_moodle(dataset)
+
+    def test_first_sync_creates_event_members_and_trainers(self):
+        result = sync_courses(client=self.client)
+        self.assertEqual(result.events_created, 1)
+        self.assertEqual(result.members_created, 2)
+        member = EventMember.objects.get(email="user1@example.com")
+        self.assertEqual(member.event.moodle_id, self.course["id"])
+        self.assertTrue(member.enroled)
+        self.assertEqual(member.label, f"MK-1-A{member.id}")
+        self.assertEqual(EventMemberRole.objects.count(), 2)
+        self.assertEqual(MoodleUser.objects.count(), 2)
+        self.assertTrue(
+            EventSpeaker.objects.filter(email="user3@example.com").exists()
+        )
+        # Kategorie 1 wird nicht abgefragt
+        self.assertEqual(self.moodle.calls["core_enrol_get_enrolled_users"], 1)
+
+    def test_unchanged_course_is_skipped(self):
+        sync_courses(client=self.client)
+        with self.assertNumQueries(3):
+            result = sync_courses(client=self.client)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(result.members_created, 0)
+
+    def test_changed_enrolments_are_applied(self):
+        sync_courses(client=self.client)
+        dataset = self.moodle.dataset
+        user1, user2 = sorted(dataset.enrolments[self.course["id"]])[:2]
+        dataset.users[user1]["lastname"] = "Neu"
+        dataset.enrolments[self.course["id"]].pop(user2)
+        user = dataset.add_user("user4", "user4@example.com", "Hans", "Test4")
+        dataset.enrol(user["id"], self.course["id"], 5)
+
+        result = sync_courses(client=self.client)
+        self.assertEqual(result.skipped, 0)
+        self.assertEqual(
+            (result.members_created, result.members_updated, result.members_deleted),
+            (1, 1, 1),
+        )
+        self.assertEqual(
+            set(EventMember.objects.values_list("email", flat=True)),
+            {"user1@example.com", "user4@example.com"},
+        )
+        self.assertEqual(
+            MoodleCourseSync.objects.get(moodle_id=self.course["id"]).timemodified,
+            self.course["timemodified"],
+        )
+
+
+class ProvisioningTest(FakeMoodleTestMixin, TestCase):
+    def setUp(self):
+        dataset = MoodleDataset()
+        course = dataset.add_course("Moodle-Kurs", "MK-1")
+        for i in range(10):
+            dataset.add_user(f"user{i}", f"user{i}@example.com")
+        dataset.add_user("mueller", "other@example.com")
+        self.start_moodle(dataset)
+
+        self.event = Event.objects.create(
+            name="Moodle-Kurs",
+            category=EventCategory.objects.create(name="testcat"),
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            price="100.00",
+            moodle_id=course["id"],
+        )
+        for i in range(60):
+            EventMember.objects.create(
+                event=self.event,
+                firstname="Hans",
+                lastname="Müller",
+                email=f"user{i}@example.com",
+                attend_status="registered",
+            )
+
+    def test_enrols_all_members_with_few_calls(self):
+        result = enrol_registered_members(self.event, client=self.client)
+        self.assertEqual(sum(self.moodle.calls.values()), 4)
+        self.assertEqual(result.enrolled, 60)
+        self.assertEqual(len(result.created), 50)
+        # der Benutzername "mueller" ist schon vergeben
+        usernames = {user["username"] for user in self.moodle.dataset.users.values()}
+        self.assertIn("mueller-1", usernames)
+        self.assertEqual(len(self.moodle.dataset.enrolments[self.event.moodle_id]), 60)
+        self.assertFalse(self.event.members.filter(enroled=False).exists())
+        self.assertEqual(EventMemberRole.objects.count(), 60)
+
+    def test_enrolled_members_are_skipped(self):
+        enrol_registered_members(self.event, client=self.client)
+        self.moodle.calls.clear()
+        result = enrol_registered_members(self.event, client=self.client)
+        self.assertEqual(result.enrolled, 0)
+        self.assertEqual(sum(self.moodle.calls.values()), 0)
@@ -1,3 +1,31 @@
 from django.contrib import admin
 
-# Register your models here.
+from payment.models import InvoiceDispatch, InvoiceDispatchRun
+
+
+@admin.register(InvoiceDispatchRun)
+class InvoiceDispatchRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "started",
+        "finished",
+        "candidates",
+        "sent",
+        "skipped",
+        "failed",
+        "duration",
+        "invoices_per_second",
+    )
+    readonly_fields = [field.name for field in InvoiceDispatchRun._meta.fields] + [
+        "duration",
+        "invoices_per_second",
+    ]
+
+
+@admin.register(InvoiceDispatch)
+class InvoiceDispatchAdmin(admin.ModelAdmin):
+    list_display = ("order", "status", "attempts", "run", "updated")
+    list_filter = ("status",)
+    list_editable = ("status",)
+    search_fields = ("order__lastname", "order__email")
+    raw_id_fields = ("order", "run")
+    readonly_fields = ("attempts", "error", "updated")
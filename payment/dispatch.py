@@ -0,0 +1,192 @@
+"""
+Täglicher Rechnungsversand (payment.cron.send_invoices_of_actual_day)
+
+1. offene Rechnungen (Rechnungsdatum erreicht, noch nicht versendet) mit
+   Positionen und Events in wenigen Queries laden
+2. bei Bestellungen mit Datum in der Zukunft die Positionen wie update_order
+   an den Status der Teilnehmer anpassen (payment.utils.sync_orders)
+3. PDFs blockweise rendern (payment.invoices), aus dem Cron-Lauf im
+   Prozess-Pool (INVOICE_CRON_RENDER_WORKERS)
+4. alle E-Mails über eine SMTP-Verbindung verschicken
+
+Der Status jeder Rechnung steht in InvoiceDispatch und wird vor dem Senden
+per bedingtem UPDATE auf "in Versand" gesetzt. Ein abgebrochener Lauf setzt
+beim nächsten Mal fort: versendete und "in Versand" hängengebliebene
+Rechnungen werden nicht noch einmal verschickt, fehlgeschlagene schon.
+Die Kennzahlen jedes Laufs landen in InvoiceDispatchRun.
+"""
+
+import logging
+import time
+from datetime import datetime
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db.models import F, Prefetch
+from django.utils import timezone
+
+from events.utils import (
+    EmailTemplateError,
+    build_email_message,
+    get_email_template,
+)
+from shop.models import Order, OrderItem
+
+from payment.invoices import get_invoice_pdfs
+from payment.models import InvoiceDispatch, InvoiceDispatchRun
+from payment.tasks import get_invoice_mail
+from payment.utils import check_order_date_in_future, sync_orders
+
+logger = logging.getLogger(__name__)
+
+INVOICE_DISPATCH_BATCH_SIZE = 50
+
+
+def get_candidate_orders(now=None):
+    """noch nicht versendete Rechnungen mit Positionen und Events"""
+    now = now or datetime.now()
+    return (
+        Order.objects.filter(
+            payment_date__lte=now, mail_sent_date=None, payment_type="r"
+        )
+        .exclude(
+            invoice_dispatch__status__in=[InvoiceDispatch.SENDING, InvoiceDispatch.SENT]
+        )
+        .prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("event"))
+        )
+        .order_by("id")
+    )
+
+
+def prepare_orders(orders):
+    """Bestellungen mit mindestens einer registrierten Position"""
+    # Positionen an den Status der Teilnehmer anpassen (eine Sync für alle)
+    sync_orders([order for order in orders if check_order_date_in_future(order)])
+    registered = set(
+        OrderItem.objects.filter(order__in=orders, status="r").values_list(
+            "order_id", flat=True
+        )
+    )
+    return [order for order in orders if order.id in registered]
+
+
+def claim_order(order, run):
+    """True, wenn diese Rechnung jetzt (und nur von diesem Lauf) versendet wird"""
+    dispatch, _ = InvoiceDispatch.objects.get_or_create(order=order)
+    return (
+        InvoiceDispatch.objects.filter(
+            id=dispatch.id, status__in=[InvoiceDispatch.PENDING, InvoiceDispatch.FAILED]
+        ).update(status=InvoiceDispatch.SENDING, run=run, attempts=F("attempts") + 1)
+        == 1
+    )
+
+
+def mark_failed(order, run, error):
+    InvoiceDispatch.objects.update_or_create(
+        order=order,
+        defaults={"status": InvoiceDispatch.FAILED, "run": run, "error": error},
+    )
+    logger.error("Rechnung %s nicht versendet: %s", order.get_order_number, error)
+
+
+def mark_sent(order):
+    InvoiceDispatch.objects.filter(order=order).update(
+        status=InvoiceDispatch.SENT, error=""
+    )
+    order.mail_sent_date = datetime.now()
+    order.save(update_fields=["mail_sent_date", "date_modified"])
+
+
+def build_invoice_message(order, template, pdf):
+    _, subject, formatting_dict = get_invoice_mail(order)
+    return build_email_message(
+        template,
+        {"to": [order.email]},
+        subject,
+        settings.DEFAULT_FROM_EMAIL,
+        [settings.REPLY_TO_EMAIL],
+        formatting_dict,
+        invoice_name="invoice.pdf",
+        pdf=pdf,
+        mime="application/pdf",
+    )
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def dispatch_invoices(
+    now=None, batch_size=INVOICE_DISPATCH_BATCH_SIZE, connection=None, workers=None
+):
+    """
+    verschickt alle fälligen Rechnungen, liefert den InvoiceDispatchRun;
+    workers: Prozesse zum Rendern (None = INVOICE_RENDER_WORKERS)
+    """
+    run = InvoiceDispatchRun.objects.create()
+
+    started = time.monotonic()
+    orders = list(get_candidate_orders(now))
+    ready = prepare_orders(orders)
+    run.candidates = len(orders)
+    run.skipped = len(orders) - len(ready)
+    run.prepare_seconds = time.monotonic() - started
+
+    template = get_email_template("invoice") if ready else None
+    connection = connection or get_connection()
+    with connection:
+        for batch in _chunks(ready, batch_size):
+            render_started = time.monotonic()
+            pdfs = get_invoice_pdfs(batch, workers=workers)
+            run.render_seconds += time.monotonic() - render_started
+
+            send_started = time.monotonic()
+            for order, pdf in pdfs:
+                if pdf is None:
+                    mark_failed(order, run, "PDF konnte nicht erzeugt werden")
+                    run.failed += 1
+                    continue
+                try:
+                    message = build_invoice_message(order, template, pdf)
+                except EmailTemplateError as e:
+                    mark_failed(order, run, str(e))
+                    run.failed += 1
+                    continue
+                if not claim_order(order, run):
+                    run.skipped += 1
+                    continue
+                try:
+                    sent = connection.send_messages([message])
+                except (SMTPException, OSError) as e:
+                    # kaputte Verbindung schließen, send_messages öffnet neu
+                    connection.close()
+                    mark_failed(order, run, str(e))
+                    run.failed += 1
+                    continue
+                if not sent:
+                    mark_failed(order, run, "E-Mail wurde nicht verschickt")
+                    run.failed += 1
+                    continue
+                mark_sent(order)
+                run.sent += 1
+            run.send_seconds += time.monotonic() - send_started
+
+    if run.sent:
+        template.add_count(run.sent)
+    run.finished = timezone.now()
+    run.save()
+    logger.info(
+        "Rechnungsversand: %s von %s versendet, %s übersprungen, %s Fehler "
+        "(%.1fs Vorbereitung, %.1fs PDFs, %.1fs Versand)",
+        run.sent,
+        run.candidates,
+        run.skipped,
+        run.failed,
+        run.prepare_seconds,
+        run.render_seconds,
+        run.send_seconds,
+    )
+    return run
@@ -0,0 +1,185 @@
+"""
+Rechnungs-PDFs (shop/pdf_invoice.html)
+
+Das HTML einer Rechnung wird wie bisher über das Template erzeugt, das
+teure Umwandeln nach PDF (xhtml2pdf) aber nur einmal pro Inhalt gemacht:
+Der Schlüssel ist ein Hash aus Template-Version und gerendertem HTML, das
+PDF liegt unter INVOICE_CACHE_DIR. Ändern sich Bestellung, Positionen,
+Status oder Event-Daten, ändert sich das HTML und damit der Schlüssel.
+
+Mehrere Rechnungen werden blockweise umgewandelt (iter_invoice_pdfs), damit
+nie alle PDFs gleichzeitig im Speicher sind. Standardmäßig im eigenen Prozess
+(INVOICE_RENDER_WORKERS = 0: Requests, ZIP-Export, Celery); nur der tägliche
+Versand per Cron nutzt einen Prozess-Pool (INVOICE_CRON_RENDER_WORKERS).
+prerender_invoices füllt den Cache im Hintergrund über Celery.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from celery import shared_task
+from django.conf import settings
+from django.template.loader import get_template
+from xhtml2pdf import pisa
+
+from shop.models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TEMPLATE = "shop/pdf_invoice.html"
+
+
+def get_cache_dir():
+    return getattr(
+        settings, "INVOICE_CACHE_DIR", os.path.join(settings.BASE_DIR, "invoice_cache")
+    )
+
+
+def get_invoice_context(order, process=None):
+    """
+    Context wie bisher: ohne process für Versand und ZIP-Export,
+    mit process ("order"/"storno") für die Admin-Ansicht
+    """
+    items = OrderItem.objects.select_related(
+        "order", "event__location", "event__category"
+    ).prefetch_related("event__event_days", "event__speaker")
+    context = {"order": order}
+    if process == "storno":
+        context["process"] = process
+        context["label"] = "Storno-Rechnung"
+        # stabiles Datum, sonst ändert sich das HTML (und der Cache-Schlüssel)
+        # bei jedem Aufruf; date_modified setzt die Absage (events.cancellation)
+        context["invoice_date"] = order.date_modified
+        context["order_items"] = items.filter(order=order, status="c")
+    else:
+        if process == "order":
+            context["process"] = process
+            context["label"] = "Rechnung"
+            context["invoice_date"] = order.payment_date or order.date_created
+        context["order_items"] = items.filter(order=order, status="r")
+    context["contains_action_price"] = OrderItem.objects.filter(
+        order=order, status="r", is_action_price=True
+    ).exists()
+    return context
+
+
+def render_invoice_html(order, process=None):
+    return get_template(INVOICE_TEMPLATE).render(get_invoice_context(order, process))
+
+
+def invoice_cache_key(html):
+    version = getattr(settings, "INVOICE_TEMPLATE_VERSION", 1)
+    return hashlib.sha256(f"{version}:{html}".encode("utf-8")).hexdigest()
+
+
+def invoice_cache_path(key):
+    return os.path.join(get_cache_dir(), key[:2], f"{key}.pdf")
+
+
+def read_cached_pdf(key):
+    try:
+        with open(invoice_cache_path(key), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_cached_pdf(key, pdf):
+    path = invoice_cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # erst vollständig schreiben, dann umbenennen (parallele Worker)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+
+
+def html_to_pdf(html):
+    """PDF-Bytes oder None; läuft auch in den Pool-Prozessen"""
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode("utf-8")), result, encoding="utf-8")
+    if pdf.err:
+        return None
+    return result.getvalue()
+
+
+def get_render_workers(workers=None):
+    if workers is None:
+        workers = getattr(settings, "INVOICE_RENDER_WORKERS", 0)
+    return workers or 0
+
+
+def _convert(htmls, workers):
+    if workers > 1 and len(htmls) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(htmls))) as pool:
+            return list(pool.map(html_to_pdf, htmls))
+    return [html_to_pdf(html) for html in htmls]
+
+
+def _render_batch(orders, process, workers):
+    results = []
+    missing = {}
+    for order in orders:
+        html = render_invoice_html(order, process)
+        key = invoice_cache_key(html)
+        pdf = read_cached_pdf(key)
+        if pdf is None:
+            missing.setdefault(key, html)
+        results.append((order, key, pdf))
+
+    keys = list(missing)
+    rendered = dict(zip(keys, _convert([missing[key] for key in keys], workers)))
+    for key, pdf in rendered.items():
+        if pdf is None:
+            logger.error("Rechnung konnte nicht erzeugt werden (%s)", key)
+        else:
+            write_cached_pdf(key, pdf)
+
+    return [
+        (order, pdf if pdf is not None else rendered.get(key))
+        for order, key, pdf in results
+    ]
+
+
+def iter_invoice_pdfs(orders, process=None, batch_size=None, workers=None):
+    """
+    (order, pdf) in der Reihenfolge von orders, pdf ist None, wenn
+    xhtml2pdf die Rechnung nicht erzeugen konnte; gerendert wird blockweise
+    (ein Block pro Durchgang des Pools), workers > 1 nur aus Cron/Kommandos
+    """
+    workers = get_render_workers(workers)
+    if batch_size is None:
+        batch_size = max(workers, 1) * 2
+    batch = []
+    for order in orders:
+        batch.append(order)
+        if len(batch) >= batch_size:
+            yield from _render_batch(batch, process, workers)
+            batch = []
+    if batch:
+        yield from _render_batch(batch, process, workers)
+
+
+def get_invoice_pdfs(orders, process=None, workers=None):
+    return list(iter_invoice_pdfs(orders, process, workers=workers))
+
+
+def get_invoice_pdf(order, process=None):
+    return get_invoice_pdfs([order], process)[0][1]
+
+
+def invoice_filename(order, process=None):
+    if process:
+        return f"{process}_rechnung_{order.get_order_number}.pdf"
+    return f"rechnung_{order.get_order_number}.pdf"
+
+
+@shared_task
+def prerender_invoices(order_ids, process=None):
+    """Rechnungen im Hintergrund in den Cache rendern"""
+    orders = Order.objects.filter(id__in=order_ids).order_by("id")
+    return sum(1 for _, pdf in get_invoice_pdfs(orders, process) if pdf)
@@ -0,0 +1,125 @@
+# Generated by Django 4.2.20 on 2025-07-21 10:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("shop", "0022_order_item_member_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoiceDispatchRun",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "started",
+                    models.DateTimeField(auto_now_add=True, verbose_name="gestartet"),
+                ),
+                (
+                    "finished",
+                    models.DateTimeField(blank=True, null=True, verbose_name="beendet"),
+                ),
+                (
+                    "candidates",
+                    models.PositiveIntegerField(default=0, verbose_name="Kandidaten"),
+                ),
+                (
+                    "sent",
+                    models.PositiveIntegerField(default=0, verbose_name="versendet"),
+                ),
+                (
+                    "skipped",
+                    models.PositiveIntegerField(default=0, verbose_name="übersprungen"),
+                ),
+                (
+                    "failed",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="fehlgeschlagen"
+                    ),
+                ),
+                (
+                    "prepare_seconds",
+                    models.FloatField(default=0, verbose_name="Vorbereitung (s)"),
+                ),
+                (
+                    "render_seconds",
+                    models.FloatField(default=0, verbose_name="PDFs (s)"),
+                ),
+                (
+                    "send_seconds",
+                    models.FloatField(default=0, verbose_name="Versand (s)"),
+                ),
+            ],
+            options={
+                "verbose_name": "Rechnungsversand",
+                "verbose_name_plural": "Rechnungsversand",
+                "ordering": ["-started"],
+            },
+        ),
+        migrations.CreateModel(
+            name="InvoiceDispatch",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("p", "offen"),
+                            ("s", "in Versand"),
+                            ("v", "versendet"),
+                            ("f", "fehlgeschlagen"),
+                        ],
+                        default="p",
+                        max_length=1,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invoice_dispatch",
+                        to="shop.order",
+                    ),
+                ),
+                (
+                    "run",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="dispatches",
+                        to="payment.invoicedispatchrun",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Rechnungsversand (Bestellung)",
+                "verbose_name_plural": "Rechnungsversand (Bestellungen)",
+            },
+        ),
+    ]
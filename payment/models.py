@@ -1,3 +1,78 @@
 from django.db import models
 
-# Create your models here.
+from shop.models import Order
+
+
+class InvoiceDispatchRun(models.Model):
+    """ein Durchlauf des täglichen Rechnungsversands (payment.dispatch)"""
+
+    started = models.DateTimeField("gestartet", auto_now_add=True)
+    finished = models.DateTimeField("beendet", null=True, blank=True)
+    candidates = models.PositiveIntegerField("Kandidaten", default=0)
+    sent = models.PositiveIntegerField("versendet", default=0)
+    skipped = models.PositiveIntegerField("übersprungen", default=0)
+    failed = models.PositiveIntegerField("fehlgeschlagen", default=0)
+    prepare_seconds = models.FloatField("Vorbereitung (s)", default=0)
+    render_seconds = models.FloatField("PDFs (s)", default=0)
+    send_seconds = models.FloatField("Versand (s)", default=0)
+
+    class Meta:
+        ordering = ["-started"]
+        verbose_name = "Rechnungsversand"
+        verbose_name_plural = "Rechnungsversand"
+
+    def __str__(self):
+        return f"{self.started:%d.%m.%Y %H:%M}: {self.sent}/{self.candidates}"
+
+    @property
+    def duration(self):
+        if self.finished is None:
+            return None
+        return (self.finished - self.started).total_seconds()
+
+    @property
+    def invoices_per_second(self):
+        if not self.duration:
+            return None
+        return round(self.sent / self.duration, 2)
+
+
+class InvoiceDispatch(models.Model):
+    """
+    Versandstatus einer Rechnung; "in Versand" wird vor dem SMTP-Aufruf
+    gesetzt, bricht ein Lauf danach ab, wird die Rechnung nicht erneut
+    verschickt, sondern muss geprüft werden
+    """
+
+    PENDING = "p"
+    SENDING = "s"
+    SENT = "v"
+    FAILED = "f"
+    STATUS_CHOICES = (
+        (PENDING, "offen"),
+        (SENDING, "in Versand"),
+        (SENT, "versendet"),
+        (FAILED, "fehlgeschlagen"),
+    )
+
+    order = models.OneToOneField(
+        Order, related_name="invoice_dispatch", on_delete=models.CASCADE
+    )
+    run = models.ForeignKey(
+        InvoiceDispatchRun,
+        related_name="dispatches",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Rechnungsversand (Bestellung)"
+        verbose_name_plural = "Rechnungsversand (Bestellungen)"
+
+    def __str__(self):
+        return f"{self.order_id}: {self.get_status_display()}"
@@ -13,8 +13,8 @@ from tempfile import NamedTemporaryFile
 
 from shop.models import Order, OrderItem
 
+from payment.invoices import get_invoice_pdf
 from payment.utils import (
-    render_to_pdf_directly,
     update_order,
     check_order_date_in_future,
 )
@@ -36,17 +36,8 @@ def generate_qr():
     return img
 
 
-# @shared_task
-def payment_completed(order_id):
-    """
-    Task to send an e-mail notification when an order is
-    successfully paid.
-    """
-    order = Order.objects.get(id=order_id)
-    context = {}
-
-    # print("payment_type", order.payment_type)
-
+def get_invoice_mail(order):
+    """(Vorlage, Betreff, Platzhalter) der Rechnungs-E-Mail einer Bestellung"""
     if order.payment_type == "r":
         template_name = "invoice"
     elif order.payment_type == "p":
@@ -62,33 +53,37 @@ def payment_completed(order_id):
         "costs": order.get_total_cost(),
     }
 
+    # create invoice e-mail
+    subject = f"VFLL - Rechnung Nr. {order.get_order_number}"
+    return template_name, subject, formatting_dict
+
+
+# @shared_task
+def payment_completed(order_id):
+    """
+    Task to send an e-mail notification when an order is
+    successfully paid.
+    """
+    order = Order.objects.get(id=order_id)
+
+    # print("payment_type", order.payment_type)
+
+    template_name, subject, formatting_dict = get_invoice_mail(order)
+
     addresses = {"to": [order.email]}
 
     from_email = settings.DEFAULT_FROM_EMAIL
     reply_to = [settings.REPLY_TO_EMAIL]
 
-    # create invoice e-mail
-    subject = f"VFLL - Rechnung Nr. {order.get_order_number}"
-
     # generate QR
     # qr_img = generate_qr()
 
-    # generate PDF
-    template = "shop/pdf_invoice.html"
-
     # update order due to status of event member status
     if check_order_date_in_future(order):
         update_order(order)
 
-    context["order"] = order
-    context["order_items"] = OrderItem.objects.filter(order=order, status="r")
-    context["contains_action_price"] = any(
-        [
-            item.is_action_price
-            for item in OrderItem.objects.filter(order=order, status="r")
-        ]
-    )
-    pdf = render_to_pdf_directly(template, context)
+    # generate PDF (cached, see payment.invoices)
+    pdf = get_invoice_pdf(order)
     if pdf:
         filename_prefix = "rechnung_%s" % (order.get_order_number)
         # pdf_file = ContentFile(pdf)
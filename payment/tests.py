@@ -1,3 +1,179 @@
-from django.test import TestCase
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from events.email_template import EmailTemplate
+from events.models import (
+    Event,
+    EventCategory,
+    EventFormat,
+    EventLocation,
+    EventMember,
+)
+from shop.models import Order, OrderItem
+
+from shop.actions import download_invoices_as_zipfile
+
+from payment import invoices
+from payment.dispatch import dispatch_invoices
+from payment.models import InvoiceDispatch
+from payment.utils import stream_zip, sync_orders
+
+
+class InvoiceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        event = Event.objects.create(
+            name="Rechnungsevent",
+            category=EventCategory.objects.create(name="testcat"),
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            price="100.00",
+        )
+        cls.order = Order.objects.create(
+            firstname="Erika", lastname="Muster", email="erika@example.com"
+        )
+        OrderItem.objects.create(
+            order=cls.order, event=event, price=100, premium_price=120
+        )
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(
+            INVOICE_CACHE_DIR=cache_dir.name, INVOICE_RENDER_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class InvoicePdfCacheTest(InvoiceTestCase):
+    def test_second_download_is_served_from_cache(self):
+        with mock.patch.object(
+            invoices, "html_to_pdf", wraps=invoices.html_to_pdf
+        ) as html_to_pdf:
+            pdf = invoices.get_invoice_pdf(self.order, "order")
+            self.assertEqual(invoices.get_invoice_pdf(self.order, "order"), pdf)
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        self.assertEqual(html_to_pdf.call_count, 1)
+
+    def test_storno_invoice_has_stable_date(self):
+        html = invoices.render_invoice_html(self.order, "storno")
+        self.assertEqual(
+            invoices.get_invoice_context(self.order, "storno")["invoice_date"],
+            self.order.date_modified,
+        )
+        self.assertEqual(invoices.render_invoice_html(self.order, "storno"), html)
+
+    def test_changed_order_gets_new_pdf(self):
+        key = invoices.invoice_cache_key(invoices.render_invoice_html(self.order))
+        self.order.lastname = "Musterfrau"
+        self.order.save()
+        self.assertNotEqual(
+            invoices.invoice_cache_key(invoices.render_invoice_html(self.order)), key
+        )
+
+
+class InvoiceZipStreamTest(InvoiceTestCase):
+    def test_stream_zip_stores_files(self):
+        data = b"".join(stream_zip([("a.pdf", b"%PDF-a"), ("b.pdf", b"%PDF-b")]))
+        with zipfile.ZipFile(BytesIO(data)) as zf:
+            self.assertEqual(zf.read("b.pdf"), b"%PDF-b")
+            self.assertEqual(
+                {info.compress_type for info in zf.infolist()}, {zipfile.ZIP_STORED}
+            )
+
+    def test_download_marker_set_after_stream(self):
+        with mock.patch.object(invoices, "html_to_pdf", return_value=b"%PDF-x"):
+            response = download_invoices_as_zipfile(
+                None, None, Order.objects.filter(id=self.order.id)
+            )
+            self.order.refresh_from_db()
+            self.assertFalse(self.order.download_marker)
+            data = b"".join(response.streaming_content)
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.download_marker)
+        with zipfile.ZipFile(BytesIO(data)) as zf:
+            self.assertEqual(zf.namelist(), [invoices.invoice_filename(self.order)])
+
+
+class InvoiceDispatchTest(InvoiceTestCase):
+    def setUp(self):
+        super().setUp()
+        EmailTemplate.objects.create(
+            name="invoice", text_template="Hallo {firstname}, {costs} Euro"
+        )
+        Order.objects.filter(id=self.order.id).update(
+            payment_date=datetime.now() - timedelta(days=1)
+        )
+        patcher = mock.patch.object(invoices, "html_to_pdf", return_value=b"%PDF-x")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invoice_is_sent_once(self):
+        run = dispatch_invoices()
+        self.assertEqual((run.candidates, run.sent, run.failed), (1, 1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][0], "invoice.pdf")
+        self.order.refresh_from_db()
+        self.assertIsNotNone(self.order.mail_sent_date)
+
+        Order.objects.filter(id=self.order.id).update(mail_sent_date=None)
+        self.assertEqual(dispatch_invoices().sent, 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_interrupted_dispatch_is_not_resent(self):
+        InvoiceDispatch.objects.create(
+            order=self.order, status=InvoiceDispatch.SENDING, attempts=1
+        )
+        run = dispatch_invoices()
+        self.assertEqual((run.candidates, run.sent), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class SyncOrdersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.event = Event.objects.create(
+            name="Preisevent",
+            category=EventCategory.objects.create(name="testcat"),
+            eventformat=EventFormat.objects.create(name="testformat"),
+            location=EventLocation.objects.create(title="testloc"),
+            price="100.00",
+        )
+        cls.member = EventMember.objects.create(
+            event=cls.event,
+            firstname="Erika",
+            lastname="Muster",
+            email="erika@example.com",
+            attend_status="registered",
+        )
+        cls.order = Order.objects.create(
+            firstname="Erika", lastname="Muster", email="erika@example.com"
+        )
+        cls.item = OrderItem.objects.create(
+            order=cls.order, event=cls.event, price=100, premium_price=100
+        )
+
+    def test_unchanged_orders_are_not_written(self):
+        self.assertEqual(sync_orders([self.order]), 1)
+        self.item.refresh_from_db()
+        self.event.refresh_from_db()
+        self.assertEqual(self.item.premium_price, self.event.premium_price)
+
+        # Positionen, Teilnehmer, Events; kein UPDATE
+        with self.assertNumQueries(3):
+            self.assertEqual(sync_orders([self.order]), 0)
+
+    def test_item_status_follows_member(self):
+        sync_orders([self.order])
+        self.member.attend_status = "cancelled"
+        self.member.save()
+        self.assertEqual(sync_orders([self.order]), 1)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.status, "s")
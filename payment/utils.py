@@ -1,5 +1,6 @@
 import os
 import pytz
+from collections import defaultdict
 from decimal import Decimal
 from datetime import datetime
 from io import StringIO, BytesIO
@@ -15,8 +16,8 @@ from django.template.loader import get_template
 from xhtml2pdf import pisa
 
 from events.models import EventMember
-from shop.models import Order
-from shop.cart import recalculate_action_prices
+from shop.models import Order, OrderItem
+from shop.cart import load_price_events, recalculate_action_prices
 
 
 def get_local_datetime(value):
@@ -89,14 +90,37 @@ def render_to_pdf_directly(template_src, context_dict={}):
         return HttpResponse("Errors")
 
 
-def generate_zip(files):
-    mem_zip = BytesIO()
+class _ZipStream:
+    """nicht-seekbare Pseudo-Datei, sammelt die Bytes bis zum nächsten pop()"""
 
-    with zipfile.ZipFile(mem_zip, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for f in files:
-            zf.writestr(f[0], f[1])
+    def __init__(self):
+        self.chunks = []
 
-    return mem_zip.getvalue()
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files, compression=zipfile.ZIP_STORED):
+    """
+    ZIP-Datei als Generator von Bytes für eine StreamingHttpResponse,
+    files ist ein Iterable von (Dateiname, Inhalt); PDFs sind bereits
+    komprimiert, daher ZIP_STORED
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, mode="w", compression=compression) as zf:
+        for name, data in files:
+            zf.writestr(name, data)
+            yield stream.pop()
+    yield stream.pop()
 
 
 item_status_dict = {
@@ -150,49 +174,111 @@ def update_order(order):
     # today = datetime.now().astimezone(pytz.timezone("UTC"))
 
     # if order_date > datetime.now().astimezone(pytz.timezone("UTC")):
-    for item in order.items.all():
-        try:
-            event_member = EventMember.objects.get(event=item.event, email=order.email)
-            # set item status to u (unbestimmt) if no dict key present
-            item.status = item_status_dict.get(event_member.attend_status, "u")
-            item.save()
-        except:
-            item.status = "u"
-            item.save()
-
-    # reload order
-    updated_order = Order.objects.get(id=order.id)
-
-    # get events belonging to order where status of item is registered
-    events = updated_order.get_registered_items_events()
-
-    # initialize dict with event ids and prices
-    event_prices_dict = {}
-    for event in events:
-        event_prices_dict[event.id] = {
-            "quantity": 0,
-            "price": str(event.price),
-            "premium_price": str(event.premium_price),
-            "is_full": event.is_full(),
-            "action_price": False,
-        }
-
-    event_prices_dict = recalculate_action_prices(event_prices_dict, events)
-
-    for item in updated_order.items.filter(status="r"):
-        item.price = event_prices_dict[item.event.id]["price"]
-        if updated_order.date_created >= datetime(
-            2024, 10, 21, 0, 0, 0, tzinfo=pytz.timezone("UTC")
-        ):
-            item.premium_price = event_prices_dict[item.event.id]["premium_price"]
-        item.is_action_price = event_prices_dict[item.event.id]["action_price"]
-        item.save()
+    sync_orders([order])
 
     order_updated = True
 
     return order_updated
 
 
+# premium prices are only re-synced for orders from this date on
+PREMIUM_PRICE_SYNC_DATE = datetime(2024, 10, 21, 0, 0, 0, tzinfo=pytz.timezone("UTC"))
+
+
+def get_member_statuses(pairs):
+    """
+    {(event_id, email): attend_status} for (event_id, email) pairs in one query;
+    None if there are several members (EventMember.objects.get would fail)
+    """
+    pairs = set(pairs)
+    statuses = {}
+    if not pairs:
+        return statuses
+    for event_id, email, status in EventMember.objects.filter(
+        event_id__in={event_id for event_id, _ in pairs},
+        email__in={email for _, email in pairs},
+    ).values_list("event_id", "email", "attend_status"):
+        key = (event_id, email)
+        if key in pairs:
+            statuses[key] = None if key in statuses else status
+    return statuses
+
+
+def sync_orders(orders):
+    """
+    update_order for many orders at once: item status from the event members,
+    prices from the events (action prices); members, items and events are
+    loaded with a fixed number of queries and only changed items are written
+    (one bulk_update), returns the number of changed items
+    """
+    orders = {order.id: order for order in orders}
+    if not orders:
+        return 0
+    items = list(OrderItem.objects.filter(order_id__in=orders).order_by("id"))
+    statuses = get_member_statuses(
+        (item.event_id, orders[item.order_id].email) for item in items
+    )
+    new_status = {}
+    items_by_order = defaultdict(list)
+    for item in items:
+        item.order = orders[item.order_id]
+        # set item status to u (unbestimmt) if no member or no dict key present
+        status = statuses.get((item.event_id, item.order.email))
+        new_status[item.id] = item_status_dict.get(status, "u")
+        items_by_order[item.order_id].append(item)
+
+    price_events = load_price_events(
+        {item.event_id for item in items if new_status[item.id] == "r"}
+    )
+
+    changed = []
+    for order_id, order_items in items_by_order.items():
+        order = orders[order_id]
+        # get events belonging to order where status of item is registered
+        events = [
+            price_events[0][item.event_id]
+            for item in order_items
+            if new_status[item.id] == "r"
+        ]
+        event_prices_dict = recalculate_action_prices(
+            {
+                event.id: {
+                    "quantity": 0,
+                    "price": str(event.price),
+                    "premium_price": str(event.premium_price),
+                    "is_full": event.is_full(),
+                    "action_price": False,
+                }
+                for event in events
+            },
+            events,
+            price_events,
+        )
+        for item in order_items:
+            values = {"status": new_status[item.id]}
+            if values["status"] == "r":
+                prices = event_prices_dict[item.event_id]
+                values["price"] = Decimal(prices["price"])
+                if order.date_created >= PREMIUM_PRICE_SYNC_DATE:
+                    values["premium_price"] = Decimal(prices["premium_price"])
+                values["is_action_price"] = prices["action_price"]
+            old_values = [getattr(item, name) for name in values] + [item.cost]
+            for name, value in values.items():
+                setattr(item, name, value)
+            # cost is computed in OrderItem.save()
+            item.cost = item.get_cost()
+            if old_values != list(values.values()) + [item.cost]:
+                changed.append(item)
+
+    if changed:
+        OrderItem.objects.bulk_update(
+            changed,
+            ["status", "price", "premium_price", "is_action_price", "cost"],
+            batch_size=500,
+        )
+    return len(changed)
+
+
 def check_order_complete(order):
 
     # all these fields must have values
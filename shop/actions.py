@@ -1,44 +1,35 @@
-import csv
 import zipfile
 import openpyxl
 
 from datetime import datetime, date
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.core.files.base import ContentFile
+from django.db.models import DateTimeField
 
-from shop.models import OrderItem
+from events.csv_export import CsvColumn, format_date, streaming_csv_response
 
+from shop.models import Order, OrderItem
+
+from payment.invoices import invoice_filename, iter_invoice_pdfs
 from payment.utils import (
-    render_to_pdf_directly,
-    generate_zip,
-    update_order,
+    stream_zip,
+    sync_orders,
     check_order_date_in_future,
 )
 
 
 def export_to_csv(modeladmin, request, queryset):
     opts = modeladmin.model._meta
-    content_disposition = f"attachment; filename={opts.verbose_name}_{datetime.today().strftime('%Y-%m-%d')}.csv"
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = content_disposition
-    writer = csv.writer(response)
-    fields = [
-        field
-        for field in opts.get_fields()
-        if not field.many_to_many and not field.one_to_many
+    filename = f"{opts.verbose_name}_{datetime.today().strftime('%Y-%m-%d')}.csv"
+    columns = [
+        CsvColumn(
+            field.verbose_name,
+            field.attname,
+            format_date if isinstance(field, DateTimeField) else None,
+        )
+        for field in opts.concrete_fields
     ]
-    # Write a first row with header information
-    writer.writerow([field.verbose_name for field in fields])
-    # Write data rows
-    for obj in queryset:
-        data_row = []
-        for field in fields:
-            value = getattr(obj, field.name)
-            if isinstance(value, datetime):
-                value = value.strftime("%d.%m.%Y")
-            data_row.append(value)
-        writer.writerow(data_row)
-    return response
+    return streaming_csv_response(queryset, columns, filename)
 
 
 def export_to_excel_short(modeladmin, request, queryset):
@@ -126,30 +117,22 @@ def export_to_excel(modeladmin, request, queryset, short=False):
 def download_invoices_as_zipfile(modeladmin, request, queryset):
     zipfile_name = f"rechnungen_{datetime.today().strftime('%Y-%m-%d')}.zip"
 
-    template_path = "shop/pdf_invoice.html"
-    files = []
-
-    for q in queryset.filter(download_marker=False):
-        if check_order_date_in_future(q):
-            update_order(q)
-        context = {"order": q}
-        context["order_items"] = OrderItem.objects.filter(order=q, status="r")
-        context["contains_action_price"] = any(
-            [
-                item.is_action_price
-                for item in OrderItem.objects.filter(order=q, status="r")
-            ]
-        )
-        pdf = render_to_pdf_directly(template_path, context)
-        filename = "rechnung_%s" % (q.get_order_number)
-        files.append((filename + ".pdf", pdf))
-        q.download_marker = True
-        q.save()
-
-    full_zip_in_memory = generate_zip(files)
-
-    response = HttpResponse(
-        full_zip_in_memory, content_type="application/force-download"
+    orders = list(queryset.filter(download_marker=False).order_by("id"))
+    sync_orders([q for q in orders if check_order_date_in_future(q)])
+
+    def invoice_files():
+        # PDFs aus dem Cache, fehlende blockweise im Prozess-Pool
+        downloaded = []
+        for q, pdf in iter_invoice_pdfs(orders):
+            if pdf is None:
+                continue
+            downloaded.append(q.id)
+            yield invoice_filename(q), pdf
+        # erst wenn der Download vollständig ist, mit einem UPDATE
+        Order.objects.filter(id__in=downloaded).update(download_marker=True)
+
+    response = StreamingHttpResponse(
+        stream_zip(invoice_files()), content_type="application/force-download"
     )
     response["Content-Disposition"] = 'attachment; filename="{}"'.format(zipfile_name)
 
@@ -157,6 +140,4 @@ def download_invoices_as_zipfile(modeladmin, request, queryset):
 
 
 def reset_download_markers(modeladmin, request, queryset):
-    for obj in queryset:
-        obj.download_marker = False
-        obj.save()
+    queryset.update(download_marker=False)
@@ -1,63 +1,95 @@
+from collections import defaultdict
 from decimal import Decimal
 from django.conf import settings
 from events.models import Event
 
 
-def recalculate_action_prices(event_prices_dict, events):
+def _price_entry(price, premium_price, action_price):
+    return {
+        "price": str(price),
+        "premium_price": str(premium_price),
+        "action_price": action_price,
+    }
+
+
+def load_price_events(event_ids):
+    """
+    events (with their payless action) and the event ids of all payless actions,
+    ordered by price (cheapest first); two queries for any number of events
+    """
+    events = {
+        event.id: event
+        for event in Event.objects.filter(
+            id__in=[int(id) for id in event_ids]
+        ).select_related("payless_collection")
+    }
+    action_events = defaultdict(list)
+    action_ids = {
+        event.payless_collection_id
+        for event in events.values()
+        if event.payless_collection_id
+    }
+    if action_ids:
+        for action_event in (
+            Event.objects.filter(payless_collection_id__in=action_ids)
+            .only("id", "price", "payless_collection_id")
+            .order_by("price", "id")
+        ):
+            action_events[action_event.payless_collection_id].append(action_event.id)
+    return events, action_events
+
+
+def recalculate_action_prices(event_prices_dict, events=None, price_events=None):
     """calculates for given dict with ids and prices and events if event belongs to
     event collction and payless action
     return dict with event_ids as keys and different prices as values
+
+    all events and the events of their payless actions are loaded in two queries,
+    prices are computed in memory (independent from the number of cart items);
+    price_events (from load_price_events) can be passed to price many orders
+    with the same two queries
     """
-    event_ids = event_prices_dict.keys()
-    for id in event_ids:
-        event = Event.objects.get(id=id)
-        if event.payless_collection:
-            action_events = event.payless_collection.events.all().order_by("price")
-            cheapest_action_event = action_events[0]
-            # with this condition also not full events can be part of action
-            condition_for_action = set(action_events).issubset(events)
-            # with this additional condition only not full events can be part of action
-            if settings.ONLY_NOT_FULL_EVENTS_CAN_HAVE_ACTION:
-                condition_for_action = condition_for_action and all(
-                    [not event.is_full() for event in events]
-                )
-
-            if condition_for_action:
-                if event.payless_collection.type == "n":
-                    if event.id == cheapest_action_event.id:
-                        event_prices_dict[id]["price"] = str(Decimal("0.00"))
-                        event_prices_dict[id]["premium_price"] = str(Decimal("0.00"))
-                        event_prices_dict[id]["action_price"] = True
-                    else:
-                        event_prices_dict[id]["price"] = str(event.price)
-                        event_prices_dict[id]["premium_price"] = str(
-                            event.premium_price
-                        )
-                        event_prices_dict[id]["action_price"] = False
-                elif event.payless_collection.type == "p":
-                    event_prices_dict[id]["price"] = str(
-                        round(
-                            Decimal((100 - event.payless_collection.percents) / 100)
-                            * event.price,
-                            2,
-                        )
-                    )
-                    event_prices_dict[id]["premium_price"] = str(
-                        round(
-                            Decimal((100 - event.payless_collection.percents) / 100)
-                            * event.premium_price,
-                            2,
-                        )
-                    )
-                    event_prices_dict[id]["action_price"] = True
+    if not event_prices_dict:
+        return event_prices_dict
+    if price_events is None:
+        price_events = load_price_events(event_prices_dict.keys())
+    all_events, action_events = price_events
+    cart_events = {int(id): all_events[int(id)] for id in event_prices_dict.keys()}
+    # events to check: per default the events of the dict
+    events = list(cart_events.values()) if events is None else list(events)
+    event_ids = {event.id for event in events}
+
+    # with this additional condition only not full events can be part of action
+    none_is_full = True
+    if settings.ONLY_NOT_FULL_EVENTS_CAN_HAVE_ACTION:
+        none_is_full = all([not event.is_full() for event in events])
+
+    for id in event_prices_dict.keys():
+        event = cart_events[int(id)]
+        action = event.payless_collection
+        # with this condition also not full events can be part of action
+        condition_for_action = (
+            action is not None
+            and set(action_events[action.id]).issubset(event_ids)
+            and none_is_full
+        )
+        if not condition_for_action:
+            entry = _price_entry(event.price, event.premium_price, False)
+        elif action.type == "n":
+            if event.id == action_events[action.id][0]:
+                entry = _price_entry(Decimal("0.00"), Decimal("0.00"), True)
             else:
-                event_prices_dict[id]["price"] = str(event.price)
-                event_prices_dict[id]["premium_price"] = str(event.premium_price)
-                event_prices_dict[id]["action_price"] = False
+                entry = _price_entry(event.price, event.premium_price, False)
+        elif action.type == "p":
+            factor = Decimal((100 - action.percents) / 100)
+            entry = _price_entry(
+                round(factor * event.price, 2),
+                round(factor * event.premium_price, 2),
+                True,
+            )
         else:
-            event_prices_dict[id]["price"] = str(event.price)
-            event_prices_dict[id]["premium_price"] = str(event.premium_price)
-            event_prices_dict[id]["action_price"] = False
+            continue
+        event_prices_dict[id].update(entry)
     return event_prices_dict
 
     # """
@@ -102,6 +134,7 @@ class Cart:
         """
         event_id = str(event.id)
         if event_id not in self.cart:
+            self.event_names[event_id] = event.name
             self.cart[event_id] = {
                 "quantity": 0,
                 "price": str(event.price),
@@ -120,9 +153,33 @@ class Cart:
         self.calculate_action_prices()
 
     def save(self):
+        # keep the summary for the header badge in sync
+        self.session[settings.CART_SUMMARY_SESSION_ID] = self.get_summary()
         # mark the session as "modified" to make sure it gets saved
         self.session.modified = True
 
+    @property
+    def event_names(self):
+        if not hasattr(self, "_event_names"):
+            summary = self.session.get(settings.CART_SUMMARY_SESSION_ID) or {}
+            self._event_names = dict(summary.get("events", {}))
+        return self._event_names
+
+    def get_summary(self):
+        """
+        Summary of the cart which is stored in the session, so that the
+        header can be rendered without touching the database.
+        """
+        return {
+            "count": len(self),
+            "total_price": str(self.get_total_price()),
+            "discounted_total_price": str(self.get_discounted_total_price()),
+            "events": {
+                event_id: self.event_names.get(event_id, "")
+                for event_id in self.cart.keys()
+            },
+        }
+
     def remove(self, event):
         """
         Remove an event from the cart.
@@ -130,6 +187,7 @@ class Cart:
         event_id = str(event.id)
         if event_id in self.cart:
             del self.cart[event_id]
+            self.event_names.pop(event_id, None)
             self.save()
 
         # have to calculate the prices again because of actions
@@ -187,14 +245,12 @@ class Cart:
     def clear(self):
         # remove cart from session
         del self.session[settings.CART_SESSION_ID]
-        self.save()
+        self.session.pop(settings.CART_SUMMARY_SESSION_ID, None)
+        self.session.modified = True
 
     def calculate_action_prices(self):
-        cart_events = self.get_events()
-        # print("cart_events: ", cart_events)
-        # ordered by price so action_events[0] is cheapest
-        # event_ids = self.cart.keys()
-        self.cart = recalculate_action_prices(self.cart, cart_events)
+        # the cart events are loaded by recalculate_action_prices itself
+        self.cart = recalculate_action_prices(self.cart)
         # for id in self.cart.keys():
         #     event = Event.objects.get(id=id)
         #     if event.payless_collection:
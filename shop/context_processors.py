@@ -1,4 +1,81 @@
+from decimal import Decimal
+
+from django.conf import settings
+
 from shop.cart import Cart
 
+
+class LazyCart:
+    """
+    Cart proxy for the templates.
+    The header badge (length, totals, event names) is served from the raw
+    session data; the real Cart (and its database query) is only built
+    when the template iterates the cart or calls other cart methods.
+    An empty session is never written, so anonymous visitors don't get a
+    session just by looking at the calendar.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._cart = None
+
+    @property
+    def cart(self):
+        if self._cart is None:
+            self._cart = Cart(self._request)
+        return self._cart
+
+    def _session_cart(self):
+        return self._request.session.get(settings.CART_SESSION_ID) or {}
+
+    def get_summary(self):
+        summary = self._request.session.get(settings.CART_SUMMARY_SESSION_ID)
+        if summary is None:
+            # older sessions without summary: compute it from the raw cart
+            items = self._session_cart().values()
+            summary = {
+                "count": sum(item["quantity"] for item in items),
+                "total_price": str(
+                    sum(
+                        Decimal(item["premium_price"]) * item["quantity"]
+                        for item in items
+                        if not item["is_full"]
+                    )
+                ),
+                "discounted_total_price": str(
+                    sum(
+                        Decimal(item["price"]) * item["quantity"]
+                        for item in items
+                        if not item["is_full"]
+                    )
+                ),
+                "events": {},
+            }
+        return summary
+
+    def __len__(self):
+        return self.get_summary()["count"]
+
+    def get_number_of_items(self):
+        return len(self)
+
+    def get_total_price(self):
+        return Decimal(self.get_summary()["total_price"])
+
+    def get_discounted_total_price(self):
+        return Decimal(self.get_summary()["discounted_total_price"])
+
+    def get_event_names(self):
+        return list(self.get_summary()["events"].values())
+
+    def __iter__(self):
+        return iter(self.cart)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.cart, name)
+
+
 def cart(request):
-    return {'cart': Cart(request)}
+    return {"cart": LazyCart(request)}
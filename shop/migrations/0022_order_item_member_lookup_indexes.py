@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2025-07-14 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0021_alter_orderitem_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["email", "-date_created"], name="shop_order_email_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["event", "order"], name="shop_orderitem_event_order_idx"
+            ),
+        ),
+    ]
@@ -14,6 +14,10 @@ PAYMENT_TYPE_CHOICES = (
 )
 
 
+def format_order_number(order_id):
+    return "V{:06d}".format(order_id)
+
+
 class Order(AddressModel):
     firstname = models.CharField(verbose_name="Vorname", max_length=50)
     lastname = models.CharField(verbose_name="Nachname", max_length=50)
@@ -72,6 +76,10 @@ class Order(AddressModel):
         ordering = ["-date_created"]
         indexes = [
             models.Index(fields=["-date_created"]),
+            # Bestellung zu einem Teilnehmer (events/member_orders.py)
+            models.Index(
+                fields=["email", "-date_created"], name="shop_order_email_date_idx"
+            ),
         ]
 
     def __str__(self):
@@ -97,7 +105,7 @@ class Order(AddressModel):
 
     @property
     def get_order_number(self):
-        return "V{:06d}".format(self.id)
+        return format_order_number(self.id)
 
     @property
     def get_full_name_and_events(self):
@@ -137,6 +145,13 @@ class OrderItem(models.Model):
     )
     cost = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["event", "order"], name="shop_orderitem_event_order_idx"
+            ),
+        ]
+
     def __str__(self):
         return str(self.id)
 
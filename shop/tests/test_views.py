@@ -1,5 +1,6 @@
 import datetime
 from decimal import Decimal
+from unittest import mock
 
 from django.test import TestCase, RequestFactory
 from django.urls import reverse
@@ -7,6 +8,8 @@ from django.utils import timezone
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.core import mail
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from events.models import (
     Event,
@@ -20,9 +23,10 @@ from events.models import (
 )
 
 from events.email_template import EmailTemplate
-from shop.cart import Cart
+from shop.cart import Cart, recalculate_action_prices
+from shop.context_processors import cart as cart_context_processor
 from shop.models import Order, OrderItem
-from shop.views import cart_add, order_create, OrderCreateView
+from shop.views import cart_add, OrderCreateView
 
 
 ####################
@@ -58,7 +62,7 @@ class CartInitializeTestCase(TestCase):
         self.request = RequestFactory().get("/")
 
         # adding session
-        middleware = SessionMiddleware()
+        middleware = SessionMiddleware(lambda request: None)
         middleware.process_request(self.request)
         self.request.session.save()
 
@@ -135,7 +139,7 @@ class CartAddTestCase(TestCase):
         self.request = self.factory.get("/")
 
         # adding session
-        middleware = SessionMiddleware()
+        middleware = SessionMiddleware(lambda request: None)
         middleware.process_request(self.request)
 
         # add cart to session with one event
@@ -302,6 +306,96 @@ class CartAddTestCase(TestCase):
         self.assertEqual(float(cart.cart[event1_id]["price"]), float(self.event1.price))
 
 
+class RecalculateActionPricesQueryCountTestCase(TestCase):
+    # the number of queries must not depend on the number of cart events
+
+    def setUp(self):
+        category = EventCategory.objects.create(name="testcat")
+        eventformat = EventFormat.objects.create(name="testformat")
+        location = EventLocation.objects.create(title="testloc")
+        self.payless_collection = PayLessAction.objects.create(
+            name="payless collection 1", type="n"
+        )
+        self.events = [
+            Event.objects.create(
+                name=f"Future Event {i}",
+                category=category,
+                eventformat=eventformat,
+                location=location,
+                price=f"{100 + i}.00",
+                payless_collection=self.payless_collection,
+            )
+            for i in range(12)
+        ]
+
+    def get_prices_dict(self, events):
+        return {
+            str(event.id): {
+                "quantity": 1,
+                "price": str(event.price),
+                "premium_price": str(event.premium_price),
+                "is_full": False,
+                "action_price": False,
+            }
+            for event in events
+        }
+
+    def count_queries(self, events):
+        prices_dict = self.get_prices_dict(events)
+        with CaptureQueriesContext(connection) as context:
+            recalculate_action_prices(prices_dict)
+        return len(context.captured_queries), prices_dict
+
+    def test_query_count_independent_of_cart_size(self):
+        small_count, _ = self.count_queries(self.events[:2])
+        large_count, _ = self.count_queries(self.events)
+        self.assertEqual(small_count, large_count)
+
+    def test_cheapest_event_is_free_if_whole_action_in_cart(self):
+        _, prices_dict = self.count_queries(self.events)
+        cheapest_id = str(self.events[0].id)
+        self.assertEqual(prices_dict[cheapest_id]["price"], "0.00")
+        self.assertTrue(prices_dict[cheapest_id]["action_price"])
+        self.assertFalse(prices_dict[str(self.events[1].id)]["action_price"])
+
+
+class CartContextProcessorTestCase(TestCase):
+    def setUp(self):
+        category = EventCategory.objects.create(name="testcat")
+        eventformat = EventFormat.objects.create(name="testformat")
+        location = EventLocation.objects.create(title="testloc")
+        self.event = Event.objects.create(
+            name="Future Event 1",
+            category=category,
+            eventformat=eventformat,
+            location=location,
+            price="100.00",
+        )
+        self.request = RequestFactory().get("/")
+        middleware = SessionMiddleware(lambda request: None)
+        middleware.process_request(self.request)
+
+    def test_empty_cart_does_not_touch_session_or_db(self):
+        with self.assertNumQueries(0):
+            cart = cart_context_processor(self.request)["cart"]
+            self.assertEqual(len(cart), 0)
+            self.assertFalse(cart.get_total_price())
+        self.assertFalse(self.request.session.modified)
+
+    def test_badge_is_rendered_from_session_summary(self):
+        Cart(self.request).add(event=self.event, quantity=1)
+        with self.assertNumQueries(0):
+            cart = cart_context_processor(self.request)["cart"]
+            self.assertEqual(len(cart), 1)
+            self.assertEqual(cart.get_discounted_total_price(), Decimal("100.00"))
+            self.assertEqual(cart.get_event_names(), ["Future Event 1"])
+
+    def test_iteration_loads_events(self):
+        Cart(self.request).add(event=self.event, quantity=1)
+        cart = cart_context_processor(self.request)["cart"]
+        self.assertEqual([item["event"] for item in cart], [self.event])
+
+
 class ShopViewsTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -362,7 +456,7 @@ class ShopViewsTest(TestCase):
         cls.request = RequestFactory().post(
             reverse("shop:cart-add", args=[cls.event1.id])
         )
-        middleware = SessionMiddleware()
+        middleware = SessionMiddleware(lambda request: None)
         middleware.process_request(cls.request)
         cls.request.session.save()
         cls.cart = Cart(cls.request)
@@ -432,7 +526,7 @@ class OrderCreateViewTestCase(TestCase):
         self.request = self.factory.get("shop/order_create")
 
         # adding session
-        middleware = SessionMiddleware()
+        middleware = SessionMiddleware(lambda request: None)
         middleware.process_request(self.request)
 
         # add cart to session with one event
@@ -546,7 +640,7 @@ class OrderCreateViewPostTestCase(TestCase):
         self.request = self.factory.post("shop/order_create", data=form_data)
 
         # adding session
-        middleware = SessionMiddleware()
+        middleware = SessionMiddleware(lambda request: None)
         middleware.process_request(self.request)
 
         # add cart to session with one event
@@ -676,6 +770,18 @@ class OrderCreateViewPostTestCase(TestCase):
         # the event of the order item is event 2
         self.assertEqual(order_item.event, self.event2)
 
+    def test_order_item_follows_seat_reservation_not_stale_is_full(self):
+        # der letzte Platz wird zwischen Warenkorb-Anzeige und Absenden vergeben
+        Event.objects.filter(id=self.event1.id).update(capacity=1, registered_count=1)
+
+        with mock.patch.object(Event, "is_full", return_value=False):
+            OrderCreateView.as_view()(self.request)
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertFalse(OrderItem.objects.filter(event=self.event1).exists())
+        member = EventMember.objects.get(event=self.event1, email="lilly@lachmal.de")
+        self.assertEqual(member.attend_status, "waiting")
+
     def test_send_email_after_order_creation(self):
         EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
         response = OrderCreateView.as_view()(self.request)
@@ -743,7 +849,7 @@ class OrderCreateViewPricesTestCase(TestCase):
         self.request = self.factory.post("shop/order_create", data=form_data)
 
         # adding session
-        middleware = SessionMiddleware()
+        middleware = SessionMiddleware(lambda request: None)
         middleware.process_request(self.request)
 
         # add cart to session with one event
@@ -790,7 +896,7 @@ class OrderCreateViewPricesTestCase(TestCase):
         self.request = self.factory.post("shop/order_create", data=form_data)
 
         # adding session
-        middleware = SessionMiddleware()
+        middleware = SessionMiddleware(lambda request: None)
         middleware.process_request(self.request)
 
         # add cart to session with one event
@@ -834,7 +940,7 @@ class OrderCreateViewPricesTestCase(TestCase):
         self.request = self.factory.post("shop/order_create", data=form_data)
 
         # adding session
-        middleware = SessionMiddleware()
+        middleware = SessionMiddleware(lambda request: None)
         middleware.process_request(self.request)
 
         # add cart to session with one event
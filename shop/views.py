@@ -28,7 +28,7 @@ from xhtml2pdf import pisa
 
 from events.models import Event, EventCollection
 from events.forms import EventMemberForm
-from events.views import handle_form_submission
+from events.views import register_form_submission
 from events.utils import no_duplicate_check, send_email
 
 from shop.cart import Cart
@@ -37,14 +37,18 @@ from shop.models import Order, OrderItem
 from shop.tasks import order_created
 
 from payment.utils import (
-    render_to_pdf,
     update_order,
     check_order_complete,
 )
 from payment.tasks import payment_completed
+from payment.invoices import get_invoice_pdf, invoice_filename
 
 
 def split_cart(cart):
+    """
+    Vorschau für die Anzeige (bezahlen / Warteliste); verbindlich entscheidet
+    die Platzreservierung in OrderCreateView.form_valid
+    """
     payment, non_payment = [], []
     for item in cart:
         (non_payment, payment)[not item["event"].is_full()].append(item)
@@ -188,17 +192,33 @@ class OrderCreateView(FormView):
         return context
 
     def form_valid(self, form):
-        payment_cart = self.payment_cart
-        non_payment_cart = self.non_payment_cart
         cart = self.cart
+        email = form.cleaned_data.get("email")
 
         order_saved = False
         self.order_saved = order_saved
         order = None
+        order_item_counter = 0
+
+        # create EventMemberInstances for ALL cart items first: the seat is
+        # reserved race-free (events.seats), the attend_status of the new
+        # member decides whether the item is paid or on the waiting list
+        payment_cart, non_payment_cart = [], []
+        duplicate_list = []  # list of events with already existing registration
+        for item in cart:
+            new_member = register_form_submission(self.request, form, item["event"])
+            if new_member is None:
+                duplicate_list.append(item["event"].name)
+            elif new_member.attend_status == "waiting":
+                non_payment_cart.append(item)
+            else:
+                payment_cart.append(item)
+        duplicate_string = ", ".join(duplicate_list)
+        self.payment_cart = payment_cart
+        self.non_payment_cart = non_payment_cart
 
         # Orders are created if there is something to pay
-        if len(split_cart(cart)[0]) > 0:
-            email = form.cleaned_data.get("email")
+        if payment_cart:
             order = Order(
                 academic=form.cleaned_data["academic"],
                 firstname=form.cleaned_data["firstname"],
@@ -214,53 +234,37 @@ class OrderCreateView(FormView):
             )
             vfll = form.cleaned_data["vfll"]
             memberships = form.cleaned_data["memberships"]
-            # print("vfll:", vfll)
-            # print("ms:", memberships, len(memberships), vfll or (len(memberships) > 0))
             order.discounted = vfll or (len(memberships) > 0)
 
-            # only cart items where payment is possible belong to order
+            # only cart items with a reserved seat belong to order
 
             order.save()
-            # print(order.payment_type)
             order_saved = True
 
-            duplicate_list = []  # list of events with already existing registration
-            order_item_counter = 0
-            for item in split_cart(cart)[0]:
-                event = item["event"]
-                if no_duplicate_check(email, event):
-                    OrderItem.objects.create(
-                        order=order,
-                        event=event,
-                        price=item["price"],
-                        premium_price=item["premium_price"],
-                        quantity=item["quantity"],
-                        is_action_price=item["action_price"],
-                    )
-                    order_item_counter += 1
-                else:
-                    duplicate_list.append(event.name)
-
-            duplicate_string = ", ".join(duplicate_list)
-
-        # create EventMemberInstances for ALL cart items
-
-        for item in cart:
-            new_member = handle_form_submission(self.request, form, item["event"])
+            for item in payment_cart:
+                OrderItem.objects.create(
+                    order=order,
+                    event=item["event"],
+                    price=item["price"],
+                    premium_price=item["premium_price"],
+                    quantity=item["quantity"],
+                    is_action_price=item["action_price"],
+                )
+                order_item_counter += 1
 
         # clear the cart
         cart.clear()
 
         if settings.PAYPAL_ENABLED:
 
-            if payment_cart and order_item_counter > 0 and len(duplicate_list) == 0:
+            if payment_cart and len(duplicate_list) == 0:
 
                 message = f"Vielen Dank für Ihre Bestellung/Anmeldung. Die Bestellnummer ist {order.get_order_number}. Bitte wählen Sie im nächsten Schritt Ihre bevorzugte Zahlungsmethode (PayPal oder Rechnung) aus."
                 level = messages.SUCCESS
-            elif payment_cart and order_item_counter > 0 and len(duplicate_list) > 0:
+            elif payment_cart and len(duplicate_list) > 0:
                 message = f"Vielen Dank für Ihre Bestellung/Anmeldung. Für folgende Veranstaltungen waren Sie bereits angemeldet: {duplicate_string}. Diese werden aus Ihrer Bestellung entfernt. Für die anderen ist die Bestellnummer {order.get_order_number}. en Sie im nächsten Schritt Ihre bevorzugte Zahlungsmethode (PayPal oder Rechnung) aus."
                 level = messages.SUCCESS
-            elif payment_cart and order_item_counter == 0:
+            elif duplicate_list and not non_payment_cart:
                 message = f"Für alle von Ihnen ausgewählten Veranstaltungen sind sie bereits angemeldet. Ihre Bestellung wird daher verworfen."
                 level = messages.ERROR
             elif non_payment_cart:
@@ -273,12 +277,8 @@ class OrderCreateView(FormView):
             messages.add_message(self.request, level, message, fail_silently=True)
 
         if order:
-            if not order_item_counter == 0:
-                self.order_saved = order_saved
-                self.order = order
-            else:
-                order.delete()
-                self.order_saved = False
+            self.order_saved = order_saved
+            self.order = order
 
         return super().form_valid(form)
 
@@ -506,50 +506,19 @@ class OrderCreateView(FormView):
 
 @staff_member_required
 def admin_order_pdf(request, order_id, process):
-    context = {}
     order = get_object_or_404(Order, id=order_id)
-    template_path = "shop/pdf_invoice.html"
 
     # if check_update_order(request, order):
     #     update_order(order)
 
-    context["order"] = order
-    context["process"] = process
-    if process == "storno":
-        context["label"] = "Storno-Rechnung"
-        context["invoice_date"] = datetime.now()
-    elif process == "order":
-        context["label"] = "Rechnung"
-        if order.payment_date:
-            invoice_date = order.payment_date
-        else:
-            invoice_date = order.date_created
-        context["invoice_date"] = invoice_date
-
-    if process == "order":
-        context["order_items"] = OrderItem.objects.filter(order=order, status="r")
-    elif process == "storno":
-        context["order_items"] = OrderItem.objects.filter(order=order, status="c")
-    context["contains_action_price"] = any(
-        [
-            item.is_action_price
-            for item in OrderItem.objects.filter(order=order, status="r")
-        ]
-    )
-    # if order.discounted:
-    #     ust_footnote_counter = "2"
-    # else:
-    #     ust_footnote_counter = "1"
-    # context["ust_footnote_counter"] = ust_footnote_counter
-    response = render_to_pdf(template_path, context)
-
-    # to directly download the pdf we need attachment
-    # response['Content-Disposition'] = 'attachment; filename="report.pdf"'
+    # PDF aus dem Cache (payment.invoices), nur bei Änderungen neu rendern
+    pdf = get_invoice_pdf(order, process)
+    if pdf is None:
+        return HttpResponse("Es gab Probleme beim Erzeugen der Rechnung")
 
     # to view on browser we can remove attachment
-    filename = f"{process}_rechnung_{order.get_order_number}"
-
-    response["Content-Disposition"] = f'filename="{filename}.pdf"'
+    response = HttpResponse(pdf, content_type="application/pdf")
+    response["Content-Disposition"] = f'filename="{invoice_filename(order, process)}"'
 
     return response
 